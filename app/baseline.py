@@ -0,0 +1,181 @@
+import os
+import subprocess
+import tempfile
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any
+
+from app.cache import get_cache, make_key, tool_version
+from app.config import get_absolute_project_paths, override_settings, settings
+from app.findings import (
+    Baseline,
+    Finding,
+    Fingerprint,
+    get_fingerprint,
+    get_line_text,
+    set_baseline,
+)
+from app.git import checkout_commit, get_base_paths, get_merge_base, list_commit_files
+from app.lines import LineSet
+from app.logger import logger
+from app.profiling import bind_context, count_files
+from app.review import (
+    MYPY_OPTIONS,
+    PYLINT_MESSAGE_KEYS,
+    TargetFiles,
+    get_current_branch,
+    get_mypy_finding,
+    get_pylint_finding,
+    get_rule_findings,
+    run_mypy,
+    run_pylint,
+    split_test_files,
+)
+from app.rules import ENGINE_VERSION, get_default_rules, run_rules
+
+Filename = str
+
+BASELINE_VERSION = "1"  # bump when the fingerprints change
+
+
+def get_baseline_config() -> list[Any]:
+    return [
+        BASELINE_VERSION,
+        ENGINE_VERSION,
+        [(rule.name, rule.config()) for rule in get_default_rules()],
+        tool_version("pylint"),
+        settings.PYLINT_DISABLE_OPTIONS_CODE_FILES,
+        settings.PYLINT_DISABLE_OPTIONS_TEST_FILES,
+        PYLINT_MESSAGE_KEYS,
+        tool_version("mypy"),
+        MYPY_OPTIONS,
+    ]
+
+
+def find_rule_findings(files: list[Filename]) -> tuple[set[Filename], list[Finding]]:
+    rules = get_default_rules()
+    found = run_rules({file: LineSet.whole_file() for file in files}, rules)
+    return set(files), get_rule_findings(found, rules)
+
+
+def find_pylint_findings(files: list[Filename]) -> tuple[set[Filename], list[Finding]]:
+    code_files, test_files = split_test_files({file: LineSet() for file in files})
+    checked: set[Filename] = set()
+    findings: list[Finding] = []
+    for group, disable_options in (
+        (code_files, settings.PYLINT_DISABLE_OPTIONS_CODE_FILES),
+        (test_files, settings.PYLINT_DISABLE_OPTIONS_TEST_FILES),
+    ):
+        if not group:
+            continue
+        messages_per_file = run_pylint(list(group), disable_options)
+        checked.update(messages_per_file)
+        findings.extend(
+            get_pylint_finding(message)
+            for messages in messages_per_file.values()
+            for message in messages
+        )
+    return checked, findings
+
+
+def find_mypy_findings(files: list[Filename]) -> tuple[set[Filename], list[Finding]]:
+    output_per_file = run_mypy(files)
+    findings = [
+        get_mypy_finding(line) for lines in output_per_file.values() for line in lines
+    ]
+    return set(output_per_file), [finding for finding in findings if finding]
+
+
+def get_base_fingerprints(
+    files: list[Filename],
+) -> tuple[set[Filename], dict[Filename, list[Fingerprint]]]:
+    checked = set(files)
+    fingerprints: dict[Filename, list[Fingerprint]] = {file: [] for file in files}
+    with ThreadPoolExecutor(max_workers=3) as executor:
+        for tool_checked, findings in executor.map(
+            bind_context(lambda find: find(files)),
+            (find_rule_findings, find_pylint_findings, find_mypy_findings),
+        ):
+            # files a tool could not check have no trustworthy baseline
+            checked &= tool_checked
+            for finding in findings:
+                if finding.file in fingerprints:
+                    fingerprints[finding.file].append(
+                        get_fingerprint(
+                            finding, get_line_text(finding.file, finding.line)
+                        )
+                    )
+    return checked, fingerprints
+
+
+def compute_baseline(
+    commit: str, files: list[Filename]
+) -> tuple[set[Filename], dict[Filename, list[Fingerprint]]]:
+    current_dir = os.getcwd()
+    with tempfile.TemporaryDirectory() as base_dir:
+        # the tool configuration comes from the commit as well
+        support_files = list_commit_files(commit, *settings.PRECOMMIT_SUPPORT_FILES)
+        checkout_commit(base_dir, commit, *dict.fromkeys([*files, *support_files]))
+        if os.path.isdir(".mypy_cache"):
+            os.symlink(
+                os.path.abspath(".mypy_cache"), os.path.join(base_dir, ".mypy_cache")
+            )
+        project_paths = get_absolute_project_paths()
+        os.chdir(base_dir)
+        try:
+            with override_settings(**project_paths, MYPY_DAEMON=False):
+                return get_base_fingerprints(files)
+        finally:
+            os.chdir(current_dir)
+
+
+def load_baseline(files: TargetFiles) -> Baseline | None:
+    if get_current_branch() == settings.TARGET_BRANCH:
+        return None  # everything would be part of the baseline
+    commit = get_merge_base(settings.TARGET_BRANCH)
+    if commit is None:
+        logger.warning(
+            "No common commit with %s, reviewing without a baseline.",
+            settings.TARGET_BRANCH,
+        )
+        return None
+    base_paths = {
+        file: base_path
+        for file, base_path in get_base_paths(commit).items()
+        if file in files
+    }
+    cache = get_cache()
+    config = get_baseline_config()
+    keys = {
+        base_path: make_key("baseline", commit, config, base_path)
+        for base_path in base_paths.values()
+    }
+    snapshot: dict[Filename, list[Fingerprint]] = {}
+    misses = []
+    for base_path, key in keys.items():
+        value = cache.get(key) if cache is not None else None
+        if value is None:
+            misses.append(base_path)
+        else:
+            snapshot[base_path] = [tuple(fingerprint) for fingerprint in value]
+    count_files(len(misses))
+    if misses:
+        logger.info(
+            "Computing the baseline of %s for %d files...", commit[:12], len(misses)
+        )
+        checked, computed = compute_baseline(commit, misses)
+        for base_path in misses:
+            snapshot[base_path] = computed[base_path]
+            if cache is not None and base_path in checked:
+                cache.set(keys[base_path], snapshot[base_path])
+    return Baseline(
+        {file: Counter(snapshot[base_path]) for file, base_path in base_paths.items()}
+    )
+
+
+def use_baseline(files: TargetFiles) -> None:
+    try:
+        set_baseline(load_baseline(files))
+    except (OSError, subprocess.CalledProcessError) as e:
+        logger.warning("Could not compute the baseline, reporting all findings: %s", e)
+        set_baseline(None)
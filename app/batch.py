@@ -0,0 +1,90 @@
+import logging
+import os
+import re
+import tempfile
+from typing import Callable
+
+from app.config import get_absolute_project_paths, override_settings, settings
+from app.findings import close_reporters, set_baseline
+from app.git import add_worktree, checkout_worktree, get_commit_sha, remove_worktree
+from app.logger import format_table, logger
+from app.process import run_process
+
+Review = Callable[[], dict[str, bool] | None]
+
+UNSAFE_FILE_NAME_PATTERN = re.compile(r"[^\w.-]+")
+
+
+def get_report_file_name(ref: str, extension: str) -> str:
+    return f"{UNSAFE_FILE_NAME_PATTERN.sub('_', ref)}.{extension}"
+
+
+def get_report_path(ref: str, extension: str) -> str:
+    return os.path.join(
+        os.path.abspath(settings.BATCH_REPORT_DIR),
+        get_report_file_name(ref, extension),
+    )
+
+
+def get_ref_report_paths(ref: str) -> dict[str, str]:
+    # the findings and coverage pages of every ref are written to files of their
+    # own as well, so the links of an earlier report keep working
+    paths = {"COV_HTML_DIR": get_report_path(ref, "cov_html")}
+    if settings.REPORT_JSONL_PATH:
+        paths["REPORT_JSONL_PATH"] = get_report_path(ref, "jsonl")
+    if settings.REPORT_SARIF_PATH:
+        paths["REPORT_SARIF_PATH"] = get_report_path(ref, "sarif")
+    return paths
+
+
+def describe_results(results: dict[str, bool] | None) -> str:
+    if results is None:
+        return "no python file to check"
+    return f"{sum(results.values())}/{len(results)} checks passed"
+
+
+def review_ref(worktree: str, ref: str, commit: str, review: Review) -> str:
+    checkout_worktree(worktree, commit)
+    handler = logging.FileHandler(get_report_path(ref, "txt"), mode="w", delay=True)
+    logger.addHandler(handler)
+    current_dir = os.getcwd()
+    os.chdir(worktree)
+    try:
+        with override_settings(**get_ref_report_paths(ref)):
+            logger.info("REVIEWING %s (%s)...", ref, commit[:12])
+            results = review()
+    finally:
+        close_reporters()
+        os.chdir(current_dir)
+        logger.removeHandler(handler)
+        handler.close()
+        set_baseline(None)
+    return describe_results(results)
+
+
+def review_refs(refs: list[str], review: Review) -> list[tuple[str, str]]:
+    os.makedirs(settings.BATCH_REPORT_DIR, exist_ok=True)
+    summary = []
+    # the result cache is shared by all refs, wherever the review runs
+    with tempfile.TemporaryDirectory() as batch_dir, override_settings(
+        **get_absolute_project_paths()
+    ):
+        # one worktree for all refs, so only the files that differ are rewritten
+        # and the tools (e.g. the mypy daemon) keep working in the same directory
+        worktree = os.path.join(batch_dir, "worktree")
+        add_worktree(worktree)
+        try:
+            for ref in refs:
+                commit = get_commit_sha(ref)
+                if commit is None:
+                    logger.warning("Unknown ref %s, skipping it.", ref)
+                    summary.append((ref, "unknown ref"))
+                    continue
+                summary.append((ref, review_ref(worktree, ref, commit, review)))
+        finally:
+            if settings.MYPY_DAEMON:
+                run_process(["dmypy", "stop"], cwd=worktree, capture_output=True)
+            remove_worktree(worktree)
+    logger.info(format_table((("Ref", "Result"), *summary)))
+    logger.info("Reports written to %s", settings.BATCH_REPORT_DIR)
+    return summary
@@ -0,0 +1,284 @@
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Any, Callable, NamedTuple
+
+from app.config import override_settings
+from app.lines import ChangedLineIndex, LineSet
+from app.logger import format_table, logger
+from app.review import (
+    filter_pylint_messages,
+    get_all_python_files,
+    get_changed_python_files,
+    get_coverage_links,
+    get_files_not_covered,
+)
+from app.rules import Rule, get_default_rules, load_parsed_file, run_rules
+
+RESULTS_VERSION = 1
+BASE_BRANCH = "master"
+FEATURE_BRANCH = "feature"
+GIT_IDENTITY = ["-c", "user.name=pyreview", "-c", "user.email=pyreview@localhost"]
+
+FUNCTION_TEMPLATE = """def function_{n}(value):
+    # scale the value
+    result = value * {n}
+    print(result)
+    return result
+
+"""
+TEST_TEMPLATE = """from app.module_{n} import function_0
+
+
+def test_function_{n}():
+    # Act
+    assert function_0(1) == 0
+"""
+FUNCTION_LINES = FUNCTION_TEMPLATE.count("\n")
+
+
+class BenchmarkParams(NamedTuple):
+    files: int = 200
+    lines: int = 300
+    changed_files: int = 20
+    hunks: int = 5
+    tests: int = 50
+
+
+def render_module(lines: int) -> list[str]:
+    source: list[str] = []
+    n = 0
+    while len(source) < lines:
+        source.extend(FUNCTION_TEMPLATE.format(n=n).splitlines())
+        n += 1
+    return source[:lines]
+
+
+def change_module(source: list[str], hunks: int) -> list[str]:
+    changed = list(source)
+    step = max(1, len(source) // (hunks + 1))
+    for hunk in range(hunks):
+        index = min(len(changed) - 1, (hunk + 1) * step)
+        changed[index] = changed[index].replace("value", "changed_value")
+        changed.insert(index + 1, f"    # {'print(value)' if hunk % 2 else 'new'}")
+    return changed
+
+
+def write_file(path: str, lines: list[str]) -> None:
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("\n".join(lines) + "\n")
+
+
+def git(repo_dir: str, *args: str) -> None:
+    subprocess.run(
+        ["git", *GIT_IDENTITY, *args], cwd=repo_dir, check=True, capture_output=True
+    )
+
+
+def generate_repo(repo_dir: str, params: BenchmarkParams) -> None:
+    git(repo_dir, "init", "-b", BASE_BRANCH)
+    modules = {
+        os.path.join("app", f"module_{i}.py"): render_module(params.lines)
+        for i in range(params.files)
+    }
+    for path, source in modules.items():
+        write_file(os.path.join(repo_dir, path), source)
+    write_file(os.path.join(repo_dir, "app", "__init__.py"), [])
+    for i in range(params.tests):
+        write_file(
+            os.path.join(repo_dir, "tests", f"test_module_{i}.py"),
+            TEST_TEMPLATE.format(n=i % max(1, params.files)).splitlines(),
+        )
+    git(repo_dir, "add", ".")
+    git(repo_dir, "commit", "-q", "-m", "base")
+    git(repo_dir, "checkout", "-q", "-b", FEATURE_BRANCH)
+    for path, source in list(modules.items())[: params.changed_files]:
+        write_file(os.path.join(repo_dir, path), change_module(source, params.hunks))
+    git(repo_dir, "commit", "-q", "-a", "-m", "feature")
+
+
+def make_pylint_messages(files: dict[str, LineSet]) -> dict[str, list[dict]]:
+    # one message every FUNCTION_LINES lines, as a noisy pylint run would produce
+    return {
+        file: [
+            {
+                "type": "convention",
+                "module": file[:-3].replace("/", "."),
+                "path": file,
+                "line": line_no,
+                "column": 0,
+                "message-id": "C0116",
+                "symbol": "missing-function-docstring",
+                "message": "Missing function or method docstring",
+            }
+            for line_no in range(1, line_nos.last_line or 1, FUNCTION_LINES)
+        ]
+        for file, line_nos in files.items()
+    }
+
+
+def make_coverage_report(files: dict[str, LineSet]) -> dict:
+    return {
+        "files": {
+            file: {"missing_lines": list(range(1, line_nos.last_line or 1, 2))}
+            for file, line_nos in files.items()
+        }
+    }
+
+
+def run_rules_cold(files: dict[str, LineSet], rules: list[Rule]) -> None:
+    # parsed files are memoized per process, a review only parses them once
+    load_parsed_file.cache_clear()
+    run_rules(files, rules)
+
+
+def time_stage(func: Callable[[], Any], repeat: int) -> dict[str, Any]:
+    runs = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        runs.append(time.perf_counter() - start)
+    return {
+        "min": min(runs),
+        "median": statistics.median(runs),
+        "mean": statistics.fmean(runs),
+        "runs": runs,
+    }
+
+
+def run_benchmarks(params: BenchmarkParams, repeat: int) -> dict[str, Any]:
+    current_dir = os.getcwd()
+    with tempfile.TemporaryDirectory() as repo_dir, override_settings(
+        TARGET_BRANCH=BASE_BRANCH, CODE_DIR=None, CACHE_DIR=None
+    ):
+        generate_repo(repo_dir, params)
+        os.chdir(repo_dir)
+        try:
+            code_files, test_files = get_all_python_files()
+            all_files = {**code_files, **test_files}
+            code_files, test_files = get_changed_python_files()
+            changed_files = {**code_files, **test_files}
+            changed_lines = ChangedLineIndex(changed_files)
+            pylint_messages = make_pylint_messages(all_files)
+            cov_report = make_coverage_report(changed_files)
+            html_pages = {file: f"{file}.html" for file in changed_files}
+            rules = get_default_rules()
+            stages: dict[str, Callable[[], Any]] = {
+                "get_all_python_files": get_all_python_files,
+                "get_changed_python_files": get_changed_python_files,
+                "rules": lambda: run_rules_cold(changed_files, rules),
+                "rules_all_files": lambda: run_rules_cold(all_files, rules),
+                "pylint_filtering": lambda: filter_pylint_messages(
+                    pylint_messages, changed_lines
+                ),
+                "coverage_links": lambda: get_coverage_links(
+                    get_files_not_covered(cov_report, changed_files), html_pages
+                ),
+            }
+            results = {name: time_stage(func, repeat) for name, func in stages.items()}
+        finally:
+            os.chdir(current_dir)
+    return {
+        "version": RESULTS_VERSION,
+        "params": params._asdict(),
+        "repeat": repeat,
+        "python": platform.python_version(),
+        "stages": results,
+    }
+
+
+def format_seconds(seconds: float | None) -> str:
+    return "" if seconds is None else f"{seconds:.4f}"
+
+
+def compare_results(
+    baseline: dict[str, Any], current: dict[str, Any], threshold: float
+) -> tuple[list[tuple], list[str]]:
+    # the fastest run is the least disturbed by noise on the machine
+    rows = []
+    regressions = []
+    for name, stage in current["stages"].items():
+        before = baseline["stages"].get(name)
+        if before is None:
+            rows.append((name, "", format_seconds(stage["min"]), ""))
+            continue
+        ratio = stage["min"] / before["min"] if before["min"] else None
+        rows.append(
+            (
+                name,
+                format_seconds(before["min"]),
+                format_seconds(stage["min"]),
+                "" if ratio is None else f"{ratio:.2f}x",
+            )
+        )
+        if ratio is not None and ratio > 1 + threshold:
+            regressions.append(name)
+    return rows, regressions
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(
+        description="Time every review stage on a synthetic git repository."
+    )
+    defaults = BenchmarkParams()
+    for name, default in defaults._asdict().items():
+        parser.add_argument(f"--{name.replace('_', '-')}", type=int, default=default)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--output", help="write the results to this JSON file")
+    parser.add_argument("--compare", help="a previous results file to compare with")
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=0.2,
+        help="slowdown of the fastest run that counts as a regression",
+    )
+    args = parser.parse_args(argv)
+    params = BenchmarkParams(
+        **{name: getattr(args, name) for name in BenchmarkParams._fields}
+    )
+    results = run_benchmarks(params, args.repeat)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+    if not args.compare:
+        logger.info(
+            format_table(
+                (
+                    ("Stage", "Min (s)", "Median (s)", "Mean (s)"),
+                    *(
+                        (
+                            name,
+                            *map(
+                                format_seconds,
+                                (stage["min"], stage["median"], stage["mean"]),
+                            ),
+                        )
+                        for name, stage in results["stages"].items()
+                    ),
+                ),
+            )
+        )
+        return 0
+    with open(args.compare, "r", encoding="utf-8") as f:
+        baseline = json.load(f)
+    if baseline.get("params") != results["params"]:
+        logger.warning("The results were produced with different parameters.")
+    rows, regressions = compare_results(baseline, results, args.threshold)
+    logger.info(
+        format_table((("Stage", "Baseline (s)", "Current (s)", "Ratio"), *rows))
+    )
+    if regressions:
+        logger.warning("Regressions: %s", ", ".join(regressions))
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
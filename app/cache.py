@@ -0,0 +1,181 @@
+import hashlib
+import json
+import os
+import threading
+from functools import lru_cache
+from typing import Any, Callable, Iterable
+
+from app.config import settings
+from app.process import run_process
+
+Filename = str
+CacheKey = str
+
+# project state kept open by other reviews, e.g. the SQLite index of duplicates,
+# which must neither be deleted nor count towards the size of the result cache
+PINNED_STATE_KINDS = ("duplicate_index",)
+
+
+class ResultCache:
+    def __init__(self, directory: str, max_size_bytes: int) -> None:
+        self.directory = directory
+        self.max_size_bytes = max_size_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key: CacheKey) -> str:
+        return os.path.join(self.directory, key[:2], f"{key}.json")
+
+    def get(self, key: CacheKey) -> Any | None:
+        path = self._path(key)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                value = json.load(f)
+            os.utime(path)  # the mtime doubles as the LRU timestamp
+        except (OSError, ValueError):
+            with self._lock:
+                self.misses += 1
+            return None
+        with self._lock:
+            self.hits += 1
+        return value
+
+    def set(self, key: CacheKey, value: Any) -> None:
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(value, f)
+        os.replace(tmp_path, path)
+
+    def evict(self) -> None:
+        entries = []
+        for root, dirs, files in os.walk(self.directory):
+            if root == self.directory:
+                dirs[:] = [name for name in dirs if name not in PINNED_STATE_KINDS]
+            for name in files:
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+        total_size = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total_size <= self.max_size_bytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total_size -= size
+
+    def stats_line(self) -> str:
+        lookups = self.hits + self.misses
+        hit_rate = self.hits / lookups if lookups else 0.0
+        return (
+            f"Result cache: {self.hits} hits, {self.misses} misses "
+            f"({hit_rate:.0%} hit rate)"
+        )
+
+
+_cache: ResultCache | None = None
+_cache_lock = threading.Lock()
+
+
+def get_cache() -> ResultCache | None:
+    global _cache  # pylint: disable=global-statement
+    if not settings.CACHE_DIR:
+        return None
+    with _cache_lock:
+        directory = os.path.abspath(os.path.expanduser(settings.CACHE_DIR))
+        if _cache is None or _cache.directory != directory:
+            _cache = ResultCache(directory, settings.CACHE_MAX_SIZE_MB * 1024 * 1024)
+        return _cache
+
+
+def get_project_state_path(kind: str, extension: str = "json") -> str | None:
+    cache = get_cache()
+    if cache is None:
+        return None
+    project_key = hashlib.sha256(os.getcwd().encode("utf-8")).hexdigest()[:16]
+    return os.path.join(cache.directory, kind, f"{project_key}.{extension}")
+
+
+def file_digest(file_path: Filename) -> str:
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        while chunk := f.read(1 << 20):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def get_config_digests(file_paths: Iterable[Filename]) -> list[tuple[Filename, str]]:
+    # the configuration files a tool reads, as far as they exist
+    return [
+        (file_path, file_digest(file_path))
+        for file_path in file_paths
+        if os.path.isfile(file_path)
+    ]
+
+
+@lru_cache(maxsize=None)
+def tool_version(tool_name: str) -> str:
+    res = run_process(
+        [tool_name, "--version"], capture_output=True, text=True, check=False
+    )
+    return res.stdout.strip()
+
+
+def make_key(*parts: Any) -> CacheKey:
+    payload = json.dumps(parts, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def cached_per_file(  # pylint: disable=too-many-arguments
+    tool: str,
+    config: Any,
+    files: Iterable[Filename],
+    compute: Callable[[list[Filename]], dict[Filename, Any]],
+    *,
+    version: str = "",
+    dependencies: dict[Filename, list[Filename]] | None = None,
+) -> dict[Filename, Any]:
+    cache = get_cache()
+    files = list(files)
+    if cache is None:
+        return compute(files)
+    version = version or tool_version(tool)
+    # dependencies are shared between files, read each of them once
+    get_digest = lru_cache(maxsize=None)(file_digest)
+    results: dict[Filename, Any] = {}
+    keys: dict[Filename, CacheKey] = {}
+    misses: list[Filename] = []
+    for file_path in files:
+        # findings about a file can change with the modules it imports
+        keys[file_path] = make_key(
+            tool,
+            version,
+            config,
+            get_digest(file_path),
+            [
+                (dependency, get_digest(dependency))
+                for dependency in (dependencies or {}).get(file_path, [])
+            ],
+        )
+        value = cache.get(keys[file_path])
+        if value is None:
+            misses.append(file_path)
+        else:
+            results[file_path] = value
+    if misses:
+        computed = compute(misses)
+        for file_path in misses:
+            results[file_path] = computed.get(file_path, [])
+            # files missing from the computed results were not processed by
+            # the tool (e.g. it crashed), so there is nothing trustworthy to store
+            if file_path in computed:
+                cache.set(keys[file_path], results[file_path])
+    return {file_path: results[file_path] for file_path in files}
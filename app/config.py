@@ -1,3 +1,7 @@
+import os
+from contextlib import contextmanager
+from typing import Any, Iterator
+
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
 
@@ -5,12 +9,90 @@ class Settings(BaseSettings):
     TARGET_PROJECT: str | None = None  # absolute path to target project root
     TARGET_BRANCH: str = "master"
     CODE_DIR: str | None = None  # path to code directory relative to project root
+    CODE_DIRS: list[str] = []  # package roots of a monorepo, reviewed together
+    CHANGED_LINES_CONTEXT: int = 0  # also report findings this many lines around
     ACCEPTED_COMMENTS: list[str] = ["# Arrange", "# Act", "# Assert"]
+    BANNED_PATTERNS: dict[str, list[str]] = {}  # rule name -> banned substrings
+    BANNED_REGEXES: dict[str, list[str]] = {}  # rule name -> banned regexes
     RESULT_FILE_NAME: str = "pyreview_report.txt"
+    REPORT_JSONL_PATH: str | None = None  # stream findings as JSON Lines
+    REPORT_SARIF_PATH: str | None = None  # stream findings as SARIF 2.1.0
     TEST_SETUP_COMMAND: str | None = None
     TEST_TEARDOWN_COMMAND: str | None = None
     COV_JSON_FILE_PATH: str = "cov.json"
     COV_HTML_DIR: str = "cov_html"
+    PRUNED_DIRS: list[str] = [
+        "node_modules",
+        "build",
+        "dist",
+        "venv",
+        "site-packages",
+        "__pycache__",
+    ]
+    DUPLICATE_MIN_TOKENS: int = 60  # shortest copy that can be reported
+    DUPLICATE_WINDOW: int = 10  # copies of MIN_TOKENS + WINDOW - 1 are always found
+    PYLINT_SHARD_SIZE: int = 50  # maximum number of files per pylint process
+    MYPY_DAEMON: bool = False  # keep a warm dmypy daemon per target project
+    MYPY_STUB_REQUIREMENT_FILES: list[str] = [
+        "requirements*.txt",
+        "requirements*.in",
+        "pyproject.toml",
+        "setup.cfg",
+        "setup.py",
+        "Pipfile.lock",
+        "poetry.lock",
+    ]
+    TRIVY_SCOPED: bool = False  # only scan what the diff touches
+    TRIVY_OFFLINE: bool = False  # never refresh the vulnerability DB
+    TRIVY_CACHE_DIR: str | None = None  # e.g. a locally pinned vulnerability DB
+    TRIVY_MANIFEST_FILES: list[str] = [
+        "**/requirements*.txt",
+        "**/poetry.lock",
+        "**/Pipfile.lock",
+        "**/uv.lock",
+        "**/pyproject.toml",
+        "**/setup.py",
+        "**/setup.cfg",
+    ]
+    TRIVY_CONFIG_FILES: list[str] = [
+        "**/Dockerfile*",
+        "**/docker-compose*.yml",
+        "**/docker-compose*.yaml",
+        "**/*.tf",
+        "**/*.tfvars",
+    ]
+    BASELINE: bool = False  # hide findings that already exist on TARGET_BRANCH
+    CACHE_DIR: str | None = None  # enables the persistent result cache when set
+    CACHE_MAX_SIZE_MB: int = 256
+    TEST_WORKERS: int = 1  # number of pytest shards running in parallel
+    TEST_IMPACT_ANALYSIS: bool = False  # needs CACHE_DIR to store the test map
+    TEST_IMPACT_MAX_RATIO: float = 0.5  # run everything above this share of tests
+    MAX_WORKERS: int | None = None  # check worker pool size, defaults to CPU count
+    WATCH_CHECKS: list[str] = ["rules", "pylint", "mypy"]  # checks rerun on save
+    WATCH_POLL_INTERVAL: float = 0.5  # seconds, also bounds Ctrl+C latency
+    WATCH_DEBOUNCE: float = 0.05  # seconds without events that end a save
+    PRECOMMIT_CHECKS: list[str] = ["rules", "pylint", "mypy"]  # run by --staged
+    PRECOMMIT_SUPPORT_FILES: list[str] = [  # tool configuration read from the index
+        "pyproject.toml",
+        "setup.cfg",
+        "tox.ini",
+        ".pylintrc",
+        "pylintrc",
+        "mypy.ini",
+        ".mypy.ini",
+        "requirements*.txt",
+        "requirements*.in",
+        "setup.py",
+        "Pipfile.lock",
+        "poetry.lock",
+    ]
+    REVIEW_TIMEOUT: float | None = None  # seconds for the whole review
+    CHECK_TIMEOUTS: dict[str, float] = {}  # seconds per check, e.g. {"coverage": 600}
+    FAIL_FAST: bool = False  # cancel the remaining checks on the first error
+    BATCH_REPORT_DIR: str = "pyreview_batch"  # one report per ref of --refs
+    PROFILE: bool = False  # time every check and write a trace to PROFILE_DIR
+    PROFILE_DIR: str = "pyreview_profile"
+    PROFILE_CPROFILE: bool = False  # also dump a cProfile of every check
     PYLINT_DISABLE_OPTIONS_CODE_FILES: list[str] = [
         "line-too-long",
         "missing-function-docstring",
@@ -19,6 +101,7 @@ class Settings(BaseSettings):
         "missing-class-docstring",
         "import-error",
         "too-few-public-methods",
+        "duplicate-code",  # the duplicates check finds copies in the whole repository
     ]
     PYLINT_DISABLE_OPTIONS_TEST_FILES: list[str] = [
         "line-too-long",
@@ -38,3 +121,35 @@ class Settings(BaseSettings):
 
 
 settings = Settings()
+
+
+@contextmanager
+def override_settings(**overrides: Any) -> Iterator[None]:
+    previous = {name: getattr(settings, name) for name in overrides}
+    for name, value in overrides.items():
+        setattr(settings, name, value)
+    try:
+        yield
+    finally:
+        for name, value in previous.items():
+            setattr(settings, name, value)
+
+
+# settings pointing into the project, which must keep doing so when a review
+# runs in another directory (the staged index, a worktree or a base commit)
+PROJECT_PATH_SETTINGS = (
+    "CACHE_DIR",
+    "REPORT_JSONL_PATH",
+    "REPORT_SARIF_PATH",
+    "COV_JSON_FILE_PATH",
+    "COV_HTML_DIR",
+    "PROFILE_DIR",
+)
+
+
+def get_absolute_project_paths() -> dict[str, str]:
+    return {
+        name: os.path.abspath(os.path.expanduser(value))
+        for name in PROJECT_PATH_SETTINGS
+        if (value := getattr(settings, name))
+    }
@@ -0,0 +1,267 @@
+import json
+import os
+import sqlite3
+import tokenize
+import zlib
+from contextlib import closing
+from typing import Iterable, NamedTuple
+
+from app.cache import get_project_state_path
+from app.config import settings
+from app.git import get_blob_ids
+from app.lines import LineSet
+from app.rules import parse_file
+
+Filename = str
+# hash of k tokens, first and last line they are on
+Shingle = tuple[int, int, int]
+
+INDEX_VERSION = 2  # bump when the shingles change
+INDEX_TIMEOUT = 30  # seconds to wait for another review updating the index
+INDEX_QUERY_SIZE = 500  # hashes per query, below SQLite's variable limit
+HASH_BASE = 1_000_003
+HASH_MODULUS = (1 << 61) - 1
+SKIPPED_TOKEN_TYPES = frozenset(
+    {
+        tokenize.COMMENT,
+        tokenize.NL,
+        tokenize.NEWLINE,
+        tokenize.INDENT,
+        tokenize.DEDENT,
+        tokenize.ENDMARKER,
+        tokenize.ENCODING,
+    }
+)
+
+
+class Duplicate(NamedTuple):
+    start: int
+    end: int
+    other_file: Filename
+    other_start: int
+    other_end: int
+
+
+def get_token_hashes(file_path: Filename) -> list[tuple[int, int]]:
+    tokens = parse_file(file_path).tokens or []
+    hashes = []
+    in_import = False
+    at_line_start = True
+    for token in tokens:
+        if token.type in (tokenize.NEWLINE, tokenize.ENDMARKER):
+            in_import = False
+            at_line_start = True
+        if token.type in SKIPPED_TOKEN_TYPES:
+            continue
+        if at_line_start:
+            # imports are expected to repeat between modules
+            in_import = token.type == tokenize.NAME and token.string in (
+                "import",
+                "from",
+            )
+            at_line_start = False
+        if not in_import:
+            # crc32 rather than hash(), which changes between processes
+            hashes.append((zlib.crc32(token.string.encode("utf-8")), token.start[0]))
+    return hashes
+
+
+def winnow(token_hashes: list[tuple[int, int]], k: int, window: int) -> list[Shingle]:
+    if len(token_hashes) < k:
+        return []
+    high = pow(HASH_BASE, k - 1, HASH_MODULUS)
+    kgrams: list[Shingle] = []
+    value = 0
+    for i, (token_hash, _) in enumerate(token_hashes):
+        if i >= k:
+            value = (value - token_hashes[i - k][0] * high) % HASH_MODULUS
+        value = (value * HASH_BASE + token_hash) % HASH_MODULUS
+        if i >= k - 1:
+            kgrams.append((value, token_hashes[i - k + 1][1], token_hashes[i][1]))
+    # keep the rightmost minimum of every window: any copy of at least
+    # k + window - 1 tokens shares one of the kept k-grams with its original
+    shingles: list[Shingle] = []
+    selected = -1
+    for start in range(max(1, len(kgrams) - window + 1)):
+        end = min(start + window, len(kgrams))
+        minimum = min(range(start, end), key=lambda j: (kgrams[j][0], -j))
+        if minimum != selected:
+            shingles.append(kgrams[minimum])
+            selected = minimum
+    return shingles
+
+
+def fingerprint_file(file_path: Filename) -> list[Shingle]:
+    return winnow(
+        get_token_hashes(file_path),
+        settings.DUPLICATE_MIN_TOKENS,
+        settings.DUPLICATE_WINDOW,
+    )
+
+
+def get_index_params() -> str:
+    return json.dumps(
+        [INDEX_VERSION, settings.DUPLICATE_MIN_TOKENS, settings.DUPLICATE_WINDOW]
+    )
+
+
+def open_index() -> sqlite3.Connection:
+    index_path = get_project_state_path("duplicate_index", "sqlite")
+    if index_path is None:
+        return sqlite3.connect(":memory:")
+    os.makedirs(os.path.dirname(index_path), exist_ok=True)
+    return sqlite3.connect(index_path, timeout=INDEX_TIMEOUT)
+
+
+def prepare_index(index: sqlite3.Connection) -> None:
+    index.execute("CREATE TABLE IF NOT EXISTS params (value TEXT NOT NULL)")
+    stored = index.execute("SELECT value FROM params").fetchone()
+    if stored is not None and stored[0] != get_index_params():
+        index.execute("DROP TABLE IF EXISTS files")
+        index.execute("DROP TABLE IF EXISTS shingles")
+        index.execute("DELETE FROM params")
+        stored = None
+    index.execute(
+        "CREATE TABLE IF NOT EXISTS files (path TEXT PRIMARY KEY, version TEXT NOT NULL)"
+    )
+    # the shingles of all files, inverted: looked up by hash, replaced by file
+    index.execute(
+        "CREATE TABLE IF NOT EXISTS shingles "
+        "(hash INTEGER NOT NULL, path TEXT NOT NULL, start INTEGER, end INTEGER)"
+    )
+    index.execute("CREATE INDEX IF NOT EXISTS shingles_by_hash ON shingles (hash)")
+    index.execute("CREATE INDEX IF NOT EXISTS shingles_by_path ON shingles (path)")
+    if stored is None:
+        index.execute("INSERT INTO params VALUES (?)", (get_index_params(),))
+
+
+def get_file_versions(files: Iterable[Filename]) -> dict[Filename, str]:
+    # git tells which files changed since they were staged, only those and the
+    # untracked ones are looked at
+    blob_ids = get_blob_ids("*.py") or {}
+    versions = {}
+    for file_path in files:
+        if file_path in blob_ids:
+            versions[file_path] = blob_ids[file_path]
+            continue
+        try:
+            stat = os.stat(file_path)
+        except OSError:
+            continue
+        versions[file_path] = f"{stat.st_mtime_ns}:{stat.st_size}"
+    return versions
+
+
+def fingerprint_files(files: Iterable[Filename]) -> dict[Filename, list[Shingle]]:
+    fingerprints = {}
+    for file_path in files:
+        try:
+            fingerprints[file_path] = fingerprint_file(file_path)
+        except (OSError, UnicodeDecodeError):
+            continue
+    return fingerprints
+
+
+def update_index(index: sqlite3.Connection, files: Iterable[Filename]) -> None:
+    versions = get_file_versions(files)
+    index.execute("BEGIN IMMEDIATE")
+    prepare_index(index)
+    index.commit()
+    # only the files that changed since the last review are fingerprinted again
+    stored = dict(index.execute("SELECT path, version FROM files"))
+    fingerprints = fingerprint_files(
+        file_path
+        for file_path, version in versions.items()
+        if stored.get(file_path) != version
+    )
+    outdated = [
+        file_path
+        for file_path, version in stored.items()
+        if versions.get(file_path) != version
+    ]
+    if not outdated and not fingerprints:
+        return
+    # one review at a time writes to the index, the others wait for it
+    index.execute("BEGIN IMMEDIATE")
+    for file_path in dict.fromkeys([*outdated, *fingerprints]):
+        index.execute("DELETE FROM shingles WHERE path = ?", (file_path,))
+        index.execute("DELETE FROM files WHERE path = ?", (file_path,))
+    for file_path, shingles in fingerprints.items():
+        index.executemany(
+            "INSERT INTO shingles VALUES (?, ?, ?, ?)",
+            ((value, file_path, start, end) for value, start, end in shingles),
+        )
+        index.execute(
+            "INSERT INTO files VALUES (?, ?)", (file_path, versions[file_path])
+        )
+    index.commit()
+
+
+def get_file_shingles(index: sqlite3.Connection, file_path: Filename) -> list[Shingle]:
+    return index.execute(
+        "SELECT hash, start, end FROM shingles WHERE path = ?", (file_path,)
+    ).fetchall()
+
+
+def get_copies(
+    index: sqlite3.Connection, values: list[int]
+) -> list[tuple[int, Filename, int, int]]:
+    copies: list[tuple[int, Filename, int, int]] = []
+    for i in range(0, len(values), INDEX_QUERY_SIZE):
+        chunk = values[i : i + INDEX_QUERY_SIZE]
+        copies.extend(
+            index.execute(
+                "SELECT hash, path, start, end FROM shingles "
+                f"WHERE hash IN ({', '.join('?' * len(chunk))})",
+                chunk,
+            )
+        )
+    return copies
+
+
+def merge_duplicates(duplicates: list[Duplicate]) -> list[Duplicate]:
+    merged: list[Duplicate] = []
+    for duplicate in sorted(
+        duplicates, key=lambda d: (d.other_file, d.other_start, d.start)
+    ):
+        last = merged[-1] if merged else None
+        if (
+            last is not None
+            and last.other_file == duplicate.other_file
+            and duplicate.start <= last.end + 1
+            and duplicate.other_start <= last.other_end + 1
+        ):
+            merged[-1] = last._replace(
+                end=max(last.end, duplicate.end),
+                other_end=max(last.other_end, duplicate.other_end),
+            )
+        else:
+            merged.append(duplicate)
+    return sorted(merged, key=lambda d: (d.start, d.other_file, d.other_start))
+
+
+def find_duplicates(
+    files: dict[Filename, LineSet], repository_files: Iterable[Filename]
+) -> dict[Filename, list[Duplicate]]:
+    found: dict[Filename, list[Duplicate]] = {file_path: [] for file_path in files}
+    with closing(open_index()) as index:
+        update_index(index, dict.fromkeys([*repository_files, *files]))
+        # only the shingles touching a changed line are looked up
+        queries: dict[int, list[tuple[Filename, int, int]]] = {}
+        for file_path, line_nos in files.items():
+            for value, start, end in get_file_shingles(index, file_path):
+                if line_nos.overlaps(start, end + 1):
+                    queries.setdefault(value, []).append((file_path, start, end))
+        copies = get_copies(index, list(queries))
+    for value, other_file, other_start, other_end in copies:
+        for file_path, start, end in queries[value]:
+            # a region matching itself or overlapping itself is no copy
+            if other_file == file_path and other_start <= end and start <= other_end:
+                continue
+            found[file_path].append(
+                Duplicate(start, end, other_file, other_start, other_end)
+            )
+    return {
+        file_path: merge_duplicates(duplicates)
+        for file_path, duplicates in found.items()
+    }
@@ -0,0 +1,208 @@
+import json
+import re
+import threading
+from abc import ABC, abstractmethod
+from collections import Counter
+from typing import IO, Iterable, NamedTuple
+
+from app.config import settings
+from app.lines import ChangedLineIndex
+from app.process import review_cancelled
+from app.rules import parse_file
+
+ERROR = "error"
+WARNING = "warning"
+NOTE = "note"
+
+SARIF_SCHEMA = "https://json.schemastore.org/sarif-2.1.0.json"
+LINE_REFERENCE_PATTERN = re.compile(r"\bline \d+")
+
+
+class Finding(NamedTuple):
+    tool: str
+    rule: str
+    file: str | None
+    line: int | None
+    severity: str  # one of ERROR, WARNING or NOTE
+    message: str
+
+
+# Reporters open their file on first use and write every finding as soon as
+# it is reported, so partial results are visible while slow checks still run.
+class Reporter(ABC):
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self._file: IO[str] | None = None
+
+    def _open(self) -> IO[str]:
+        if self._file is None:
+            self._file = open(  # pylint: disable=consider-using-with
+                self.path, "w", encoding="utf-8"
+            )
+            self.start(self._file)
+        return self._file
+
+    def start(self, f: IO[str]) -> None:
+        pass
+
+    @abstractmethod
+    def write(self, f: IO[str], finding: Finding) -> None: ...
+
+    def finish(self, f: IO[str]) -> None:
+        pass
+
+    def report(self, findings: list[Finding]) -> None:
+        f = self._open()
+        for finding in findings:
+            self.write(f, finding)
+        f.flush()
+
+    def close(self) -> None:
+        f = self._open()
+        self.finish(f)
+        f.close()
+        self._file = None
+
+
+class JsonLinesReporter(Reporter):
+    def write(self, f: IO[str], finding: Finding) -> None:
+        f.write(json.dumps(finding._asdict()) + "\n")
+
+
+class SarifReporter(Reporter):
+    def __init__(self, path: str) -> None:
+        super().__init__(path)
+        self._count = 0
+
+    def start(self, f: IO[str]) -> None:
+        self._count = 0
+        f.write(
+            f'{{"version": "2.1.0", "$schema": "{SARIF_SCHEMA}", "runs": [{{'
+            '"tool": {"driver": {"name": "pyreview"}}, "results": ['
+        )
+
+    def write(self, f: IO[str], finding: Finding) -> None:
+        result: dict = {
+            "ruleId": f"{finding.tool}/{finding.rule}",
+            "level": finding.severity,
+            "message": {"text": finding.message},
+        }
+        if finding.file is not None:
+            location: dict = {"artifactLocation": {"uri": finding.file}}
+            if finding.line is not None:
+                location["region"] = {"startLine": finding.line}
+            result["locations"] = [{"physicalLocation": location}]
+        f.write(("," if self._count else "") + json.dumps(result))
+        self._count += 1
+
+    def finish(self, f: IO[str]) -> None:
+        f.write("]}]}\n")
+
+
+def filter_findings(
+    findings: Iterable[Finding], changed_lines: ChangedLineIndex
+) -> list[Finding]:
+    return [
+        finding
+        for finding in findings
+        if changed_lines.contains(finding.file, finding.line)
+    ]
+
+
+Fingerprint = tuple[str, str, str, str]
+
+
+def get_line_text(file_path: str | None, line: int | None) -> str:
+    if file_path is None or line is None:
+        return ""
+    try:
+        lines = parse_file(file_path).lines
+    except (OSError, UnicodeDecodeError):
+        return ""
+    return lines[line - 1] if 0 < line <= len(lines) else ""
+
+
+def get_fingerprint(finding: Finding, line_text: str) -> Fingerprint:
+    # neither the path nor the line number, so that moved code still matches
+    return (
+        finding.tool,
+        finding.rule,
+        LINE_REFERENCE_PATTERN.sub("line", finding.message),
+        " ".join(line_text.split()),
+    )
+
+
+# Findings that already existed on the target branch, per current file path.
+# Every baseline finding excuses one current finding with the same fingerprint.
+class Baseline:
+    def __init__(self, fingerprints: dict[str, Counter[Fingerprint]]) -> None:
+        self._fingerprints = fingerprints
+        self._lock = threading.Lock()
+
+    def excuses(self, finding: Finding) -> bool:
+        if finding.file not in self._fingerprints:
+            return False
+        fingerprint = get_fingerprint(
+            finding, get_line_text(finding.file, finding.line)
+        )
+        with self._lock:
+            remaining = self._fingerprints[finding.file]
+            if remaining[fingerprint] <= 0:
+                return False
+            remaining[fingerprint] -= 1
+            return True
+
+
+_baseline: Baseline | None = None
+
+
+def set_baseline(baseline: Baseline | None) -> None:
+    global _baseline  # pylint: disable=global-statement
+    _baseline = baseline
+
+
+def is_new_finding(finding: Finding) -> bool:
+    return _baseline is None or not _baseline.excuses(finding)
+
+
+_reporters: list[Reporter] | None = None
+_severity_counts: dict[str, int] = {}
+_lock = threading.Lock()
+
+
+def get_reporters() -> list[Reporter]:
+    global _reporters  # pylint: disable=global-statement
+    if _reporters is None:
+        _reporters = []
+        if settings.REPORT_JSONL_PATH:
+            _reporters.append(JsonLinesReporter(settings.REPORT_JSONL_PATH))
+        if settings.REPORT_SARIF_PATH:
+            _reporters.append(SarifReporter(settings.REPORT_SARIF_PATH))
+    return _reporters
+
+
+def report_findings(findings: Iterable[Finding]) -> None:
+    findings = list(findings)
+    with _lock:
+        for finding in findings:
+            _severity_counts[finding.severity] = (
+                _severity_counts.get(finding.severity, 0) + 1
+            )
+            if settings.FAIL_FAST and finding.severity == ERROR:
+                review_cancelled.set()
+        for reporter in get_reporters():
+            reporter.report(findings)
+
+
+def count_findings(*severities: str) -> int:
+    with _lock:
+        return sum(_severity_counts.get(severity, 0) for severity in severities)
+
+
+def close_reporters() -> None:
+    global _reporters  # pylint: disable=global-statement
+    with _lock:
+        # reporters are only created once there is something to report
+        for reporter in _reporters or []:
+            reporter.close()
+        _reporters = None
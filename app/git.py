@@ -0,0 +1,194 @@
+import os
+import subprocess
+import tempfile
+from fnmatch import fnmatch
+from typing import Iterator
+
+from app.process import run_process
+from app.profiling import span
+
+
+def iter_diff_lines(base: str, *pathspecs: str) -> Iterator[str]:
+    return iter_command_lines(["git", "diff", base, "-U0", "--", *pathspecs])
+
+
+def iter_staged_diff_lines(*pathspecs: str) -> Iterator[str]:
+    # index against HEAD, which also works before the first commit
+    return iter_command_lines(
+        ["git", "diff", "--cached", "--diff-filter=d", "-U0", "--", *pathspecs]
+    )
+
+
+def iter_command_lines(cmd: list[str]) -> Iterator[str]:
+    with span(" ".join(cmd[:2]), "subprocess"), subprocess.Popen(
+        cmd, stdout=subprocess.PIPE, text=True, encoding="utf-8", errors="replace"
+    ) as proc:
+        assert proc.stdout is not None
+        yield from proc.stdout
+    if proc.returncode:
+        raise subprocess.CalledProcessError(proc.returncode, cmd)
+
+
+def get_commit_sha(ref: str) -> str | None:
+    res = run_process(
+        ["git", "rev-parse", "--verify", "--quiet", f"{ref}^{{commit}}"],
+        capture_output=True,
+        text=True,
+    )
+    return res.stdout.strip() if res.returncode == 0 else None
+
+
+def get_merge_base(ref: str, other: str = "HEAD") -> str | None:
+    res = run_process(["git", "merge-base", ref, other], capture_output=True, text=True)
+    return res.stdout.strip() if res.returncode == 0 else None
+
+
+def is_ancestor(ancestor: str, ref: str = "HEAD") -> bool:
+    res = run_process(
+        ["git", "merge-base", "--is-ancestor", ancestor, ref], capture_output=True
+    )
+    return res.returncode == 0
+
+
+def has_uncommitted_changes(*pathspecs: str) -> bool:
+    res = run_process(
+        ["git", "status", "--porcelain", "--", *pathspecs],
+        capture_output=True,
+        text=True,
+    )
+    return res.returncode != 0 or bool(res.stdout.strip())
+
+
+def get_changed_paths(base: str) -> list[str]:
+    changed = run_process(
+        ["git", "diff", "--name-only", "--diff-filter=d", "-z", base],
+        capture_output=True,
+        check=True,
+    )
+    untracked = run_process(
+        ["git", "ls-files", "--others", "--exclude-standard", "-z"],
+        capture_output=True,
+        check=True,
+    )
+    paths = (changed.stdout + untracked.stdout).decode("utf-8", "surrogateescape")
+    return [path for path in dict.fromkeys(paths.split("\0")) if path]
+
+
+def list_files(*patterns: str) -> list[str]:
+    res = run_process(
+        ["git", "ls-files", "-z", "--cached", "--others", "--exclude-standard"]
+        + ["--", *(f":(glob){pattern}" for pattern in patterns)],
+        capture_output=True,
+        check=True,
+    )
+    paths = res.stdout.decode("utf-8", "surrogateescape").split("\0")
+    return sorted(path for path in set(paths) if path)
+
+
+def get_blob_ids(*pathspecs: str) -> dict[str, str] | None:
+    # content ids of the tracked files whose working copy matches the index
+    staged = run_process(
+        ["git", "ls-files", "-z", "--stage", "--", *pathspecs], capture_output=True
+    )
+    modified = run_process(
+        ["git", "ls-files", "-z", "--modified", "--", *pathspecs], capture_output=True
+    )
+    if staged.returncode != 0 or modified.returncode != 0:
+        return None
+    modified_paths = set(modified.stdout.decode("utf-8", "surrogateescape").split("\0"))
+    blob_ids = {}
+    for entry in staged.stdout.decode("utf-8", "surrogateescape").split("\0"):
+        if entry:
+            info, path = entry.split("\t", 1)
+            if path not in modified_paths:
+                blob_ids[path] = info.split()[1]
+    return blob_ids
+
+
+def checkout_index(directory: str, *paths: str) -> None:
+    # writes the staged content of the files below directory
+    run_process(
+        ["git", "checkout-index", f"--prefix={directory.rstrip('/')}/", "--", *paths],
+        capture_output=True,
+        check=True,
+    )
+
+
+def get_base_paths(base: str) -> dict[str, str]:
+    # current path -> path at base of the files changed since, renames included
+    res = run_process(
+        ["git", "diff", "--name-status", "-M", "-z", base],
+        capture_output=True,
+        check=True,
+    )
+    fields = res.stdout.decode("utf-8", "surrogateescape").split("\0")
+    base_paths = {}
+    i = 0
+    while i < len(fields) and fields[i]:
+        status = fields[i][0]
+        if status in "RC":
+            base_paths[fields[i + 2]] = fields[i + 1]
+            i += 3
+        else:
+            if status in "MT":
+                base_paths[fields[i + 1]] = fields[i + 1]
+            i += 2
+    return base_paths
+
+
+def list_commit_files(commit: str, *patterns: str) -> list[str]:
+    # files at the root of the commit, where the tool configuration lives
+    res = run_process(
+        ["git", "ls-tree", "-z", "--name-only", commit],
+        capture_output=True,
+        check=True,
+    )
+    paths = res.stdout.decode("utf-8", "surrogateescape").split("\0")
+    return sorted(
+        path
+        for path in paths
+        if path and any(fnmatch(path, pattern) for pattern in patterns)
+    )
+
+
+def checkout_commit(directory: str, commit: str, *paths: str) -> None:
+    # goes through a temporary index, the real one is left alone
+    with tempfile.TemporaryDirectory() as index_dir:
+        env = {**os.environ, "GIT_INDEX_FILE": os.path.join(index_dir, "index")}
+        run_process(
+            ["git", "read-tree", commit], env=env, capture_output=True, check=True
+        )
+        run_process(
+            ["git", "checkout-index", f"--prefix={directory.rstrip('/')}/"]
+            + ["--", *paths],
+            env=env,
+            capture_output=True,
+            check=True,
+        )
+
+
+def add_worktree(directory: str) -> None:
+    # nothing is checked out until the first ref is reviewed
+    run_process(
+        ["git", "worktree", "add", "--detach", "--no-checkout", directory],
+        capture_output=True,
+        check=True,
+    )
+
+
+def checkout_worktree(directory: str, commit: str) -> None:
+    # files that are the same in both commits keep their mtime, and so their
+    # parsed and cached results
+    run_process(
+        ["git", "-C", directory, "checkout", "--detach", "--force", commit],
+        capture_output=True,
+        check=True,
+    )
+
+
+def remove_worktree(directory: str) -> None:
+    run_process(
+        ["git", "worktree", "remove", "--force", directory],
+        capture_output=True,
+        check=False,
+    )
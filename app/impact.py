@@ -0,0 +1,150 @@
+import json
+import os
+import re
+import tempfile
+
+from app.cache import get_project_state_path
+from app.config import settings
+from app.git import (
+    get_commit_sha,
+    has_uncommitted_changes,
+    is_ancestor,
+    iter_diff_lines,
+)
+from app.lines import LineSet
+from app.logger import logger
+from app.process import run_process
+
+Filename = str
+TestId = str
+TestMap = dict
+
+TEST_MAP_VERSION = 1
+OLD_PATH_PATTERN = re.compile(r"^diff --git a/(.*) b/.*$")
+OLD_HUNK_PATTERN = re.compile(r"^@@ -(\d+)(?:,(\d+))? \+\S+ @@")
+
+
+def get_test_map_path() -> str | None:
+    return get_project_state_path("test_maps")
+
+
+def load_test_map() -> TestMap | None:
+    test_map_path = get_test_map_path()
+    if test_map_path is None:
+        return None
+    try:
+        with open(test_map_path, "r", encoding="utf-8") as f:
+            test_map = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if test_map.get("version") != TEST_MAP_VERSION:
+        return None
+    return test_map
+
+
+def save_test_map(test_map: TestMap) -> None:
+    test_map_path = get_test_map_path()
+    if test_map_path is None:
+        return
+    os.makedirs(os.path.dirname(test_map_path), exist_ok=True)
+    with open(test_map_path, "w", encoding="utf-8") as f:
+        json.dump(test_map, f)
+
+
+def can_record_test_map() -> bool:
+    # line numbers in the map must belong to a commit, not to a dirty tree
+    return get_test_map_path() is not None and not has_uncommitted_changes("*.py")
+
+
+def record_test_map() -> None:
+    commit = get_commit_sha("HEAD")
+    if commit is None:
+        return
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        contexts_path = os.path.join(tmp_dir, "contexts.json")
+        res = run_process(
+            ["coverage", "json", "--show-contexts", "-o", contexts_path],
+            capture_output=True,
+            text=True,
+        )
+        if res.returncode != 0:
+            logger.warning("Could not record the test impact map: %s", res.stderr)
+            return
+        with open(contexts_path, "r", encoding="utf-8") as f:
+            cov_report = json.load(f)
+    test_ids: dict[TestId, int] = {}
+    files: dict[Filename, dict[str, list[int]]] = {}
+    for file, data in cov_report["files"].items():
+        file_map = files.setdefault(file, {})
+        for line_no, contexts in data.get("contexts", {}).items():
+            tests = {context.rsplit("|", 1)[0] for context in contexts if context}
+            if tests:
+                file_map[line_no] = sorted(
+                    test_ids.setdefault(test, len(test_ids)) for test in tests
+                )
+    save_test_map(
+        {
+            "version": TEST_MAP_VERSION,
+            "commit": commit,
+            "tests": sorted(test_ids, key=test_ids.__getitem__),
+            "files": files,
+        }
+    )
+
+
+def get_changed_lines_since(commit: str) -> dict[Filename, LineSet]:
+    hunks: dict[Filename, list[tuple[int, int]]] = {}
+    current_hunks: list[tuple[int, int]] | None = None
+    for line in iter_diff_lines(commit, "*.py"):
+        if line.startswith("diff --git "):
+            match = OLD_PATH_PATTERN.match(line)
+            current_hunks = hunks.setdefault(match.group(1), []) if match else None
+        elif line.startswith("@@") and current_hunks is not None:
+            match = OLD_HUNK_PATTERN.match(line)
+            if match:
+                start = int(match.group(1))
+                length = 1 if match.group(2) is None else int(match.group(2))
+                # pure insertions touch the lines around the insertion point
+                current_hunks.append((start, start + (length or 2)))
+    return {file: LineSet(file_hunks) for file, file_hunks in hunks.items()}
+
+
+def select_tests() -> list[str] | None:
+    test_map = load_test_map()
+    if test_map is None:
+        logger.info("No test impact map available, running the whole test suite.")
+        return None
+    if not is_ancestor(test_map["commit"]):
+        logger.info("The test impact map is stale, running the whole test suite.")
+        return None
+    changed_lines = get_changed_lines_since(test_map["commit"])
+    if any(os.path.basename(file) == "conftest.py" for file in changed_lines):
+        logger.info("conftest.py changed, running the whole test suite.")
+        return None
+    changed_test_files = [
+        file for file in changed_lines if "test" in file and os.path.isfile(file)
+    ]
+    selected: set[int] = set()
+    for file, line_nos in changed_lines.items():
+        for line_no, test_indexes in test_map["files"].get(file, {}).items():
+            if int(line_no) in line_nos:
+                selected.update(test_indexes)
+    tests = test_map["tests"]
+    selected_tests = sorted(
+        tests[index]
+        for index in selected
+        if os.path.isfile(tests[index].split("::", 1)[0])
+        and tests[index].split("::", 1)[0] not in changed_test_files
+    )
+    if not selected_tests and not changed_test_files:
+        logger.info("No test exercises the changed lines, running the whole suite.")
+        return None
+    if len(selected_tests) > settings.TEST_IMPACT_MAX_RATIO * len(tests):
+        logger.info("Too many impacted tests, running the whole test suite.")
+        return None
+    logger.info(
+        "Running %d impacted tests and %d changed test files.",
+        len(selected_tests),
+        len(changed_test_files),
+    )
+    return [*changed_test_files, *selected_tests]
@@ -0,0 +1,90 @@
+import ast
+import os
+from typing import Iterable
+
+from app.config import settings
+from app.rules import parse_file
+
+Filename = str
+Module = str
+
+
+def get_import_roots() -> list[str]:
+    return list(dict.fromkeys([".", *settings.CODE_DIRS, settings.CODE_DIR or "."]))
+
+
+def get_module_files(module: Module) -> list[Filename]:
+    # importing a module runs the __init__ of every package around it as well
+    parts = module.split(".")
+    files = []
+    for root in get_import_roots():
+        for end in range(1, len(parts) + 1):
+            package_init = os.path.join(root, *parts[:end], "__init__.py")
+            if os.path.isfile(package_init):
+                files.append(os.path.normpath(package_init))
+        module_file = f"{os.path.join(root, *parts)}.py"
+        if os.path.isfile(module_file):
+            files.append(os.path.normpath(module_file))
+    return files
+
+
+def get_imported_modules(file_path: Filename) -> list[Module]:
+    try:
+        tree = parse_file(file_path).tree
+    except (OSError, UnicodeDecodeError):
+        return []
+    if tree is None:
+        return []
+    package = [
+        part
+        for part in os.path.dirname(os.path.normpath(file_path)).split(os.sep)
+        if part
+    ]
+    modules: list[Module] = []
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Import):
+            modules.extend(alias.name for alias in node.names)
+        elif isinstance(node, ast.ImportFrom):
+            if node.level:
+                parts = package[: len(package) - node.level + 1]
+                base = ".".join([*parts, *([node.module] if node.module else [])])
+            else:
+                base = node.module or ""
+            if base:
+                modules.append(base)
+            # the imported names may be submodules rather than attributes
+            modules.extend(
+                f"{base}.{alias.name}" if base else alias.name for alias in node.names
+            )
+    return modules
+
+
+def get_dependencies(
+    files: Iterable[Filename], within: set[Filename] | None = None
+) -> dict[Filename, list[Filename]]:
+    # local modules each file imports, directly or not, optionally limited to the
+    # files the tool is given
+    imported: dict[Filename, set[Filename]] = {}
+
+    def get_imported_files(file_path: Filename) -> set[Filename]:
+        if file_path not in imported:
+            imported[file_path] = {
+                dependency
+                for module in get_imported_modules(file_path)
+                for dependency in get_module_files(module)
+                if within is None or dependency in within
+            }
+        return imported[file_path]
+
+    dependencies: dict[Filename, list[Filename]] = {}
+    for file_path in files:
+        seen = {file_path}
+        pending = [file_path]
+        while pending:
+            for dependency in get_imported_files(pending.pop()):
+                if dependency not in seen:
+                    seen.add(dependency)
+                    pending.append(dependency)
+        seen.discard(file_path)
+        dependencies[file_path] = sorted(seen)
+    return dependencies
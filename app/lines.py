@@ -0,0 +1,138 @@
+import sys
+from bisect import bisect_right
+from typing import Iterable, Iterator, Mapping
+
+WHOLE_FILE_END = sys.maxsize
+
+
+# Sorted, non-overlapping half-open intervals [start, end) of line numbers.
+class LineSet:
+    __slots__ = ("_starts", "_ends")
+
+    def __init__(self, intervals: Iterable[tuple[int, int]] = ()) -> None:
+        self._starts: list[int] = []
+        self._ends: list[int] = []
+        for start, end in sorted(i for i in intervals if i[0] < i[1]):
+            if self._ends and start <= self._ends[-1]:
+                self._ends[-1] = max(self._ends[-1], end)
+            else:
+                self._starts.append(start)
+                self._ends.append(end)
+
+    @classmethod
+    def from_range(cls, start: int, stop: int) -> "LineSet":
+        return cls(((start, stop),))
+
+    @classmethod
+    def from_lines(cls, lines: Iterable[int]) -> "LineSet":
+        intervals: list[tuple[int, int]] = []
+        for line in sorted(set(lines)):
+            if intervals and intervals[-1][1] == line:
+                intervals[-1] = (intervals[-1][0], line + 1)
+            else:
+                intervals.append((line, line + 1))
+        return cls(intervals)
+
+    @classmethod
+    def whole_file(cls) -> "LineSet":
+        return cls.from_range(1, WHOLE_FILE_END)
+
+    @property
+    def is_whole_file(self) -> bool:
+        return bool(self._ends) and self._ends[-1] == WHOLE_FILE_END
+
+    @property
+    def first_line(self) -> int | None:
+        return self._starts[0] if self._starts else None
+
+    @property
+    def last_line(self) -> int | None:
+        if not self._ends or self.is_whole_file:
+            return None
+        return self._ends[-1] - 1
+
+    def intervals(self) -> Iterator[tuple[int, int]]:
+        return zip(self._starts, self._ends)
+
+    def union(self, other: "LineSet") -> "LineSet":
+        return LineSet((*self.intervals(), *other.intervals()))
+
+    def intersection(self, other: "LineSet") -> "LineSet":
+        result: list[tuple[int, int]] = []
+        own, others = self.intervals(), other.intervals()
+        first, second = next(own, None), next(others, None)
+        while first is not None and second is not None:
+            start, end = max(first[0], second[0]), min(first[1], second[1])
+            if start < end:
+                result.append((start, end))
+            if first[1] < second[1]:
+                first = next(own, None)
+            else:
+                second = next(others, None)
+        return LineSet(result)
+
+    def overlaps(self, start: int, stop: int) -> bool:
+        index = bisect_right(self._starts, stop - 1) - 1
+        return index >= 0 and self._ends[index] > start
+
+    def expand(self, context: int) -> "LineSet":
+        if context <= 0:
+            return self
+        return LineSet(
+            (max(1, start - context), min(WHOLE_FILE_END, end + context))
+            for start, end in self.intervals()
+        )
+
+    __or__ = union
+    __and__ = intersection
+
+    def __contains__(self, line: object) -> bool:
+        if not isinstance(line, int):
+            return False
+        index = bisect_right(self._starts, line) - 1
+        return index >= 0 and line < self._ends[index]
+
+    def __iter__(self) -> Iterator[int]:
+        if self.is_whole_file:
+            raise ValueError("Cannot iterate over a whole-file line set")
+        for start, end in self.intervals():
+            yield from range(start, end)
+
+    def __len__(self) -> int:
+        if self.is_whole_file:
+            raise ValueError("A whole-file line set has no known length")
+        return sum(end - start for start, end in self.intervals())
+
+    def __bool__(self) -> bool:
+        return bool(self._starts)
+
+    def __eq__(self, other: object) -> bool:
+        if not isinstance(other, LineSet):
+            return NotImplemented
+        return self._starts == other._starts and self._ends == other._ends
+
+    def __hash__(self) -> int:
+        return hash((tuple(self._starts), tuple(self._ends)))
+
+    def __repr__(self) -> str:
+        if self.is_whole_file:
+            return "LineSet.whole_file()"
+        return f"LineSet({list(self.intervals())})"
+
+
+# Changed lines of every reviewed file, widened by a context window, that the
+# findings of all tools are joined against.
+class ChangedLineIndex:
+    __slots__ = ("files",)
+
+    def __init__(self, files: Mapping[str, LineSet], context: int = 0) -> None:
+        self.files = {
+            file: line_nos.expand(context) for file, line_nos in files.items()
+        }
+
+    def contains(self, file: str | None, line: int | None) -> bool:
+        line_nos = self.files.get(file) if file is not None else None
+        if line_nos is None:
+            return False
+        # findings without a line (e.g. a vulnerable dependency) concern the file
+        return line is None or line in line_nos
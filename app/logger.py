@@ -1,5 +1,6 @@
 import logging
 import os
+from typing import Iterable
 
 from app.config import settings
 
@@ -12,7 +13,15 @@ log_file_path = (
     if settings.TARGET_PROJECT
     else settings.RESULT_FILE_NAME
 )
-file_handler = logging.FileHandler(log_file_path, mode="w")
+# the report file is only created once something is logged
+file_handler = logging.FileHandler(log_file_path, mode="w", delay=True)
 
 logger.addHandler(terminal_handler)
 logger.addHandler(file_handler)
+
+
+def format_table(rows: Iterable[Iterable]) -> str:
+    # tabulate takes a while to import, so only load it once a table is printed
+    from tabulate import tabulate  # pylint: disable=import-outside-toplevel
+
+    return tabulate(rows)
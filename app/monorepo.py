@@ -0,0 +1,177 @@
+import contextvars
+import logging
+import os
+from functools import partial
+from typing import Callable
+
+from app.config import override_settings, settings
+from app.logger import format_table, logger
+from app.review import (
+    TargetCodeFiles,
+    TargetFiles,
+    TargetTestFiles,
+    get_files_to_check,
+    get_review_tasks,
+)
+from app.scheduler import Task, run_tasks
+
+Package = str
+PackageFiles = dict[Package, tuple[TargetCodeFiles, TargetTestFiles]]
+
+PACKAGE_CHECKS = ("rules", "pylint", "mypy")
+# the duplicate index, the test suite and Trivy are built once for the whole
+# repository
+SHARED_CHECKS = ("duplicates", "coverage", "vulnerability")
+
+_current_package: contextvars.ContextVar[Package | None] = contextvars.ContextVar(
+    "pyreview_package", default=None
+)
+
+
+# Marks every record with the package whose check logged it, before the
+# scheduler buffers it, so that per-package reports can pick their records.
+class PackageTagger(logging.Filter):
+    def filter(self, record: logging.LogRecord) -> bool:
+        if not hasattr(record, "package"):
+            record.package = _current_package.get()
+        return True
+
+
+def in_package(package: Package, func: Callable[[], None]) -> Callable[[], None]:
+    def run() -> None:
+        token = _current_package.set(package)
+        try:
+            func()
+        finally:
+            _current_package.reset(token)
+
+    return run
+
+
+def get_package_of(file_path: str, packages: list[Package]) -> Package | None:
+    # nested packages own their files, not the package around them
+    matches = [
+        package
+        for package in packages
+        if package == "." or file_path.startswith(f"{package}/")
+    ]
+    return max(matches, key=len, default=None)
+
+
+def partition_files(
+    files: TargetFiles, packages: list[Package]
+) -> dict[Package, TargetFiles]:
+    partitions: dict[Package, TargetFiles] = {package: {} for package in packages}
+    for file_path, line_nos in files.items():
+        package = get_package_of(file_path, packages)
+        if package is not None:
+            partitions[package][file_path] = line_nos
+    return partitions
+
+
+def get_package_files(packages: list[Package]) -> PackageFiles:
+    packages = [os.path.normpath(package) for package in packages]
+    # a single git diff (or listing of the tracked files) for all the packages
+    with override_settings(CODE_DIR=None):
+        code_files, test_files = get_files_to_check()
+    code_partitions = partition_files(code_files, packages)
+    test_partitions = partition_files(test_files, packages)
+    return {
+        package: (code_partitions[package], test_partitions[package])
+        for package in packages
+        if code_partitions[package] or test_partitions[package]
+    }
+
+
+def merge_package_files(
+    package_files: PackageFiles,
+) -> tuple[TargetCodeFiles, TargetTestFiles]:
+    all_code_files: TargetCodeFiles = {}
+    all_test_files: TargetTestFiles = {}
+    for code_files, test_files in package_files.values():
+        all_code_files.update(code_files)
+        all_test_files.update(test_files)
+    return all_code_files, all_test_files
+
+
+def get_package_tasks(
+    package: Package,
+    code_files: TargetFiles,
+    test_files: TargetFiles,
+    checks: list[str],
+) -> list[Task]:
+    header = partial(logger.info, "REVIEWING PACKAGE %s...", package)
+    return [
+        Task(f"{package}:header", in_package(package, header)),
+        *(
+            task._replace(
+                name=f"{package}:{task.name}",
+                func=in_package(package, task.func),
+                deps=tuple(f"{package}:{dep}" for dep in task.deps),
+            )
+            for task in get_review_tasks(code_files, test_files, checks)
+        ),
+    ]
+
+
+def get_monorepo_tasks(
+    package_files: PackageFiles, checks: list[str] | None = None
+) -> list[Task]:
+    checks = list(PACKAGE_CHECKS + SHARED_CHECKS) if checks is None else checks
+    package_checks = [check for check in checks if check not in SHARED_CHECKS]
+    shared_checks = [check for check in checks if check in SHARED_CHECKS]
+    tasks = []
+    for package, (code_files, test_files) in package_files.items():
+        tasks.extend(get_package_tasks(package, code_files, test_files, package_checks))
+    if shared_checks:
+        tasks.extend(
+            get_review_tasks(*merge_package_files(package_files), shared_checks)
+        )
+    return tasks
+
+
+def get_package_handler(package: Package) -> logging.Handler:
+    handler = logging.FileHandler(
+        os.path.join(package, settings.RESULT_FILE_NAME), mode="w", delay=True
+    )
+    handler.addFilter(lambda record: getattr(record, "package", None) == package)
+    return handler
+
+
+def report_packages(package_files: PackageFiles, results: dict[str, bool]) -> None:
+    rows = []
+    for package, (code_files, test_files) in package_files.items():
+        package_results = [
+            passed
+            for name, passed in results.items()
+            if name.startswith(f"{package}:") and name != f"{package}:header"
+        ]
+        rows.append(
+            (
+                package,
+                len(code_files) + len(test_files),
+                f"{sum(package_results)}/{len(package_results)}",
+            )
+        )
+    logger.info(format_table((("Package", "Files", "Checks passed"), *rows)))
+
+
+def run_monorepo_review(
+    package_files: PackageFiles, checks: list[str] | None = None
+) -> dict[str, bool]:
+    tagger = PackageTagger()
+    handlers = [get_package_handler(package) for package in package_files]
+    logger.addFilter(tagger)
+    for handler in handlers:
+        logger.addHandler(handler)
+    # a single mypy daemon cannot check several packages at the same time
+    with override_settings(MYPY_DAEMON=False):
+        try:
+            results = run_tasks(get_monorepo_tasks(package_files, checks))
+        finally:
+            for handler in handlers:
+                logger.removeHandler(handler)
+                handler.close()
+            logger.removeFilter(tagger)
+    report_packages(package_files, results)
+    return results
@@ -0,0 +1,116 @@
+import contextvars
+import os
+import signal
+import subprocess
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Iterator
+
+from app.profiling import span
+
+POLL_INTERVAL = 0.5  # seconds between checks for a cancelled review
+KILL_GRACE_PERIOD = 5.0  # seconds between SIGTERM and SIGKILL
+
+
+class IncompleteCheck(Exception):
+    """A check stopped before it could look at everything."""
+
+
+class DeadlineExceeded(IncompleteCheck):
+    pass
+
+
+class CheckCancelled(IncompleteCheck):
+    pass
+
+
+# Deadline (time.monotonic) of the running check and whether fail-fast may
+# cancel it; the scheduler sets them for every task.
+_deadline: contextvars.ContextVar[float | None] = contextvars.ContextVar(
+    "pyreview_deadline", default=None
+)
+_cancellable: contextvars.ContextVar[bool] = contextvars.ContextVar(
+    "pyreview_cancellable", default=False
+)
+review_cancelled = threading.Event()
+
+
+@contextmanager
+def time_budget(deadline: float | None, cancellable: bool) -> Iterator[None]:
+    deadline_token = _deadline.set(deadline)
+    cancellable_token = _cancellable.set(cancellable)
+    try:
+        yield
+    finally:
+        _deadline.reset(deadline_token)
+        _cancellable.reset(cancellable_token)
+
+
+def check_interrupted() -> None:
+    if _cancellable.get() and review_cancelled.is_set():
+        raise CheckCancelled("the review was cancelled")
+    deadline = _deadline.get()
+    if deadline is not None and time.monotonic() >= deadline:
+        raise DeadlineExceeded("ran out of time")
+
+
+def get_command_name(cmd: Any) -> str:
+    args = cmd.split() if isinstance(cmd, str) else [str(arg) for arg in cmd]
+    # e.g. "git diff" or "pylint", without options and file arguments
+    return " ".join(args[:2] if len(args) > 1 and args[1].isalpha() else args[:1])
+
+
+def kill_process_group(proc: subprocess.Popen) -> None:
+    # the tools start processes of their own (pytest workers, trivy plugins...)
+    for sig in (signal.SIGTERM, signal.SIGKILL):
+        try:
+            os.killpg(proc.pid, sig)
+        except ProcessLookupError:
+            return
+        try:
+            proc.wait(KILL_GRACE_PERIOD)
+            return
+        except subprocess.TimeoutExpired:
+            continue
+
+
+def run_interruptible(
+    cmd: Any,
+    input: Any = None,  # pylint: disable=redefined-builtin
+    capture_output: bool = False,
+    check: bool = False,
+    **kwargs: Any,
+) -> subprocess.CompletedProcess:
+    if capture_output:
+        kwargs["stdout"] = kwargs["stderr"] = subprocess.PIPE
+    if input is not None:
+        kwargs["stdin"] = subprocess.PIPE
+    with subprocess.Popen(cmd, start_new_session=True, **kwargs) as proc:
+        while True:
+            deadline = _deadline.get()
+            timeout = POLL_INTERVAL
+            if deadline is not None:
+                timeout = max(0.0, min(timeout, deadline - time.monotonic()))
+            try:
+                stdout, stderr = proc.communicate(input, timeout=timeout)
+                break
+            except subprocess.TimeoutExpired:
+                input = None  # already handed over to the process
+                try:
+                    check_interrupted()
+                except IncompleteCheck:
+                    kill_process_group(proc)
+                    raise
+    if check and proc.returncode:
+        raise subprocess.CalledProcessError(proc.returncode, cmd, stdout, stderr)
+    return subprocess.CompletedProcess(cmd, proc.returncode, stdout, stderr)
+
+
+def run_process(cmd: Any, **kwargs: Any) -> subprocess.CompletedProcess:
+    check_interrupted()
+    with span(get_command_name(cmd), "subprocess"):
+        if _deadline.get() is None and not _cancellable.get():
+            # pylint: disable-next=subprocess-run-check
+            return subprocess.run(cmd, **kwargs)
+        return run_interruptible(cmd, **kwargs)
@@ -0,0 +1,192 @@
+import contextvars
+import cProfile
+import json
+import os
+import resource
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Iterator
+
+from app.config import settings
+from app.logger import format_table, logger
+
+TRACE_FILE_NAME = "trace.json"
+
+
+class StageStats:
+    def __init__(self, name: str) -> None:
+        self.name = name
+        self.wall_time = 0.0
+        self.cpu_time = 0.0  # of the stage's own thread, subprocesses excluded
+        # high-water mark of the whole process when the stage ended, not of the
+        # stage alone
+        self.process_peak_rss = 0
+        self.files = 0
+        self.subprocesses = 0
+        self.subprocess_time = 0.0
+
+
+def get_peak_rss() -> int:
+    # high-water marks of pyreview itself and of its largest finished subprocess
+    peak = max(
+        resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss,
+    )
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+class Profiler:
+    def __init__(self, directory: str, cprofile: bool) -> None:
+        # the checks may run in another directory than the one it was created in
+        self.directory = os.path.abspath(directory)
+        self.cprofile = cprofile
+        self.stages: dict[str, StageStats] = {}
+        self.events: list[dict[str, Any]] = []
+        self._origin = time.perf_counter()
+        self._lock = threading.Lock()
+
+    def add_event(
+        self, name: str, category: str, start: float, end: float, **args: Any
+    ) -> None:
+        event = {
+            "name": name,
+            "cat": category,
+            "ph": "X",  # a complete event of the Chrome trace event format
+            "ts": (start - self._origin) * 1e6,
+            "dur": (end - start) * 1e6,
+            "pid": os.getpid(),
+            "tid": threading.get_ident(),
+            "args": args,
+        }
+        with self._lock:
+            self.events.append(event)
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[StageStats]:
+        stats = self.stages.setdefault(name, StageStats(name))
+        token = _current_stage.set(stats)
+        profile = cProfile.Profile() if self.cprofile else None
+        start = time.perf_counter()
+        start_cpu = time.thread_time()
+        try:
+            if profile is not None:
+                profile.enable()
+            yield stats
+        finally:
+            if profile is not None:
+                profile.disable()
+                os.makedirs(self.directory, exist_ok=True)
+                profile.dump_stats(os.path.join(self.directory, f"{name}.prof"))
+            end = time.perf_counter()
+            stats.wall_time += end - start
+            stats.cpu_time += time.thread_time() - start_cpu
+            stats.process_peak_rss = get_peak_rss()
+            _current_stage.reset(token)
+            self.add_event(name, "stage", start, end, files=stats.files)
+
+    @contextmanager
+    def span(self, name: str, category: str, **args: Any) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            end = time.perf_counter()
+            stats = _current_stage.get()
+            if stats is not None and category == "subprocess":
+                with self._lock:
+                    stats.subprocesses += 1
+                    stats.subprocess_time += end - start
+            self.add_event(name, category, start, end, **args)
+
+    def summary(self) -> str:
+        return format_table(
+            (
+                (
+                    "Stage",
+                    "Wall (s)",
+                    "CPU (s)",
+                    "Process peak RSS (MB)",
+                    "Files",
+                    "Subprocesses",
+                    "Subprocess (s)",
+                ),
+                *(
+                    (
+                        stats.name,
+                        f"{stats.wall_time:.3f}",
+                        f"{stats.cpu_time:.3f}",
+                        f"{stats.process_peak_rss / (1024 * 1024):.1f}",
+                        stats.files,
+                        stats.subprocesses,
+                        f"{stats.subprocess_time:.3f}",
+                    )
+                    for stats in self.stages.values()
+                ),
+            )
+        )
+
+    def write_trace(self) -> str:
+        os.makedirs(self.directory, exist_ok=True)
+        trace_path = os.path.join(self.directory, TRACE_FILE_NAME)
+        with self._lock, open(trace_path, "w", encoding="utf-8") as f:
+            json.dump({"traceEvents": self.events, "displayTimeUnit": "ms"}, f)
+        return trace_path
+
+
+_current_stage: contextvars.ContextVar[StageStats | None] = contextvars.ContextVar(
+    "pyreview_stage", default=None
+)
+_profiler: Profiler | None = None
+_profiler_lock = threading.Lock()
+
+
+def get_profiler() -> Profiler | None:
+    global _profiler  # pylint: disable=global-statement
+    if not settings.PROFILE:
+        return None
+    with _profiler_lock:
+        if _profiler is None:
+            _profiler = Profiler(settings.PROFILE_DIR, settings.PROFILE_CPROFILE)
+        return _profiler
+
+
+@contextmanager
+def stage(name: str) -> Iterator[None]:
+    profiler = get_profiler()
+    if profiler is None:
+        yield
+        return
+    with profiler.stage(name):
+        yield
+
+
+@contextmanager
+def span(name: str, category: str, **args: Any) -> Iterator[None]:
+    profiler = get_profiler()
+    if profiler is None:
+        yield
+        return
+    with profiler.span(name, category, **args):
+        yield
+
+
+def count_files(count: int) -> None:
+    stats = _current_stage.get()
+    if stats is not None:
+        stats.files += count
+
+
+def bind_context(func: Callable[..., Any]) -> Callable[..., Any]:
+    # worker threads of a pool do not inherit the stage of the thread using it
+    context = contextvars.copy_context()
+    return lambda *args: context.copy().run(func, *args)
+
+
+def write_profile() -> None:
+    profiler = get_profiler()
+    if profiler is None:
+        return
+    logger.info(profiler.summary())
+    logger.info("Profile trace written to %s", profiler.write_trace())
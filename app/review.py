@@ -1,27 +1,135 @@
+import glob
+import hashlib
 import json
 import os
 import re
+import shlex
 import subprocess
-from shutil import which
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from fnmatch import fnmatch
+from functools import partial
+from shutil import copyfile, which
+from typing import Iterable
 
-from tabulate import tabulate
-
-from app.config import settings
-from app.logger import logger
+from app.cache import (
+    cached_per_file,
+    file_digest,
+    get_cache,
+    get_config_digests,
+    make_key,
+    tool_version,
+)
+from app.config import get_absolute_project_paths, override_settings, settings
+from app.duplicates import find_duplicates
+from app.findings import (
+    ERROR,
+    NOTE,
+    WARNING,
+    Finding,
+    count_findings,
+    filter_findings,
+    is_new_finding,
+    report_findings,
+)
+from app.git import (
+    checkout_index,
+    get_changed_paths,
+    iter_diff_lines,
+    iter_staged_diff_lines,
+    list_files,
+)
+from app.impact import can_record_test_map, record_test_map, select_tests
+from app.imports import get_dependencies
+from app.lines import ChangedLineIndex, LineSet
+from app.logger import format_table, logger
+from app.process import IncompleteCheck, run_process
+from app.profiling import bind_context, count_files
+from app.rules import (
+    COMMENTED_CODE,
+    PRINT_DEBUG,
+    CommentedCodeRule,
+    FoundLines,
+    PrintDebugRule,
+    Rule,
+    RuleName,
+    get_default_rules,
+    run_rules,
+)
+from app.scheduler import Task, run_tasks
+from app.shards import (
+    get_cov_options,
+    is_per_worker_command,
+    run_sharded_tests,
+    run_worker_command,
+)
 
 Filename = str
-ChangedLineNo = int
-TargetFiles = dict[Filename, list[ChangedLineNo]]
+TargetFiles = dict[Filename, LineSet]
 TargetCodeFiles = TargetFiles
 TargetTestFiles = TargetFiles
 
+PYLINT_FATAL = 1
+PYLINT_USAGE_ERROR = 32
+PYLINT_MESSAGE_KEYS = (
+    "type",
+    "module",
+    "path",
+    "line",
+    "column",
+    "message-id",
+    "symbol",
+    "message",
+)
+PYLINT_CONFIG_FILES = [
+    ".pylintrc",
+    "pylintrc",
+    "pyproject.toml",
+    "setup.cfg",
+    "tox.ini",
+]
+PYLINT_SEVERITIES = {
+    "fatal": ERROR,
+    "error": ERROR,
+    "warning": WARNING,
+    "refactor": NOTE,
+    "convention": NOTE,
+    "info": NOTE,
+}
+
+MYPY_OPTIONS = ["--follow-imports=skip", "--ignore-missing-imports"]
+MYPY_CONFIG_FILES = ["mypy.ini", ".mypy.ini", "pyproject.toml", "setup.cfg"]
+MYPY_LINE_PATTERN = re.compile(
+    # the column and end position follow the line with show_column_numbers and
+    # show_error_end
+    r"^(?P<path>[^:]+):(?P<line>\d+)(?::\d+)*: (?P<severity>\w+): (?P<message>.*?)"
+    r"(?:  \[(?P<code>[\w-]+)\])?$"
+)
+
+TRIVY_SEVERITIES = {
+    "CRITICAL": ERROR,
+    "HIGH": ERROR,
+    "MEDIUM": WARNING,
+    "LOW": NOTE,
+    "UNKNOWN": NOTE,
+}
+
+# tasks that only exist for the sake of a check
+CHECK_OF_TASK = {"test_setup": "coverage", "test_teardown": "coverage"}
+
+DIFF_HEADER_PATTERN = re.compile(r"^diff --git a/.* b/(.*)$")
+HUNK_PATTERN = re.compile(r"^@@ -\S+ \+(\d+)(?:,(\d+))? @@")
+
+_type_stubs_lock = threading.Lock()
+
 
 def tool_is_available(tool_name: str) -> bool:
     return which(tool_name) is not None
 
 
 def get_current_branch() -> str | None:
-    res = subprocess.run(
+    res = run_process(
         "git branch --show-current",
         shell=True,
         check=True,
@@ -31,202 +139,761 @@ def get_current_branch() -> str | None:
     return res.stdout.strip()
 
 
+def is_pruned(file_path: str) -> bool:
+    directories = file_path.split("/")[:-1]
+    return any(
+        directory.startswith(".") or directory in settings.PRUNED_DIRS
+        for directory in directories
+    )
+
+
+def list_tracked_python_files() -> list[Filename] | None:
+    res = run_process(
+        ["git", "ls-files", "-z", "--cached", "--others", "--exclude-standard"]
+        + ["--", "*.py"],
+        capture_output=True,
+    )
+    if res.returncode != 0:
+        return None
+    paths = res.stdout.decode("utf-8", errors="surrogateescape").split("\0")
+    return [path for path in dict.fromkeys(paths) if path and not is_pruned(path)]
+
+
+def walk_python_files() -> list[Filename]:
+    file_paths = []
+    for root, dirs, files in os.walk(".", topdown=True):
+        dirs[:] = [
+            d for d in dirs if not d.startswith(".") and d not in settings.PRUNED_DIRS
+        ]
+        for name in files:
+            if name.endswith(".py"):
+                file_paths.append(os.path.join(root, name).removeprefix("./"))
+    return file_paths
+
+
+def count_lines(file_path: Filename) -> int:
+    line_no = 0
+    last_chunk = b"\n"
+    with open(file_path, "rb") as f:
+        while chunk := f.read(1 << 20):
+            line_no += chunk.count(b"\n")
+            last_chunk = chunk
+    return line_no + (not last_chunk.endswith(b"\n"))
+
+
 def get_all_python_files() -> tuple[TargetCodeFiles, TargetTestFiles]:
-    code_files: dict[Filename, list] = {}
-    test_files: dict[Filename, list] = {}
-    for root, _, files in os.walk(".", topdown=True):
-        if not root.startswith("./."):
-            for name in files:
-                if name.endswith(".py"):
-                    file_path = os.path.join(root, name).removeprefix("./")
-                    with open(file_path, "r", encoding="utf-8") as f:
-                        line_no = len(f.readlines())
-                    if "test" in file_path:
-                        test_files[file_path] = list(range(1, line_no))
-                    else:
-                        code_files[file_path] = list(range(1, line_no))
+    code_files: TargetFiles = {}
+    test_files: TargetFiles = {}
+    file_paths = list_tracked_python_files()
+    if file_paths is None:
+        file_paths = walk_python_files()
+    for file_path in file_paths:
+        if not os.path.isfile(file_path):
+            continue
+        line_no = count_lines(file_path)
+        if "test" in file_path:
+            test_files[file_path] = LineSet.from_range(1, line_no)
+        else:
+            code_files[file_path] = LineSet.from_range(1, line_no)
     return {k: v for k, v in code_files.items() if v}, {
         k: v for k, v in test_files.items() if v
     }
 
 
+def parse_changed_lines(diff_lines: Iterable[str]) -> TargetFiles:
+    hunks: dict[Filename, list[tuple[int, int]]] = {}
+    current_hunks: list[tuple[int, int]] | None = None
+    for line in diff_lines:
+        if line.startswith("diff --git "):
+            match = DIFF_HEADER_PATTERN.match(line)
+            current_hunks = hunks.setdefault(match.group(1), []) if match else None
+        elif line.startswith("@@") and current_hunks is not None:
+            match = HUNK_PATTERN.match(line)
+            if match:
+                start = int(match.group(1))
+                length = 1 if match.group(2) is None else int(match.group(2))
+                current_hunks.append((start, start + length))
+    changed_lines = {file: LineSet(file_hunks) for file, file_hunks in hunks.items()}
+    return {file: line_nos for file, line_nos in changed_lines.items() if line_nos}
+
+
+def get_changed_lines(*pathspecs: str) -> TargetFiles:
+    # git applies the pathspecs itself, so hunks of other files are never
+    # produced, let alone parsed.
+    return parse_changed_lines(iter_diff_lines(settings.TARGET_BRANCH, *pathspecs))
+
+
+def split_test_files(files: TargetFiles) -> tuple[TargetCodeFiles, TargetTestFiles]:
+    return {k: v for k, v in files.items() if "test" not in k}, {
+        k: v for k, v in files.items() if "test" in k
+    }
+
+
 def get_changed_python_files() -> tuple[TargetCodeFiles, TargetTestFiles]:
-    diff_file_name = "/tmp/diff_code.txt"
-    subprocess.run(
-        f"git diff {settings.TARGET_BRANCH} -U0 > {diff_file_name}",
-        shell=True,
-        check=True,
+    return split_test_files(get_changed_lines(f"{settings.CODE_DIR or ''}*.py"))
+
+
+def get_staged_python_files() -> tuple[TargetCodeFiles, TargetTestFiles]:
+    return split_test_files(
+        parse_changed_lines(iter_staged_diff_lines(f"{settings.CODE_DIR or ''}*.py"))
     )
 
-    with open(diff_file_name, "r", encoding="utf-8") as f:
-        all_lines = f.readlines()
-    code_files: dict[Filename, list] = {}
-    test_files: dict[Filename, list] = {}
-    current_file: str | None = None
-    for line in all_lines:
-        if re.match(r"^diff --git\s.*\s.*py\n$", line):
-            current_file = line.split(" ")[2][2:]
-        elif re.match(r"^diff --git\s.*\s.*\n$", line):
-            current_file = None
-        elif re.match(r"@@\s[0-9\+\-,\s]*\s@@", line) and current_file is not None:
-            new_lines_no = line.split("@@")[1].split(" ")[-2][1:]
-            if "," not in new_lines_no:
-                new_lines = [int(new_lines_no)]
-            else:
-                start, length = new_lines_no.split(",")
-                new_lines = list(range(int(start), int(start) + int(length)))
-            if not settings.CODE_DIR or current_file.startswith(settings.CODE_DIR):
-                if "test" in current_file:
-                    test_files.setdefault(current_file, []).extend(new_lines)
-                else:
-                    code_files.setdefault(current_file, []).extend(new_lines)
-    return {k: v for k, v in code_files.items() if v}, {
-        k: v for k, v in test_files.items() if v
+
+def get_changed_line_index(files: TargetFiles) -> ChangedLineIndex:
+    return ChangedLineIndex(files, settings.CHANGED_LINES_CONTEXT)
+
+
+def get_rule_findings(
+    found: dict[RuleName, FoundLines], rules: list[Rule]
+) -> list[Finding]:
+    messages = {rule.name: rule.message for rule in rules}
+    return [
+        Finding("pyreview", name, file, line_no, WARNING, messages[name])
+        for name, found_lines in found.items()
+        for file, line_nos in found_lines.items()
+        for line_no in line_nos
+    ]
+
+
+def run_and_report_rules(
+    files: TargetFiles, rules: list[Rule]
+) -> dict[RuleName, FoundLines]:
+    found = run_rules(files, rules)
+    findings = [
+        finding
+        for finding in get_rule_findings(found, rules)
+        if is_new_finding(finding)
+    ]
+    report_findings(findings)
+    new_lines = {(finding.rule, finding.file, finding.line) for finding in findings}
+    return {
+        name: {
+            file: new_line_nos
+            for file, line_nos in found_lines.items()
+            if (
+                new_line_nos := [
+                    line_no
+                    for line_no in line_nos
+                    if (name, file, line_no) in new_lines
+                ]
+            )
+        }
+        for name, found_lines in found.items()
     }
 
 
-def get_files_with_debug_code(files: TargetFiles) -> TargetFiles:
-    files_with_debug_code: TargetFiles = {}
-    for file_path in files:
-        with open(file_path, "r", encoding="utf-8") as f:
-            for i, line in enumerate(f.readlines()):
-                line_no = i + 1
-                if re.search(r"\s*print(.*)", line) and line_no in files[file_path]:
-                    files_with_debug_code.setdefault(file_path, []).append(line_no)
-    return files_with_debug_code
-
-
-def get_files_with_commented_code(files: TargetFiles) -> TargetFiles:
-    files_with_commented_code: TargetFiles = {}
-    for file_path in files:
-        with open(file_path, "r", encoding="utf-8") as f:
-            for i, line in enumerate(f.readlines()):
-                line_no = i + 1
-                if (
-                    re.search(r".*#.*", line)
-                    and not any(
-                        re.search(f"{comment}$", line)
-                        for comment in settings.ACCEPTED_COMMENTS
-                    )
-                    and line_no in files[file_path]
-                ):
-                    files_with_commented_code.setdefault(file_path, []).append(line_no)
-    return files_with_commented_code
+def get_files_with_debug_code(files: TargetFiles) -> FoundLines:
+    return run_and_report_rules(files, [PrintDebugRule()])[PRINT_DEBUG]
+
+
+def get_files_with_commented_code(files: TargetFiles) -> FoundLines:
+    rule = CommentedCodeRule(settings.ACCEPTED_COMMENTS)
+    return run_and_report_rules(files, [rule])[COMMENTED_CODE]
 
 
 def get_files_to_check() -> tuple[TargetCodeFiles, TargetTestFiles]:
     current_branch = get_current_branch()
     if current_branch != settings.TARGET_BRANCH:
-        return get_changed_python_files()
-    return get_all_python_files()
+        code_files, test_files = get_changed_python_files()
+    else:
+        code_files, test_files = get_all_python_files()
+    count_files(len(code_files) + len(test_files))
+    return code_files, test_files
+
+
+def split_output_per_file(
+    files: list[Filename], output: str
+) -> dict[Filename, list[str]]:
+    output_per_file: dict[Filename, list[str]] = {file: [] for file in files}
+    header = None
+    for line in output.splitlines():
+        if line.startswith("****"):
+            header = line
+            continue
+        file = line.split(":", 1)[0]
+        if file in output_per_file:
+            if header is not None:
+                output_per_file[file].append(header)
+                header = None
+            output_per_file[file].append(line)
+    return output_per_file
+
+
+def run_pylint_shard(
+    files: list[Filename], disable_options: list[str]
+) -> dict[Filename, list[dict]] | None:
+    res = run_process(
+        [
+            "pylint",
+            "--output-format=json",
+            f"--disable={','.join(disable_options)}",
+            *files,
+        ],
+        capture_output=True,
+        text=True,
+    )
+    if res.returncode & PYLINT_USAGE_ERROR:
+        logger.warning(res.stderr or res.stdout)
+        return None
+    try:
+        messages = json.loads(res.stdout or "[]")
+    except ValueError:
+        logger.warning(res.stderr or res.stdout)
+        return None
+    if res.returncode & PYLINT_FATAL and res.stderr:
+        # the fatal message is reported for its file, pylint explains crashes here
+        logger.warning(res.stderr)
+    messages_per_file: dict[Filename, list[dict]] = {file: [] for file in files}
+    for message in messages:
+        path = os.path.normpath(message["path"])
+        messages_per_file.setdefault(path, []).append(
+            {key: message.get(key) for key in PYLINT_MESSAGE_KEYS}
+        )
+    return messages_per_file
+
+
+def run_pylint(
+    files: list[Filename], disable_options: list[str]
+) -> dict[Filename, list[dict]]:
+    workers = settings.MAX_WORKERS or os.cpu_count() or 1
+    shard_size = min(settings.PYLINT_SHARD_SIZE, max(1, -(-len(files) // workers)))
+    shards = [files[i : i + shard_size] for i in range(0, len(files), shard_size)]
+    messages_per_file: dict[Filename, list[dict]] = {}
+    with ThreadPoolExecutor(max_workers=min(workers, len(shards) or 1)) as executor:
+        for shard_messages in executor.map(
+            bind_context(lambda shard: run_pylint_shard(shard, disable_options)),
+            shards,
+        ):
+            if shard_messages is not None:
+                messages_per_file.update(shard_messages)
+    return messages_per_file
 
 
-def check_code_with_pylint(code_files: TargetFiles, test_files: TargetFiles) -> None:
+def get_pylint_finding(message: dict) -> Finding:
+    return Finding(
+        "pylint",
+        message["symbol"],
+        message["path"],
+        message["line"],
+        PYLINT_SEVERITIES.get(message.get("type") or "", NOTE),
+        f"{message['message-id']}: {message['message']}",
+    )
+
+
+def format_pylint_message(message: dict) -> str:
+    return (
+        f"{message['path']}:{message['line']}:{message['column']}: "
+        f"{message['message-id']}: {message['message']} ({message['symbol']})"
+    )
+
+
+def filter_pylint_messages(
+    messages_per_file: dict[Filename, list[dict]], changed_lines: ChangedLineIndex
+) -> tuple[list[str], list[Finding]]:
+    related_lines = []
+    findings = []
+    current_module = None
+    for file, messages in messages_per_file.items():
+        for message in messages:
+            # a fatal message (e.g. a syntax error) means the file was not analyzed
+            if message["type"] != "fatal" and not changed_lines.contains(
+                file, message["line"]
+            ):
+                continue
+            finding = get_pylint_finding(message)
+            if not is_new_finding(finding):
+                continue
+            if message["module"] != current_module:
+                current_module = message["module"]
+                related_lines.append(f"************* Module {current_module}")
+            related_lines.append(format_pylint_message(message))
+            findings.append(finding)
+    return related_lines, findings
+
+
+def check_code_with_pylint(
+    code_files: TargetFiles,
+    test_files: TargetFiles,
+    changed_lines: ChangedLineIndex | None = None,
+) -> None:
     logger.info("CHECKING CODE USING Pylint...")
-    all_files = {**code_files, **test_files}
-    lint_output = []
-    if code_files:
-        pylint_code_opts = [
-            f"--disable={','.join(settings.PYLINT_DISABLE_OPTIONS_CODE_FILES)}",
-            *code_files.keys(),
-        ]
-        res = subprocess.run(
-            f'pylint {" ".join(pylint_code_opts)}',
-            shell=True,
-            capture_output=True,
-            text=True,
+    count_files(len(code_files) + len(test_files))
+    if changed_lines is None:
+        changed_lines = get_changed_line_index({**code_files, **test_files})
+    related_lines = []
+    findings = []
+    for files, disable_options in (
+        (code_files, settings.PYLINT_DISABLE_OPTIONS_CODE_FILES),
+        (test_files, settings.PYLINT_DISABLE_OPTIONS_TEST_FILES),
+    ):
+        if not files:
+            continue
+        messages_per_file = cached_per_file(
+            "pylint",
+            [
+                disable_options,
+                PYLINT_MESSAGE_KEYS,
+                get_config_digests(PYLINT_CONFIG_FILES),
+            ],
+            files,
+            partial(run_pylint, disable_options=disable_options),
+            # pylint infers through every local module a file imports
+            dependencies=get_dependencies(files),
         )
-        lint_output.extend(res.stdout.splitlines())
-    if test_files:
-        pylint_test_opts = [
-            f"--disable={','.join(settings.PYLINT_DISABLE_OPTIONS_TEST_FILES)}",
-            *test_files.keys(),
-        ]
-        res = subprocess.run(
-            f'pylint {" ".join(pylint_test_opts)}',
-            shell=True,
-            capture_output=True,
-            text=True,
+        files_lines, files_findings = filter_pylint_messages(
+            messages_per_file, changed_lines
         )
-        lint_output.extend(res.stdout.splitlines())
-    related_lines = []
-    for line in lint_output:
-        if line.startswith("****"):
-            related_lines.append(line)
-        else:
-            for file, line_nos in all_files.items():
-                if line.startswith(file):
-                    line_no = line.split(":")[1]
-                    if int(line_no) in line_nos:
-                        related_lines.append(line)
+        related_lines.extend(files_lines)
+        findings.extend(files_findings)
 
+    report_findings(findings)
     logger.info("\n".join(related_lines))
 
 
-def check_print_debug(files: TargetFiles) -> None:
+def report_print_debug(files_with_debug_code: FoundLines) -> None:
     logger.info("CHECK FOR PRINT DEBUG...")
-    files_with_debug_code = get_files_with_debug_code(files)
-    logger.info(tabulate((("File", "Line number"), *files_with_debug_code.items())))
+    logger.info(format_table((("File", "Line number"), *files_with_debug_code.items())))
 
 
-def check_commented_code(files: TargetFiles) -> None:
+def report_commented_code(files_with_commented_code: FoundLines) -> None:
     logger.info("CHECK FOR COMMENTED CODE...")
-    files_with_commented_code = get_files_with_commented_code(files)
-    logger.info(tabulate((("File", "Line number"), *files_with_commented_code.items())))
+    logger.info(
+        format_table((("File", "Line number"), *files_with_commented_code.items()))
+    )
+
+
+def report_banned_patterns(found: dict[RuleName, FoundLines]) -> None:
+    logger.info("CHECK FOR BANNED PATTERNS...")
+    logger.info(
+        format_table(
+            (
+                ("Rule", "File", "Line number"),
+                *(
+                    (name, file, line_nos)
+                    for name, found_lines in found.items()
+                    for file, line_nos in found_lines.items()
+                ),
+            )
+        )
+    )
+
+
+def check_print_debug(files: TargetFiles) -> None:
+    report_print_debug(get_files_with_debug_code(files))
+
+
+def check_commented_code(files: TargetFiles) -> None:
+    report_commented_code(get_files_with_commented_code(files))
+
 
+def check_rules(
+    files: TargetFiles, changed_lines: ChangedLineIndex | None = None
+) -> None:
+    count_files(len(files))
+    if changed_lines is None:
+        changed_lines = get_changed_line_index(files)
+    # the rules only look at the changed lines (and their context) to begin with
+    found = run_and_report_rules(changed_lines.files, get_default_rules())
+    report_print_debug(found.pop(PRINT_DEBUG))
+    report_commented_code(found.pop(COMMENTED_CODE))
+    if found:
+        report_banned_patterns(found)
 
-def check_code_with_mypy(files: TargetFiles) -> None:
+
+def get_repository_python_files() -> list[Filename]:
+    file_paths = list_tracked_python_files()
+    return walk_python_files() if file_paths is None else file_paths
+
+
+def check_duplicate_code(
+    files: TargetFiles, changed_lines: ChangedLineIndex | None = None
+) -> None:
+    logger.info("CHECKING DUPLICATE CODE...")
+    if get_cache() is None:
+        # without a persistent index, every review would fingerprint every file
+        logger.info("CACHE_DIR is not set, skipping the duplicate code check.")
+        return
+    if changed_lines is None:
+        changed_lines = get_changed_line_index(files)
+    repository_files = get_repository_python_files()
+    count_files(len(repository_files))
+    duplicates = find_duplicates(changed_lines.files, repository_files)
+    findings = [
+        Finding(
+            "pyreview",
+            "duplicate_code",
+            file,
+            duplicate.start,
+            WARNING,
+            f"Lines {duplicate.start}-{duplicate.end} duplicate "
+            f"{duplicate.other_file}:{duplicate.other_start}-{duplicate.other_end}",
+        )
+        for file, file_duplicates in duplicates.items()
+        for duplicate in file_duplicates
+    ]
+    report_findings(findings)
+    logger.info(
+        format_table(
+            (
+                ("File", "Line", "Duplicate"),
+                *((f.file, f.line, f.message) for f in findings),
+            )
+        )
+    )
+
+
+def get_stub_requirements_digest() -> str:
+    digest = hashlib.sha256()
+    for pattern in settings.MYPY_STUB_REQUIREMENT_FILES:
+        for file_path in sorted(glob.glob(pattern)):
+            digest.update(file_path.encode("utf-8"))
+            digest.update(file_digest(file_path).encode("utf-8"))
+    return digest.hexdigest()
+
+
+def install_type_stubs() -> None:
+    # the packages of a monorepo review run mypy at the same time
+    with _type_stubs_lock:
+        marker_path = os.path.join(".mypy_cache", "pyreview_stubs.sha256")
+        requirements_digest = get_stub_requirements_digest()
+        try:
+            with open(marker_path, "r", encoding="utf-8") as f:
+                if f.read() == requirements_digest:
+                    return
+        except OSError:
+            pass
+        res = run_process("mypy --install-types --non-interactive", shell=True)
+        if res.returncode == 0:
+            os.makedirs(os.path.dirname(marker_path), exist_ok=True)
+            with open(marker_path, "w", encoding="utf-8") as f:
+                f.write(requirements_digest)
+
+
+def run_mypy(files: list[Filename]) -> dict[Filename, list[str]]:
+    if settings.MYPY_DAEMON:
+        cmd = ["dmypy", "run", "--", *MYPY_OPTIONS, *files]
+    else:
+        cmd = ["mypy", *MYPY_OPTIONS, *files]
+    res = run_process(cmd, capture_output=True, text=True)
+    if res.returncode not in (0, 1):
+        logger.warning(res.stderr or res.stdout)
+        return {}
+    return split_output_per_file(files, res.stdout)
+
+
+def get_mypy_finding(line: str) -> Finding | None:
+    match = MYPY_LINE_PATTERN.match(line)
+    if not match:
+        if ": error:" not in line:
+            return None
+        # e.g. an error about a whole file, which must not get lost either
+        return Finding("mypy", "mypy", line.split(":", 1)[0], None, ERROR, line)
+    return Finding(
+        "mypy",
+        match["code"] or "mypy",
+        match["path"],
+        int(match["line"]),
+        ERROR if match["severity"] == "error" else NOTE,
+        match["message"],
+    )
+
+
+def check_code_with_mypy(
+    files: TargetFiles, changed_lines: ChangedLineIndex | None = None
+) -> None:
     logger.info("CHECKING CODE USING mypy...")
-    subprocess.run("mypy --install-types --non-interactive", shell=True)
-    CMD = "mypy --follow-imports=skip --ignore-missing-imports " + " ".join(
-        files.keys()
+    count_files(len(files))
+    if changed_lines is None:
+        changed_lines = get_changed_line_index(files)
+    install_type_stubs()
+    if settings.MYPY_DAEMON:
+        # the daemon keeps its own incremental state and re-checks only what changed
+        output_per_file = run_mypy(list(files))
+    else:
+        # with --follow-imports=skip, only the imports mypy is given are analyzed
+        dependencies = get_dependencies(files, within=set(files))
+        output_per_file = cached_per_file(
+            "mypy",
+            [MYPY_OPTIONS, get_config_digests(MYPY_CONFIG_FILES)],
+            files,
+            lambda misses: run_mypy(
+                sorted(set(misses).union(*(dependencies[miss] for miss in misses)))
+            ),
+            dependencies=dependencies,
+        )
+    output = []
+    findings = []
+    for file, lines in output_per_file.items():
+        for line in lines:
+            finding = get_mypy_finding(line)
+            if finding is None:
+                continue
+            if finding.line is not None and not changed_lines.contains(
+                file, finding.line
+            ):
+                continue
+            if not is_new_finding(finding):
+                continue
+            output.append(line)
+            findings.append(finding)
+    report_findings(findings)
+    if output:
+        logger.info("\n".join(output))
+    # mypy's own summary counts the whole files, not their changed lines
+    logger.info(
+        "%d issues found in the changed lines of %d files "
+        "(mypy output filtered to the changed lines)",
+        len(findings),
+        len(files),
     )
-    res = subprocess.run(CMD, shell=True, capture_output=True, text=True)
-    logger.info(res.stdout)
+
+
+def setup_test_environment() -> None:
+    if settings.TEST_WORKERS > 1 and is_per_worker_command(settings.TEST_SETUP_COMMAND):
+        return  # every shard sets up its own environment
+    run_worker_command(settings.TEST_SETUP_COMMAND, 0)
+
+
+def teardown_test_environment() -> None:
+    if settings.TEST_WORKERS > 1 and is_per_worker_command(
+        settings.TEST_TEARDOWN_COMMAND
+    ):
+        return
+    run_worker_command(settings.TEST_TEARDOWN_COMMAND, 0)
+
+
+def render_coverage_html(source_files: list[Filename]) -> dict[Filename, str]:
+    if not source_files:
+        return {}
+    res = run_process(
+        [
+            "coverage",
+            "html",
+            "-d",
+            settings.COV_HTML_DIR,
+            f"--include={','.join(source_files)}",
+        ],
+        capture_output=True,
+        text=True,
+    )
+    if res.returncode != 0:
+        logger.warning(res.stderr or res.stdout)
+        return {}
+    # coverage's own index of the report maps every source file to its page
+    with open(
+        os.path.join(settings.COV_HTML_DIR, "status.json"), "r", encoding="utf-8"
+    ) as f:
+        status = json.load(f)
+    html_pages = {}
+    for key, entry in status.get("files", {}).items():
+        index = entry.get("index", {})
+        if "file" in index:
+            html_pages[index["file"]] = index.get("url") or f"{key}.html"
+    return html_pages
+
+
+def get_files_not_covered(
+    cov_report: dict, files: TargetFiles
+) -> list[tuple[Filename, set[int]]]:
+    files_not_covered = []
+    for file, data in cov_report["files"].items():
+        if file in files:
+            not_covered_lines = files[file].intersection(
+                LineSet.from_lines(data["missing_lines"])
+            )
+            if data["missing_lines"] != 0 and not_covered_lines:
+                files_not_covered.append((file, set(not_covered_lines)))
+    return files_not_covered
+
+
+def get_coverage_links(
+    files_not_covered: list[tuple[Filename, set[int]]], html_pages: dict[Filename, str]
+) -> list[tuple[str, set[int]]]:
+    return [
+        (
+            "file://"
+            + os.path.abspath(os.path.join(settings.COV_HTML_DIR, html_pages[file])),
+            not_covered_lines,
+        )
+        for file, not_covered_lines in files_not_covered
+        if file in html_pages
+    ]
 
 
 def check_code_coverage(files: TargetFiles) -> None:
     logger.info("CHECKING CODE COVERAGE...")
-    if settings.TEST_SETUP_COMMAND:
-        subprocess.run(settings.TEST_SETUP_COMMAND, shell=True, check=True)
-    try:
-        subprocess.run(
-            f"pytest --cov-report json:{settings.COV_JSON_FILE_PATH} --cov-report html:{settings.COV_HTML_DIR} --cov={settings.CODE_DIR} .",
-            shell=True,
-            check=True,
-        )
-    except subprocess.CalledProcessError:
-        return
+    count_files(len(files))
+    test_targets = None
+    record_contexts = False
+    if settings.TEST_IMPACT_ANALYSIS:
+        test_targets = select_tests()
+        record_contexts = test_targets is None and can_record_test_map()
+    if settings.TEST_WORKERS > 1:
+        if not run_sharded_tests(test_targets, record_contexts):
+            return
+    else:
+        pytest_opts = [
+            f"--cov-report json:{settings.COV_JSON_FILE_PATH}",
+            *get_cov_options(),
+            *(["--cov-context=test"] if record_contexts else []),
+            *(map(shlex.quote, test_targets) if test_targets else ["."]),
+        ]
+        try:
+            run_process(f"pytest {' '.join(pytest_opts)}", shell=True, check=True)
+        except subprocess.CalledProcessError:
+            return
+    if record_contexts:
+        record_test_map()
     with open(settings.COV_JSON_FILE_PATH, "r", encoding="utf-8") as f:
         cov_report = json.load(f)
-        files_not_covered = []
-        for file, data in cov_report["files"].items():
-            if file in files:
-                not_covered_lines = set(files[file]).intersection(
-                    set(data["missing_lines"])
-                )
-                if data["missing_lines"] != 0 and not_covered_lines:
-                    files_not_covered.append((file, not_covered_lines))
-    files_not_covered_links = []
-    for file in os.listdir(settings.COV_HTML_DIR):
-        for related_file, not_covered_lines in files_not_covered:
-            with open(f"{settings.COV_HTML_DIR}/{file}", "r", encoding="utf-8") as f:
-                if (
-                    file.endswith(
-                        f"{related_file.split('/')[-1].replace('.', '_')}.html"
-                    )
-                    and related_file in f.read()
-                ):
-                    files_not_covered_links.append(
-                        (
-                            f"file://{os.getcwd()}/{settings.COV_HTML_DIR}/{file}",
-                            not_covered_lines,
-                        )
-                    )
+    files_not_covered = get_files_not_covered(cov_report, files)
+    report_findings(
+        Finding(
+            "coverage",
+            "uncovered-line",
+            file,
+            line_no,
+            WARNING,
+            "Changed line is not covered by tests",
+        )
+        for file, not_covered_lines in files_not_covered
+        for line_no in sorted(not_covered_lines)
+    )
+    html_pages = render_coverage_html([file for file, _ in files_not_covered])
+    files_not_covered_links = get_coverage_links(files_not_covered, html_pages)
     logger.info("The following files is not fully covered by tests:")
-    logger.info(tabulate((("File link", "Line number"), *files_not_covered_links)))
-    if settings.TEST_TEARDOWN_COMMAND:
-        subprocess.run(settings.TEST_TEARDOWN_COMMAND, shell=True, check=True)
+    logger.info(format_table((("File link", "Line number"), *files_not_covered_links)))
+
+
+def get_trivy_command(scanners: str, target: str = ".") -> list[str]:
+    cmd = ["trivy", "fs", "--format", "json", "--scanners", scanners]
+    if settings.TRIVY_CACHE_DIR:
+        cmd.extend(["--cache-dir", settings.TRIVY_CACHE_DIR])
+    if settings.TRIVY_OFFLINE:
+        cmd.extend(["--skip-db-update", "--offline-scan"])
+    return [*cmd, target]
+
+
+def get_files_digest(patterns: list[str]) -> str:
+    digest = hashlib.sha256()
+    for file_path in list_files(*patterns):
+        if os.path.isfile(file_path):
+            digest.update(file_path.encode("utf-8"))
+            digest.update(file_digest(file_path).encode("utf-8"))
+    return digest.hexdigest()
+
+
+def run_trivy(
+    scanners: str, target: str = ".", cache_key: str | None = None
+) -> list[Finding]:
+    cache = get_cache()
+    if cache is not None and cache_key is not None:
+        key = make_key("trivy", tool_version("trivy"), "json", scanners, cache_key)
+        findings = cache.get(key)
+        if findings is not None:
+            return [Finding(*finding) for finding in findings]
+    res = run_process(
+        get_trivy_command(scanners, target), capture_output=True, text=True
+    )
+    if res.returncode != 0:
+        # e.g. the vulnerability DB could not be downloaded
+        raise IncompleteCheck(
+            f"trivy exited with status {res.returncode}: {res.stderr.strip()}"
+        )
+    findings = get_trivy_findings(json.loads(res.stdout or "{}"))
+    if cache is not None and cache_key is not None:
+        cache.set(key, findings)
+    return findings
+
+
+def get_trivy_findings(report: dict) -> list[Finding]:
+    findings = []
+    for result in report.get("Results") or []:
+        target = result.get("Target")
+        for vuln in result.get("Vulnerabilities") or []:
+            fixed_version = vuln.get("FixedVersion")
+            findings.append(
+                Finding(
+                    "trivy",
+                    vuln["VulnerabilityID"],
+                    target,
+                    None,
+                    TRIVY_SEVERITIES.get(vuln.get("Severity"), NOTE),
+                    f"{vuln.get('PkgName')} {vuln.get('InstalledVersion')}: "
+                    f"{vuln.get('Title', '')}"
+                    + (f" (fixed in {fixed_version})" if fixed_version else ""),
+                )
+            )
+        for misconfig in result.get("Misconfigurations") or []:
+            if misconfig.get("Status") == "PASS":
+                continue
+            findings.append(
+                Finding(
+                    "trivy",
+                    misconfig["ID"],
+                    target,
+                    (misconfig.get("CauseMetadata") or {}).get("StartLine") or None,
+                    TRIVY_SEVERITIES.get(misconfig.get("Severity"), NOTE),
+                    misconfig.get("Message") or misconfig.get("Title", ""),
+                )
+            )
+        for secret in result.get("Secrets") or []:
+            findings.append(
+                Finding(
+                    "trivy",
+                    secret["RuleID"],
+                    target,
+                    secret.get("StartLine"),
+                    TRIVY_SEVERITIES.get(secret.get("Severity"), NOTE),
+                    secret.get("Title", ""),
+                )
+            )
+        for license_ in result.get("Licenses") or []:
+            findings.append(
+                Finding(
+                    "trivy",
+                    license_.get("Name", "license"),
+                    license_.get("FilePath") or target,
+                    None,
+                    TRIVY_SEVERITIES.get(license_.get("Severity"), NOTE),
+                    f"{license_.get('PkgName')}: {license_.get('Name')} license "
+                    f"({license_.get('Category')})",
+                )
+            )
+    return findings
+
+
+def report_trivy_findings(findings: list[Finding]) -> None:
+    report_findings(findings)
+    logger.info(
+        format_table(
+            (
+                ("File", "Line", "ID", "Severity", "Message"),
+                *(
+                    (f.file, f.line or "", f.rule, f.severity, f.message)
+                    for f in findings
+                ),
+            )
+        )
+    )
+
+
+def matches_any(path: str, patterns: list[str]) -> bool:
+    return any(
+        fnmatch(path, pattern) or fnmatch(path, pattern.removeprefix("**/"))
+        for pattern in patterns
+    )
+
+
+def scan_changed_paths_for_secrets(changed_paths: list[str]) -> list[Finding]:
+    with tempfile.TemporaryDirectory() as scan_dir:
+        for path in changed_paths:
+            if not os.path.isfile(path):
+                continue
+            scan_path = os.path.join(scan_dir, path)
+            os.makedirs(os.path.dirname(scan_path), exist_ok=True)
+            copyfile(path, scan_path)
+        return run_trivy("secret", scan_dir)
 
 
 def check_vulnerability():
@@ -234,11 +901,101 @@ def check_vulnerability():
     if not tool_is_available("trivy"):
         logger.info("Trivy is not available. Skipping vulnerability check.")
         return
-    res = subprocess.run(
-        "trivy fs --scanners vuln,secret,config,license .",
-        shell=True,
-        check=True,
-        capture_output=True,
-        text=True,
+    if get_current_branch() == settings.TARGET_BRANCH:
+        report_trivy_findings(run_trivy("vuln,secret,config,license"))
+        return
+    changed_paths = get_changed_paths(settings.TARGET_BRANCH)
+    count_files(len(changed_paths))
+    # untracked and binary files have no hunks, so they count as changed as a whole
+    changed_lines = get_changed_line_index(
+        {
+            **{path: LineSet.whole_file() for path in changed_paths},
+            **get_changed_lines(),
+        }
     )
-    logger.info(res.stdout)
+    if not settings.TRIVY_SCOPED:
+        report_trivy_findings(
+            filter_findings(run_trivy("vuln,secret,config,license"), changed_lines)
+        )
+        return
+    for scanners, patterns in (
+        ("vuln,license", settings.TRIVY_MANIFEST_FILES),
+        ("config", settings.TRIVY_CONFIG_FILES),
+    ):
+        if any(matches_any(path, patterns) for path in changed_paths):
+            cache_key = get_files_digest(patterns)
+            report_trivy_findings(
+                filter_findings(run_trivy(scanners, cache_key=cache_key), changed_lines)
+            )
+        else:
+            logger.info("No relevant file changed, skipping Trivy %s scan.", scanners)
+    if changed_paths:
+        report_trivy_findings(
+            filter_findings(
+                scan_changed_paths_for_secrets(changed_paths), changed_lines
+            )
+        )
+
+
+def get_review_tasks(
+    code_files: TargetFiles, test_files: TargetFiles, checks: list[str] | None = None
+) -> list[Task]:
+    all_files = {**code_files, **test_files}
+    changed_lines = get_changed_line_index(all_files)
+    tasks = [
+        Task("rules", lambda: check_rules(all_files, changed_lines)),
+        Task(
+            "pylint",
+            lambda: check_code_with_pylint(code_files, test_files, changed_lines),
+        ),
+        Task("mypy", lambda: check_code_with_mypy(all_files, changed_lines)),
+        Task("duplicates", lambda: check_duplicate_code(all_files, changed_lines)),
+        Task("test_setup", setup_test_environment),
+        Task("coverage", lambda: check_code_coverage(all_files), deps=("test_setup",)),
+        Task(
+            "test_teardown",
+            teardown_test_environment,
+            deps=("coverage",),
+            always_run=True,
+        ),
+        Task("vulnerability", check_vulnerability),
+    ]
+    if checks is None:
+        return tasks
+    return [task for task in tasks if CHECK_OF_TASK.get(task.name, task.name) in checks]
+
+
+def run_review(
+    code_files: TargetFiles, test_files: TargetFiles, checks: list[str] | None = None
+) -> dict[str, bool]:
+    return run_tasks(get_review_tasks(code_files, test_files, checks))
+
+
+def review_staged() -> bool:
+    code_files, test_files = get_staged_python_files()
+    if not code_files and not test_files:
+        logger.info("There is no staged python file to check!!!")
+        return True
+    current_dir = os.getcwd()
+    reported = count_findings(ERROR, WARNING)
+    with tempfile.TemporaryDirectory() as index_dir:
+        # review what is about to be committed, not the working tree
+        checkout_index(
+            index_dir,
+            *code_files,
+            *test_files,
+            *list_files(*settings.PRECOMMIT_SUPPORT_FILES),
+        )
+        if os.path.isdir(".mypy_cache"):
+            os.symlink(
+                os.path.abspath(".mypy_cache"), os.path.join(index_dir, ".mypy_cache")
+            )
+        project_paths = get_absolute_project_paths()
+        os.chdir(index_dir)
+        try:
+            # a daemon would be started for every temporary directory
+            with override_settings(**project_paths, MYPY_DAEMON=False):
+                results = run_review(code_files, test_files, settings.PRECOMMIT_CHECKS)
+        finally:
+            os.chdir(current_dir)
+    return all(results.values()) and count_findings(ERROR, WARNING) == reported
@@ -0,0 +1,398 @@
+import ast
+import io
+import os
+import re
+import tokenize
+from abc import ABC, abstractmethod
+from collections import deque
+from functools import cached_property, lru_cache
+from typing import Any, Iterable
+
+from app.cache import cached_per_file, get_cache
+from app.config import settings
+from app.lines import LineSet
+from app.logger import logger
+
+Filename = str
+LineNo = int
+RuleName = str
+FoundLines = dict[Filename, list[LineNo]]
+
+ENGINE_VERSION = "2"  # bump when the built-in rules change behaviour
+
+PRINT_DEBUG = "print_debug"
+COMMENTED_CODE = "commented_code"
+
+
+# Source of one file, tokenized and parsed at most once and shared by all rules.
+class ParsedFile:
+    def __init__(self, path: Filename, source: str) -> None:
+        self.path = path
+        self.source = source
+
+    @cached_property
+    def lines(self) -> list[str]:
+        return self.source.splitlines(keepends=True)
+
+    @cached_property
+    def tokens(self) -> list[tokenize.TokenInfo] | None:
+        try:
+            return list(tokenize.generate_tokens(io.StringIO(self.source).readline))
+        except (tokenize.TokenError, SyntaxError):
+            return None
+
+    @cached_property
+    def tree(self) -> ast.AST | None:
+        try:
+            return ast.parse(self.source, filename=self.path)
+        except (SyntaxError, ValueError):
+            return None
+
+
+# the file's mtime and size are only part of the cache key
+@lru_cache(maxsize=1024)
+def load_parsed_file(path: Filename, _mtime_ns: int, _size: int) -> ParsedFile:
+    with open(path, "r", encoding="utf-8") as f:
+        return ParsedFile(path, f.read())
+
+
+def parse_file(path: Filename) -> ParsedFile:
+    stat = os.stat(path)
+    return load_parsed_file(path, stat.st_mtime_ns, stat.st_size)
+
+
+class Rule(ABC):
+    name: RuleName = ""
+    message = ""
+
+    def config(self) -> Any:
+        return None
+
+
+class LineRule(Rule):
+    @abstractmethod
+    def check_line(self, line: str) -> bool: ...
+
+
+class TokenRule(Rule):
+    token_types: frozenset[int] = frozenset()
+
+    @abstractmethod
+    def check_token(self, token: tokenize.TokenInfo) -> bool: ...
+
+
+class NodeRule(Rule):
+    node_types: tuple[type[ast.AST], ...] = ()
+
+    @abstractmethod
+    def check_node(self, node: ast.AST) -> bool: ...
+
+
+class PrintDebugRule(NodeRule):
+    name = PRINT_DEBUG
+    message = "print() call left in the code"
+    node_types = (ast.Call,)
+
+    def check_node(self, node: ast.AST) -> bool:
+        func = getattr(node, "func", None)
+        return isinstance(func, ast.Name) and func.id == "print"
+
+
+@lru_cache(maxsize=32)
+def compile_accepted_comments(comments: tuple[str, ...]) -> re.Pattern | None:
+    if not comments:
+        return None
+    return re.compile("|".join(f"(?:{comment})$" for comment in comments))
+
+
+class CommentedCodeRule(TokenRule):
+    name = COMMENTED_CODE
+    message = "Comment that is not one of the accepted comments"
+    token_types = frozenset({tokenize.COMMENT})
+
+    def __init__(self, accepted_comments: Iterable[str]) -> None:
+        self.accepted_comments = tuple(accepted_comments)
+        self.accepted = compile_accepted_comments(self.accepted_comments)
+
+    def config(self) -> Any:
+        return self.accepted_comments
+
+    def check_token(self, token: tokenize.TokenInfo) -> bool:
+        return self.accepted is None or self.accepted.search(token.string) is None
+
+
+# Aho-Corasick automaton: finds all literals in a line in one pass over its
+# characters, however many literals there are.
+class LiteralMatcher:
+    def __init__(self, literals: Iterable[tuple[str, RuleName]]) -> None:
+        self._goto: list[dict[str, int]] = [{}]
+        self._output: list[frozenset[RuleName]] = [frozenset()]
+        for literal, name in literals:
+            state = 0
+            for char in literal:
+                if char not in self._goto[state]:
+                    self._goto.append({})
+                    self._output.append(frozenset())
+                    self._goto[state][char] = len(self._goto) - 1
+                state = self._goto[state][char]
+            self._output[state] |= {name}
+        self._fail = [0] * len(self._goto)
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, next_state in self._goto[state].items():
+                queue.append(next_state)
+                fail = self._fail[state]
+                while fail and char not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[next_state] = self._goto[fail].get(char, 0)
+                self._output[next_state] |= self._output[self._fail[next_state]]
+
+    def match(self, line: str) -> set[RuleName]:
+        goto, fail, output = self._goto, self._fail, self._output
+        found: set[RuleName] = set()
+        state = 0
+        for char in line:
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            if output[state]:
+                found |= output[state]
+        return found
+
+
+class PatternMatcher:
+    def __init__(
+        self,
+        literals: dict[RuleName, tuple[str, ...]],
+        regexes: dict[RuleName, tuple[str, ...]],
+    ) -> None:
+        self.literals = LiteralMatcher(
+            (literal, name)
+            for name, name_literals in literals.items()
+            for literal in name_literals
+            if literal
+        )
+        all_regexes = [
+            regex for name_regexes in regexes.values() for regex in name_regexes
+        ]
+        # one alternation tells whether any regex matches, the rare lines that
+        # do are then matched per rule
+        self.any_regex = (
+            re.compile("|".join(f"(?:{regex})" for regex in all_regexes))
+            if all_regexes
+            else None
+        )
+        self.regexes = {
+            name: re.compile("|".join(f"(?:{regex})" for regex in name_regexes))
+            for name, name_regexes in regexes.items()
+            if name_regexes
+        }
+
+    def match(self, line: str) -> set[RuleName]:
+        found = self.literals.match(line)
+        if self.any_regex is not None and self.any_regex.search(line):
+            found |= {
+                name for name, regex in self.regexes.items() if regex.search(line)
+            }
+        return found
+
+
+@lru_cache(maxsize=32)
+def compile_pattern_pack(
+    literals: tuple[tuple[RuleName, tuple[str, ...]], ...],
+    regexes: tuple[tuple[RuleName, tuple[str, ...]], ...],
+) -> PatternMatcher:
+    return PatternMatcher(dict(literals), dict(regexes))
+
+
+# Matches every line once for all the rules of the pattern pack, which ask
+# one after another for the same line.
+class LineScanner:
+    def __init__(self, matcher: PatternMatcher) -> None:
+        self.matcher = matcher
+        self._line: str | None = None
+        self._found: set[RuleName] = set()
+
+    def match(self, line: str) -> set[RuleName]:
+        if line != self._line:
+            self._found = self.matcher.match(line)
+            self._line = line
+        return self._found
+
+
+class BannedPatternRule(LineRule):
+    def __init__(
+        self,
+        name: RuleName,
+        scanner: LineScanner,
+        literals: tuple[str, ...],
+        regexes: tuple[str, ...],
+    ) -> None:
+        self.name = name
+        self.message = f"Line matches a banned pattern of {name}"
+        self.scanner = scanner
+        self.literals = literals
+        self.regexes = regexes
+
+    def config(self) -> Any:
+        return [self.literals, self.regexes]
+
+    def check_line(self, line: str) -> bool:
+        return self.name in self.scanner.match(line)
+
+
+def get_banned_pattern_rules() -> list[BannedPatternRule]:
+    literals = {
+        name: tuple(patterns) for name, patterns in settings.BANNED_PATTERNS.items()
+    }
+    regexes = {
+        name: tuple(patterns) for name, patterns in settings.BANNED_REGEXES.items()
+    }
+    if not any(literals.values()) and not any(regexes.values()):
+        return []
+    scanner = LineScanner(
+        compile_pattern_pack(tuple(literals.items()), tuple(regexes.items()))
+    )
+    return [
+        BannedPatternRule(name, scanner, literals.get(name, ()), regexes.get(name, ()))
+        for name in sorted(literals.keys() | regexes.keys())
+    ]
+
+
+def get_default_rules() -> list[Rule]:
+    return [
+        PrintDebugRule(),
+        CommentedCodeRule(settings.ACCEPTED_COMMENTS),
+        *get_banned_pattern_rules(),
+    ]
+
+
+def apply_line_rules(
+    parsed_file: ParsedFile, line_nos: LineSet, rules: list[LineRule]
+) -> list[tuple[RuleName, LineNo]]:
+    if not rules:
+        return []
+    lines = parsed_file.lines
+    return [
+        (rule.name, line_no)
+        for start, end in line_nos.intervals()
+        for line_no in range(start, min(end, len(lines) + 1))
+        for rule in rules
+        if rule.check_line(lines[line_no - 1])
+    ]
+
+
+def apply_token_rules(
+    parsed_file: ParsedFile, line_nos: LineSet, rules: list[TokenRule]
+) -> list[tuple[RuleName, LineNo]]:
+    token_rules: dict[int, list[TokenRule]] = {}
+    for rule in rules:
+        for token_type in rule.token_types:
+            token_rules.setdefault(token_type, []).append(rule)
+    if not token_rules:
+        return []
+    tokens = parsed_file.tokens
+    if tokens is None:
+        logger.warning("Could not tokenize %s", parsed_file.path)
+        return []
+    return [
+        (rule.name, token.start[0])
+        for token in tokens
+        if token.type in token_rules and token.start[0] in line_nos
+        for rule in token_rules[token.type]
+        if rule.check_token(token)
+    ]
+
+
+def apply_node_rules(
+    parsed_file: ParsedFile, line_nos: LineSet, rules: list[NodeRule]
+) -> list[tuple[RuleName, LineNo]]:
+    node_rules: dict[type[ast.AST], list[NodeRule]] = {}
+    for rule in rules:
+        for node_type in rule.node_types:
+            node_rules.setdefault(node_type, []).append(rule)
+    if not node_rules:
+        return []
+    tree = parsed_file.tree
+    if tree is None:
+        logger.warning("Could not parse %s", parsed_file.path)
+        return []
+    found: list[tuple[RuleName, LineNo]] = []
+    for node in ast.walk(tree):
+        node_line = getattr(node, "lineno", None)
+        if node_line is None or type(node) not in node_rules:
+            continue  # e.g. modules and contexts have no line
+        if node_line in line_nos:
+            found.extend(
+                (rule.name, node_line)
+                for rule in node_rules[type(node)]
+                if rule.check_node(node)
+            )
+    return found
+
+
+def apply_rules(
+    parsed_file: ParsedFile, line_nos: LineSet, rules: list[Rule]
+) -> dict[RuleName, list[LineNo]]:
+    found: dict[RuleName, set[LineNo]] = {}
+    for name, line_no in [
+        *apply_line_rules(
+            parsed_file,
+            line_nos,
+            [rule for rule in rules if isinstance(rule, LineRule)],
+        ),
+        *apply_token_rules(
+            parsed_file,
+            line_nos,
+            [rule for rule in rules if isinstance(rule, TokenRule)],
+        ),
+        *apply_node_rules(
+            parsed_file,
+            line_nos,
+            [rule for rule in rules if isinstance(rule, NodeRule)],
+        ),
+    ]:
+        found.setdefault(name, set()).add(line_no)
+    return {name: sorted(line_nos) for name, line_nos in found.items()}
+
+
+def run_rules_per_file(
+    files: dict[Filename, LineSet], rules: list[Rule]
+) -> dict[Filename, dict[RuleName, list[LineNo]]]:
+    return {
+        file_path: apply_rules(parse_file(file_path), line_nos, rules)
+        for file_path, line_nos in files.items()
+        if line_nos
+    }
+
+
+def run_rules(
+    files: dict[Filename, LineSet], rules: list[Rule]
+) -> dict[RuleName, FoundLines]:
+    if get_cache() is None:
+        found_per_file = run_rules_per_file(files, rules)
+    else:
+        # cache findings for whole files so they stay valid for any diff
+        whole_file_found = cached_per_file(
+            "rules",
+            [(rule.name, rule.config()) for rule in rules],
+            files,
+            lambda misses: run_rules_per_file(
+                {file_path: LineSet.whole_file() for file_path in misses}, rules
+            ),
+            version=ENGINE_VERSION,
+        )
+        found_per_file = {
+            file_path: {
+                name: [line_no for line_no in line_nos if line_no in files[file_path]]
+                for name, line_nos in file_found.items()
+            }
+            for file_path, file_found in whole_file_found.items()
+        }
+    found: dict[RuleName, FoundLines] = {rule.name: {} for rule in rules}
+    for file_path, file_found in found_per_file.items():
+        for name, line_nos in file_found.items():
+            if line_nos:
+                found[name][file_path] = line_nos
+    return found
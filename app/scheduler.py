@@ -0,0 +1,204 @@
+import contextvars
+import logging
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from contextlib import contextmanager
+from typing import Callable, Iterator, NamedTuple
+
+from app.config import settings
+from app.findings import WARNING, Finding, report_findings
+from app.logger import logger
+from app.process import (
+    IncompleteCheck,
+    check_interrupted,
+    review_cancelled,
+    time_budget,
+)
+from app.profiling import stage
+
+
+class Task(NamedTuple):
+    name: str
+    func: Callable[[], None]
+    deps: tuple[str, ...] = ()
+    always_run: bool = False  # run even when a dependency failed, e.g. teardown
+
+
+# Records of the running task; a context variable rather than a thread local so
+# that the thread pools of a check (see bind_context) log into its buffer too.
+_task_records: contextvars.ContextVar[list[logging.LogRecord] | None] = (
+    contextvars.ContextVar("pyreview_task_records", default=None)
+)
+
+
+# Holds back records logged from worker threads so that every task's report
+# block can be emitted in declaration order once it is finished.
+class TaskLogBuffer(logging.Filter):
+    @staticmethod
+    @contextmanager
+    def capture(records: list[logging.LogRecord]) -> Iterator[None]:
+        token = _task_records.set(records)
+        try:
+            yield
+        finally:
+            _task_records.reset(token)
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        records = _task_records.get()
+        if records is None:
+            return True
+        records.append(record)
+        return False
+
+
+def validate_tasks(tasks: list[Task]) -> None:
+    names = [task.name for task in tasks]
+    if len(set(names)) != len(names):
+        raise ValueError("Task names must be unique")
+    known: set[str] = set()
+    for task in tasks:
+        for dep in task.deps:
+            if dep not in names:
+                raise ValueError(f"Task {task.name} depends on unknown task {dep}")
+    remaining = {task.name: set(task.deps) for task in tasks}
+    while remaining:
+        ready = [name for name, deps in remaining.items() if deps <= known]
+        if not ready:
+            raise ValueError(f"Cyclic task dependencies: {sorted(remaining)}")
+        for name in ready:
+            known.add(name)
+            del remaining[name]
+
+
+def get_task_deadline(task: Task, review_deadline: float | None) -> float | None:
+    deadlines = []
+    # cleanup tasks still get their own time after the review ran out of it
+    if review_deadline is not None and not task.always_run:
+        deadlines.append(review_deadline)
+    # the checks of a package in a monorepo review are named <package>:<check>
+    check_timeout = settings.CHECK_TIMEOUTS.get(
+        task.name, settings.CHECK_TIMEOUTS.get(task.name.rpartition(":")[2])
+    )
+    if check_timeout is not None:
+        deadlines.append(time.monotonic() + check_timeout)
+    return min(deadlines, default=None)
+
+
+def report_incomplete(name: str, reason: str) -> None:
+    logger.warning("Check %s did not complete: %s", name, reason)
+    report_findings(
+        [
+            Finding(
+                "pyreview",
+                "incomplete-check",
+                None,
+                None,
+                WARNING,
+                f"Check {name} did not complete: {reason}",
+            )
+        ]
+    )
+
+
+def get_max_workers(max_workers: int | None) -> int:
+    if settings.PROFILE and settings.PROFILE_CPROFILE:
+        # a process can only have one active cProfile profiler at a time
+        return 1
+    return max_workers or settings.MAX_WORKERS or os.cpu_count() or 1
+
+
+def execute_task(
+    task: Task,
+    records: list[logging.LogRecord],
+    review_deadline: float | None,
+    incomplete: list[str],
+) -> bool:
+    with TaskLogBuffer.capture(records):
+        try:
+            with stage(task.name), time_budget(
+                get_task_deadline(task, review_deadline),
+                cancellable=settings.FAIL_FAST and not task.always_run,
+            ):
+                check_interrupted()
+                task.func()
+            return True
+        except IncompleteCheck as e:
+            incomplete.append(task.name)
+            report_incomplete(task.name, str(e))
+            return False
+        except Exception:  # pylint: disable=broad-exception-caught
+            logger.exception("Check %s failed", task.name)
+            return False
+
+
+def skip_task(
+    task: Task,
+    results: dict[str, bool],
+    records: list[logging.LogRecord],
+    incomplete: list[str],
+) -> bool:
+    # tells whether the task must not run, after logging why into its records
+    if task.always_run:
+        return False
+    with TaskLogBuffer.capture(records):
+        if review_cancelled.is_set():
+            incomplete.append(task.name)
+            report_incomplete(task.name, "the review was cancelled")
+            return True
+        failed_deps = [dep for dep in task.deps if not results[dep]]
+        if failed_deps:
+            logger.warning(
+                "Skipping %s because %s did not succeed",
+                task.name,
+                ", ".join(failed_deps),
+            )
+            return True
+    return False
+
+
+def run_tasks(tasks: list[Task], max_workers: int | None = None) -> dict[str, bool]:
+    validate_tasks(tasks)
+    log_buffer = TaskLogBuffer()
+    records: dict[str, list[logging.LogRecord]] = {task.name: [] for task in tasks}
+    results: dict[str, bool] = {}
+    incomplete: list[str] = []
+    running: dict[Future, Task] = {}
+    flushed = 0
+    review_cancelled.clear()
+    review_deadline = (
+        time.monotonic() + settings.REVIEW_TIMEOUT if settings.REVIEW_TIMEOUT else None
+    )
+    logger.addFilter(log_buffer)
+    try:
+        with ThreadPoolExecutor(max_workers=get_max_workers(max_workers)) as executor:
+            while len(results) < len(tasks):
+                for task in tasks:
+                    if task.name in results or task in running.values():
+                        continue
+                    if not all(dep in results for dep in task.deps):
+                        continue
+                    if skip_task(task, results, records[task.name], incomplete):
+                        results[task.name] = False
+                        continue
+                    future = executor.submit(
+                        execute_task,
+                        task,
+                        records[task.name],
+                        review_deadline,
+                        incomplete,
+                    )
+                    running[future] = task
+                if running:
+                    done, _ = wait(running, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        results[running.pop(future).name] = future.result()
+                while flushed < len(tasks) and tasks[flushed].name in results:
+                    for record in records[tasks[flushed].name]:
+                        logger.handle(record)
+                    flushed += 1
+    finally:
+        logger.removeFilter(log_buffer)
+    if incomplete:
+        logger.warning("Incomplete checks: %s", ", ".join(incomplete))
+    return results
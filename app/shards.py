@@ -0,0 +1,185 @@
+import glob
+import heapq
+import json
+import os
+import re
+from concurrent.futures import ThreadPoolExecutor
+
+from app.cache import get_project_state_path
+from app.config import settings
+from app.logger import logger
+from app.process import run_process, time_budget
+from app.profiling import bind_context
+
+TestId = str
+Durations = dict[TestId, float]
+
+DEFAULT_TEST_DURATION = 0.1
+SHARD_COVERAGE_FILE_PREFIX = ".coverage.pyreview"
+DURATION_PATTERN = re.compile(r"^([\d.]+)s (?:setup|call|teardown)\s+(\S.*)$")
+
+
+def is_per_worker_command(command: str | None) -> bool:
+    return command is not None and "{worker}" in command
+
+
+def run_worker_command(command: str | None, worker: int) -> None:
+    if command:
+        run_process(
+            command.replace("{worker}", str(worker)),
+            shell=True,
+            check=True,
+            env={**os.environ, "PYREVIEW_WORKER_ID": str(worker)},
+        )
+
+
+def collect_tests(targets: list[str]) -> list[TestId] | None:
+    res = run_process(
+        ["pytest", "--collect-only", "-q", *targets],
+        capture_output=True,
+        text=True,
+    )
+    if res.returncode != 0:
+        logger.info(res.stdout)
+        return None
+    return [line.strip() for line in res.stdout.splitlines() if "::" in line]
+
+
+def load_durations() -> Durations:
+    durations_path = get_project_state_path("test_durations")
+    if durations_path is None:
+        return {}
+    try:
+        with open(durations_path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_durations(durations: Durations) -> None:
+    durations_path = get_project_state_path("test_durations")
+    if durations_path is None:
+        return
+    os.makedirs(os.path.dirname(durations_path), exist_ok=True)
+    with open(durations_path, "w", encoding="utf-8") as f:
+        json.dump(durations, f)
+
+
+def parse_durations(output: str) -> Durations:
+    durations: Durations = {}
+    for line in output.splitlines():
+        match = DURATION_PATTERN.match(line)
+        if match:
+            test_id = match.group(2).strip()
+            durations[test_id] = durations.get(test_id, 0.0) + float(match.group(1))
+    return durations
+
+
+def split_tests(
+    tests: list[TestId], durations: Durations, workers: int
+) -> list[list[TestId]]:
+    # longest processing time first: give the next slowest test to the least
+    # loaded shard
+    known_durations = [durations[test] for test in tests if test in durations]
+    default_duration = (
+        sorted(known_durations)[len(known_durations) // 2]
+        if known_durations
+        else DEFAULT_TEST_DURATION
+    )
+    shards: list[list[TestId]] = [[] for _ in range(min(workers, len(tests)))]
+    loads = [(0.0, index) for index in range(len(shards))]
+    for test in sorted(
+        tests, key=lambda test: durations.get(test, default_duration), reverse=True
+    ):
+        load, index = heapq.heappop(loads)
+        shards[index].append(test)
+        heapq.heappush(loads, (load + durations.get(test, default_duration), index))
+    return shards
+
+
+def get_cov_options() -> list[str]:
+    # a monorepo review measures the coverage of all its packages in one run
+    code_dirs: list[str | None] = [*settings.CODE_DIRS] or [settings.CODE_DIR]
+    return [f"--cov={code_dir}" for code_dir in code_dirs]
+
+
+def run_shard(
+    worker: int, tests: list[TestId], record_contexts: bool
+) -> tuple[bool, Durations]:
+    per_worker_setup = is_per_worker_command(settings.TEST_SETUP_COMMAND)
+    per_worker_teardown = is_per_worker_command(settings.TEST_TEARDOWN_COMMAND)
+    if per_worker_setup:
+        run_worker_command(settings.TEST_SETUP_COMMAND, worker)
+    try:
+        res = run_process(
+            [
+                "pytest",
+                "-p",
+                "no:cacheprovider",
+                *get_cov_options(),
+                "--cov-report=",
+                *(["--cov-context=test"] if record_contexts else []),
+                "--durations=0",
+                "--durations-min=0",
+                *tests,
+            ],
+            capture_output=True,
+            text=True,
+            env={
+                **os.environ,
+                "COVERAGE_FILE": f"{SHARD_COVERAGE_FILE_PREFIX}.{worker}",
+                "PYREVIEW_WORKER_ID": str(worker),
+            },
+        )
+    finally:
+        if per_worker_teardown:
+            # clean up even when the check ran out of time
+            with time_budget(None, cancellable=False):
+                run_worker_command(settings.TEST_TEARDOWN_COMMAND, worker)
+    if res.returncode != 0:
+        logger.info(res.stdout)
+    return res.returncode == 0, parse_durations(res.stdout)
+
+
+def combine_coverage() -> bool:
+    data_files = sorted(glob.glob(f"{SHARD_COVERAGE_FILE_PREFIX}.*"))
+    for cmd in (
+        ["coverage", "combine", *data_files],
+        ["coverage", "json", "-o", settings.COV_JSON_FILE_PATH],
+    ):
+        res = run_process(cmd, capture_output=True, text=True)
+        if res.returncode != 0:
+            logger.info(res.stderr or res.stdout)
+            return False
+    return True
+
+
+def run_sharded_tests(targets: list[str] | None, record_contexts: bool) -> bool:
+    tests = collect_tests(targets or ["."])
+    if tests is None:
+        return False
+    durations = load_durations()
+    shards = split_tests(tests, durations, settings.TEST_WORKERS)
+    logger.info(
+        "Running %d tests in %d shards: %s",
+        len(tests),
+        len(shards),
+        ", ".join(str(len(shard)) for shard in shards),
+    )
+    for data_file in glob.glob(f"{SHARD_COVERAGE_FILE_PREFIX}.*"):
+        os.remove(data_file)
+    with ThreadPoolExecutor(max_workers=len(shards) or 1) as executor:
+        results = list(
+            executor.map(
+                bind_context(
+                    lambda shard: run_shard(shard[0], shard[1], record_contexts)
+                ),
+                enumerate(shards),
+            )
+        )
+    for _, shard_durations in results:
+        durations.update(shard_durations)
+    save_durations(durations)
+    if not all(succeeded for succeeded, _ in results):
+        return False
+    return combine_coverage()
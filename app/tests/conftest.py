@@ -0,0 +1,71 @@
+import os
+import subprocess
+
+import pytest
+
+from app.lines import LineSet
+from app.tests.const import (
+    CODE_CONTENT,
+    CONFIG_CONTENT,
+    CURRENT_BRANCH,
+    SCHEMA_CONTENT,
+    TEST_CONTENT,
+    UPDATED_CODE_CONTENT,
+    UPDATED_TEST_CONTENT,
+)
+
+
+@pytest.fixture
+def mock_code_directory(tmp_path):
+    directories = ["src", "src/tests"]
+    for directory in directories:
+        (tmp_path / directory).mkdir()
+
+    files = {
+        "src/items.py": CODE_CONTENT,
+        "src/tests/test_items.py": TEST_CONTENT,
+        "src/__init__.py": "",
+        "src/tests/__init__.py": "",
+        "src/config.py": CONFIG_CONTENT,
+        "README.md": "dummy content",
+        ".gitignore": "dummy",
+    }
+    for file_path, content in files.items():
+        (tmp_path / file_path).write_text(content)
+
+    current_dir = os.getcwd()
+    os.chdir(tmp_path)
+    subprocess.run("git init", shell=True, check=True)
+    subprocess.run("git add .", shell=True, check=True)
+    subprocess.run('git commit -m "initial commit"', shell=True, check=True)
+    subprocess.run(f"git branch {CURRENT_BRANCH}", shell=True, check=True)
+    subprocess.run(f"git checkout {CURRENT_BRANCH}", shell=True, check=True)
+    updated_files = {
+        "src/items.py": UPDATED_CODE_CONTENT,
+        "src/tests/test_items.py": UPDATED_TEST_CONTENT,
+        "src/__init__.py": "",
+        "src/tests/__init__.py": "",
+        "src/schema.py": SCHEMA_CONTENT,
+        "README.md": "updated content",
+    }
+    for file_path in files:
+        if file_path not in updated_files:
+            os.remove(tmp_path / file_path)
+    for file_path, content in updated_files.items():
+        (tmp_path / file_path).write_text(content)
+    subprocess.run("git add .", check=True, shell=True)
+    subprocess.run('git commit -m "make some changes"', shell=True, check=True)
+    yield {
+        "code_files": {
+            "src/items.py": LineSet.from_range(
+                1, len(UPDATED_CODE_CONTENT.splitlines())
+            ),
+            "src/schema.py": LineSet.from_range(1, 6),
+        },
+        "test_files": {
+            "src/tests/test_items.py": LineSet.from_range(
+                1, len(UPDATED_TEST_CONTENT.splitlines())
+            ),
+        },
+    }
+    os.chdir(current_dir)
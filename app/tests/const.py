@@ -141,3 +141,29 @@ def test_create_item():
         assert [item] == json.load(f)
     os.remove("items.json")
 """
+
+WORKER_AWARE_TEST_CONTENT = """import os
+import time
+
+
+def use_database():
+    worker = os.environ["PYREVIEW_WORKER_ID"]
+    with open(f"db_{worker}/rows", "w", encoding="utf-8") as f:
+        f.write(worker)
+    open(f"started_{worker}", "w").close()
+    # both shards must be running at the same time
+    deadline = time.monotonic() + 30
+    while not os.path.exists(f"started_{1 - int(worker)}"):
+        assert time.monotonic() < deadline
+        time.sleep(0.05)
+    with open(f"db_{worker}/rows", "r", encoding="utf-8") as f:
+        assert f.read() == worker
+
+
+def test_first():
+    use_database()
+
+
+def test_second():
+    use_database()
+"""
@@ -0,0 +1,58 @@
+import subprocess
+
+from app.baseline import compute_baseline, load_baseline
+from app.cache import get_cache
+from app.findings import WARNING, Finding, set_baseline
+from app.review import check_rules, get_changed_python_files
+from app.tests.const import CODE_CONTENT
+
+
+def test_load_baseline__excuses_findings_of_renamed_and_moved_lines(
+    mock_code_directory, mocker
+):
+    # Arrange
+    mocker.patch("app.review.settings.TARGET_BRANCH", "master")
+    subprocess.run("git checkout -b rename master", shell=True, check=True)
+    subprocess.run("git mv src/items.py src/products.py", shell=True, check=True)
+    lines = CODE_CONTENT.splitlines()
+    lines.insert(4, lines.pop(10))
+    lines.insert(11, "    # New comment")
+    with open("src/products.py", "w", encoding="utf-8") as f:
+        f.write("\n".join(lines) + "\n")
+    code_files, _ = get_changed_python_files()
+    report_findings = mocker.patch("app.review.report_findings")
+    # Act
+    set_baseline(load_baseline(code_files))
+    try:
+        check_rules(code_files)
+    finally:
+        set_baseline(None)
+    # Assert
+    assert report_findings.call_args.args[0] == [
+        Finding(
+            "pyreview",
+            "commented_code",
+            "src/products.py",
+            12,
+            WARNING,
+            "Comment that is not one of the accepted comments",
+        )
+    ]
+
+
+def test_load_baseline__keeps_using_the_project_cache(mock_code_directory, mocker):
+    # Arrange
+    mocker.patch("app.review.settings.TARGET_BRANCH", "master")
+    mocker.patch("app.review.settings.CACHE_DIR", ".pyreview_cache")
+    subprocess.run("git checkout -b change master", shell=True, check=True)
+    with open("src/items.py", "a", encoding="utf-8") as f:
+        f.write("print('changed')\n")
+    code_files, _ = get_changed_python_files()
+    cache = get_cache()
+    compute = mocker.patch("app.baseline.compute_baseline", wraps=compute_baseline)
+    # Act
+    load_baseline(code_files)
+    load_baseline(code_files)
+    # Assert
+    assert get_cache() is cache
+    assert compute.call_count == 1
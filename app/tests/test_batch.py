@@ -0,0 +1,54 @@
+import json
+import os
+
+from app.batch import review_refs
+from app.config import settings
+from app.findings import WARNING, Finding, report_findings
+from app.review import get_changed_python_files
+from app.tests.const import CURRENT_BRANCH
+
+
+def test_review_refs__reviews_every_ref_in_a_worktree(
+    mock_code_directory, mocker, tmp_path
+):
+    # Arrange
+    mocker.patch("app.review.settings.TARGET_BRANCH", "master")
+    mocker.patch("app.batch.settings.BATCH_REPORT_DIR", str(tmp_path / "reports"))
+    mocker.patch("app.batch.settings.REPORT_JSONL_PATH", "findings.jsonl")
+    mocker.patch("app.findings._reporters", None)
+    reviewed = []
+    output_dirs = []
+
+    def review():
+        reviewed.append((os.getcwd(), get_changed_python_files()))
+        output_dirs.append((settings.COV_HTML_DIR, settings.PROFILE_DIR))
+        report_findings(
+            [Finding("pyreview", "rule", f"{len(reviewed)}.py", 1, WARNING, "")]
+        )
+        return {"rules": True, "pylint": False}
+
+    # Act
+    summary = review_refs([CURRENT_BRANCH, "master", "missing"], review)
+    # Assert
+    assert summary == [
+        (CURRENT_BRANCH, "1/2 checks passed"),
+        ("master", "1/2 checks passed"),
+        ("missing", "unknown ref"),
+    ]
+    assert all(cwd != os.getcwd() for cwd, _ in reviewed)
+    assert sorted(reviewed[0][1][0]) == ["src/items.py", "src/schema.py"]
+    assert reviewed[1][1] == ({}, {})
+    assert sorted(os.listdir(tmp_path / "reports")) == [
+        "feature_feature-1.jsonl",
+        "feature_feature-1.txt",
+        "master.jsonl",
+        "master.txt",
+    ]
+    with open(tmp_path / "reports/master.jsonl", "r", encoding="utf-8") as f:
+        assert [json.loads(line)["file"] for line in f] == ["2.py"]
+    assert not os.path.exists("findings.jsonl")
+    assert output_dirs[1] == (
+        str(tmp_path / "reports/master.cov_html"),
+        os.path.abspath("pyreview_profile"),
+    )
+    assert not os.path.exists(reviewed[0][0])
@@ -0,0 +1,33 @@
+from app.benchmark import BenchmarkParams, compare_results, run_benchmarks
+
+
+def test_run_benchmarks__times_every_stage():
+    # Arrange
+    params = BenchmarkParams(files=3, lines=20, changed_files=2, hunks=2, tests=2)
+    # Act
+    results = run_benchmarks(params, repeat=2)
+    # Assert
+    assert results["params"]["files"] == 3
+    assert set(results["stages"]) == {
+        "get_all_python_files",
+        "get_changed_python_files",
+        "rules",
+        "rules_all_files",
+        "pylint_filtering",
+        "coverage_links",
+    }
+    assert all(len(stage["runs"]) == 2 for stage in results["stages"].values())
+
+
+def test_compare_results__flags_slower_stages():
+    # Arrange
+    baseline = {"stages": {"fast": {"min": 1.0}, "slow": {"min": 1.0}}}
+    current = {
+        "stages": {"fast": {"min": 1.1}, "slow": {"min": 1.5}, "new": {"min": 2.0}}
+    }
+    # Act
+    rows, regressions = compare_results(baseline, current, threshold=0.2)
+    # Assert
+    assert regressions == ["slow"]
+    assert rows[1] == ("slow", "1.0000", "1.5000", "1.50x")
+    assert rows[2] == ("new", "", "2.0000", "")
@@ -0,0 +1,101 @@
+import os
+
+from app.cache import ResultCache, cached_per_file, get_cache
+
+
+def test_cached_per_file__replays_stored_results(tmp_path, mocker):
+    # Arrange
+    mocker.patch("app.cache.settings.CACHE_DIR", str(tmp_path / "cache"))
+    source = tmp_path / "module.py"
+    source.write_text("print('hello')\n")
+    calls = []
+
+    def compute(files):
+        calls.append(files)
+        return {file: [f"{file}:1: finding"] for file in files}
+
+    # Act
+    first = cached_per_file("tool", ["opt"], [str(source)], compute, version="1")
+    second = cached_per_file("tool", ["opt"], [str(source)], compute, version="1")
+    source.write_text("print('changed')\n")
+    third = cached_per_file("tool", ["opt"], [str(source)], compute, version="1")
+    # Assert
+    assert first == second == third
+    assert calls == [[str(source)], [str(source)]]
+    assert get_cache().stats_line() == "Result cache: 1 hits, 2 misses (33% hit rate)"
+
+
+def test_cached_per_file__skips_unprocessed_files(tmp_path, mocker):
+    # Arrange
+    mocker.patch("app.cache.settings.CACHE_DIR", str(tmp_path / "cache"))
+    source = tmp_path / "module.py"
+    source.write_text("import os\n")
+    calls = []
+
+    def crash(files):
+        calls.append(files)
+        return {}
+
+    # Act
+    cached_per_file("tool", [], [str(source)], crash, version="1")
+    result = cached_per_file("tool", [], [str(source)], crash, version="1")
+    # Assert
+    assert result == {str(source): []}
+    assert len(calls) == 2
+
+
+def test_cached_per_file__misses_when_a_dependency_changes(tmp_path, mocker):
+    # Arrange
+    mocker.patch("app.cache.settings.CACHE_DIR", str(tmp_path / "cache"))
+    source = tmp_path / "module.py"
+    source.write_text("from helpers import helper\n")
+    helper = tmp_path / "helpers.py"
+    helper.write_text("def helper(): ...\n")
+    dependencies = {str(source): [str(helper)]}
+    calls = []
+
+    def compute(files):
+        calls.append(files)
+        return {file: [] for file in files}
+
+    # Act
+    for _ in range(2):
+        cached_per_file(
+            "tool", [], [str(source)], compute, version="1", dependencies=dependencies
+        )
+    helper.write_text("def helper(value): ...\n")
+    cached_per_file(
+        "tool", [], [str(source)], compute, version="1", dependencies=dependencies
+    )
+    # Assert
+    assert calls == [[str(source)], [str(source)]]
+
+
+def test_result_cache__evicts_least_recently_used(tmp_path):
+    # Arrange
+    cache = ResultCache(str(tmp_path), max_size_bytes=30)
+    for index, key in enumerate(["aa1", "bb2", "cc3"]):
+        cache.set(key, ["x" * 10])
+        os.utime(cache._path(key), (index, index))
+    cache.get("aa1")
+    # Act
+    cache.evict()
+    # Assert
+    assert cache.get("aa1") is not None
+    assert cache.get("bb2") is None
+    assert cache.get("cc3") is not None
+
+
+def test_result_cache__keeps_the_duplicate_index(tmp_path):
+    # Arrange
+    cache = ResultCache(str(tmp_path), max_size_bytes=30)
+    index_path = tmp_path / "duplicate_index" / "project.sqlite"
+    index_path.parent.mkdir()
+    index_path.write_bytes(b"x" * 100)
+    os.utime(index_path, (0, 0))
+    cache.set("aa1", ["x" * 10])
+    # Act
+    cache.evict()
+    # Assert
+    assert index_path.exists()
+    assert cache.get("aa1") is not None
@@ -0,0 +1,63 @@
+import os
+import subprocess
+
+from app import duplicates
+from app.duplicates import Duplicate, find_duplicates
+from app.lines import LineSet
+
+FUNCTION = """def load_items(path, default):
+    if not os.path.exists(path):
+        return default
+    with open(path, "r", encoding="utf-8") as f:
+        items = json.load(f)
+    return [item for item in items if item.get("name") and item.get("price") > 0]
+"""
+
+
+def test_find_duplicates__reports_copies_of_changed_lines(
+    tmp_path, mocker, monkeypatch
+):
+    # Arrange
+    monkeypatch.chdir(tmp_path)
+    mocker.patch("app.duplicates.settings.CACHE_DIR", str(tmp_path / "cache"))
+    mocker.patch("app.duplicates.settings.DUPLICATE_MIN_TOKENS", 20)
+    mocker.patch("app.duplicates.settings.DUPLICATE_WINDOW", 4)
+    (tmp_path / "original.py").write_text(f"import json\n\n\n{FUNCTION}")
+    (tmp_path / "copy.py").write_text(f"import os\n\nVALUE = 1\n\n\n{FUNCTION}")
+    (tmp_path / "other.py").write_text("def other():\n    return 1\n")
+    repository_files = ["original.py", "copy.py", "other.py"]
+    fingerprint_file = mocker.spy(duplicates, "fingerprint_file")
+    # Act
+    found = find_duplicates({"copy.py": LineSet.from_range(6, 12)}, repository_files)
+    unchanged = find_duplicates({"copy.py": LineSet.from_range(1, 4)}, repository_files)
+    # Assert
+    assert found == {"copy.py": [Duplicate(6, 11, "original.py", 4, 9)]}
+    assert unchanged == {"copy.py": []}
+    assert fingerprint_file.call_count == 3
+
+
+def test_find_duplicates__refreshes_only_files_changed_since_staged(
+    tmp_path, mocker, monkeypatch
+):
+    # Arrange
+    monkeypatch.chdir(tmp_path)
+    mocker.patch("app.duplicates.settings.CACHE_DIR", str(tmp_path / "cache"))
+    mocker.patch("app.duplicates.settings.DUPLICATE_MIN_TOKENS", 20)
+    mocker.patch("app.duplicates.settings.DUPLICATE_WINDOW", 4)
+    (tmp_path / "original.py").write_text(f"import json\n\n\n{FUNCTION}")
+    (tmp_path / "copy.py").write_text(f"import os\n\nVALUE = 1\n\n\n{FUNCTION}")
+    (tmp_path / "other.py").write_text("def other():\n    return 1\n")
+    subprocess.run("git init && git add .", shell=True, check=True)
+    changed_lines = {"copy.py": LineSet.from_range(6, 12)}
+    fingerprint_file = mocker.spy(duplicates, "fingerprint_file")
+    found = find_duplicates(changed_lines, ["original.py", "copy.py", "other.py"])
+    os.remove("original.py")
+    (tmp_path / "other.py").write_text("def other():\n    return 2\n")
+    # Act
+    found_after = find_duplicates(changed_lines, ["copy.py", "other.py"])
+    # Assert
+    assert found == {"copy.py": [Duplicate(6, 11, "original.py", 4, 9)]}
+    assert found_after == {"copy.py": []}
+    assert [call.args[0] for call in fingerprint_file.call_args_list[3:]] == [
+        "other.py"
+    ]
@@ -0,0 +1,124 @@
+import json
+
+from app.findings import (
+    ERROR,
+    NOTE,
+    Finding,
+    JsonLinesReporter,
+    SarifReporter,
+    close_reporters,
+    report_findings,
+)
+from app.review import get_trivy_findings
+
+FINDINGS = [
+    Finding("pylint", "unused-import", "src/items.py", 3, ERROR, "W0611: unused"),
+    Finding("trivy", "CVE-2024-0001", "requirements.txt", None, NOTE, "pkg 1.0"),
+]
+
+
+def test_json_lines_reporter__streams_findings(tmp_path):
+    # Arrange
+    path = tmp_path / "findings.jsonl"
+    reporter = JsonLinesReporter(str(path))
+    # Act
+    reporter.report(FINDINGS[:1])
+    partial = path.read_text()
+    reporter.report(FINDINGS[1:])
+    reporter.close()
+    # Assert
+    assert [json.loads(line) for line in partial.splitlines()] == [
+        FINDINGS[0]._asdict()
+    ]
+    assert [Finding(**json.loads(line)) for line in path.read_text().splitlines()] == (
+        FINDINGS
+    )
+
+
+def test_sarif_reporter__writes_valid_log(tmp_path):
+    # Arrange
+    path = tmp_path / "findings.sarif"
+    reporter = SarifReporter(str(path))
+    # Act
+    reporter.report(FINDINGS)
+    reporter.close()
+    # Assert
+    log = json.loads(path.read_text())
+    assert log["version"] == "2.1.0"
+    results = log["runs"][0]["results"]
+    assert results[0] == {
+        "ruleId": "pylint/unused-import",
+        "level": "error",
+        "message": {"text": "W0611: unused"},
+        "locations": [
+            {
+                "physicalLocation": {
+                    "artifactLocation": {"uri": "src/items.py"},
+                    "region": {"startLine": 3},
+                }
+            }
+        ],
+    }
+    assert "region" not in results[1]["locations"][0]["physicalLocation"]
+
+
+def test_report_findings__uses_configured_reporters(tmp_path, mocker):
+    # Arrange
+    jsonl_path = tmp_path / "findings.jsonl"
+    sarif_path = tmp_path / "findings.sarif"
+    mocker.patch("app.findings.settings.REPORT_JSONL_PATH", str(jsonl_path))
+    mocker.patch("app.findings.settings.REPORT_SARIF_PATH", str(sarif_path))
+    # Act
+    report_findings([])
+    close_reporters()
+    # Assert
+    assert jsonl_path.read_text() == ""
+    assert json.loads(sarif_path.read_text())["runs"][0]["results"] == []
+
+
+def test_get_trivy_findings():
+    # Arrange
+    report = {
+        "Results": [
+            {
+                "Target": "requirements.txt",
+                "Vulnerabilities": [
+                    {
+                        "VulnerabilityID": "CVE-2024-0001",
+                        "PkgName": "pkg",
+                        "InstalledVersion": "1.0",
+                        "FixedVersion": "1.1",
+                        "Title": "bad",
+                        "Severity": "HIGH",
+                    }
+                ],
+            },
+            {
+                "Target": "Dockerfile",
+                "Misconfigurations": [
+                    {"ID": "DS001", "Status": "PASS", "Severity": "LOW"},
+                    {
+                        "ID": "DS002",
+                        "Status": "FAIL",
+                        "Severity": "MEDIUM",
+                        "Message": "root user",
+                        "CauseMetadata": {"StartLine": 4},
+                    },
+                ],
+            },
+        ]
+    }
+    # Act
+    findings = get_trivy_findings(report)
+    # Assert
+    assert findings == [
+        Finding(
+            "trivy",
+            "CVE-2024-0001",
+            "requirements.txt",
+            None,
+            "error",
+            "pkg 1.0: bad (fixed in 1.1)",
+        ),
+        Finding("trivy", "DS002", "Dockerfile", 4, "warning", "root user"),
+    ]
@@ -0,0 +1,33 @@
+from app.impact import load_test_map, select_tests
+from app.review import check_code_coverage, get_files_to_check
+
+
+def test_select_tests__only_tests_touching_changed_lines(
+    mock_code_directory, mocker, tmp_path_factory
+):
+    # Arrange
+    mocker.patch("app.review.settings.TARGET_BRANCH", "master")
+    mocker.patch("app.review.settings.CODE_DIR", "src")
+    mocker.patch("app.review.settings.CACHE_DIR", str(tmp_path_factory.mktemp("cache")))
+    mocker.patch("app.review.settings.TEST_IMPACT_ANALYSIS", True)
+    code_files, _ = get_files_to_check()
+    check_code_coverage(code_files)
+    with open("src/items.py", "r", encoding="utf-8") as f:
+        lines = f.readlines()
+    lines[19] = lines[19].replace("description", "description.strip()", 1)
+    with open("src/items.py", "w", encoding="utf-8") as f:
+        f.writelines(lines)
+    # Act
+    selected_tests = select_tests()
+    # Assert
+    assert len(load_test_map()["tests"]) == 3
+    assert selected_tests == ["src/tests/test_items.py::test_update_item"]
+
+
+def test_select_tests__without_test_map(mock_code_directory, mocker, tmp_path_factory):
+    # Arrange
+    mocker.patch("app.review.settings.CACHE_DIR", str(tmp_path_factory.mktemp("cache")))
+    # Act
+    selected_tests = select_tests()
+    # Assert
+    assert selected_tests is None
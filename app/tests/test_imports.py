@@ -0,0 +1,30 @@
+from app.imports import get_dependencies
+
+
+def test_get_dependencies__follows_local_imports(tmp_path, monkeypatch):
+    # Arrange
+    (tmp_path / "pkg").mkdir()
+    files = {
+        "pkg/__init__.py": "",
+        "pkg/models.py": "from .schema import Schema\n",
+        "pkg/schema.py": "import json\n",
+        "pkg/views.py": "from pkg import models\n",
+        "main.py": "import pkg.views\n",
+    }
+    for file_path, content in files.items():
+        (tmp_path / file_path).write_text(content)
+    monkeypatch.chdir(tmp_path)
+    # Act
+    dependencies = get_dependencies(["main.py", "pkg/views.py"])
+    limited = get_dependencies(["main.py"], within={"main.py", "pkg/views.py"})
+    # Assert
+    assert dependencies == {
+        "main.py": [
+            "pkg/__init__.py",
+            "pkg/models.py",
+            "pkg/schema.py",
+            "pkg/views.py",
+        ],
+        "pkg/views.py": ["pkg/__init__.py", "pkg/models.py", "pkg/schema.py"],
+    }
+    assert limited == {"main.py": ["pkg/views.py"]}
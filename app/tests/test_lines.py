@@ -0,0 +1,80 @@
+import pytest
+
+from app.lines import ChangedLineIndex, LineSet
+
+
+def test_line_set__merges_adjacent_and_overlapping_intervals():
+    # Arrange
+    lines = LineSet([(5, 8), (1, 3), (3, 4), (7, 10)])
+    # Act
+    intervals = list(lines.intervals())
+    # Assert
+    assert intervals == [(1, 4), (5, 10)]
+    assert list(lines) == [1, 2, 3, 5, 6, 7, 8, 9]
+    assert len(lines) == 8
+    assert lines == LineSet.from_lines([9, 1, 2, 3, 5, 6, 7, 8])
+
+
+def test_line_set__membership():
+    # Arrange
+    lines = LineSet.from_lines([2, 4, 11, *range(14, 29), 39])
+    # Act
+    members = [line for line in range(0, 45) if line in lines]
+    # Assert
+    assert members == [
+        2,
+        4,
+        11,
+        *range(14, 29),
+        39,
+    ]
+    assert "2" not in lines
+
+
+def test_line_set__union_and_intersection():
+    # Arrange
+    first = LineSet.from_lines([1, 2, 3, 10, 11])
+    second = LineSet.from_lines([3, 4, 11, 12])
+    # Act
+    union = first | second
+    intersection = first & second
+    # Assert
+    assert list(union) == [1, 2, 3, 4, 10, 11, 12]
+    assert list(intersection) == [3, 11]
+    assert list(LineSet([(1, 5), (8, 20)]) & LineSet([(3, 10), (12, 14)])) == [
+        3,
+        4,
+        8,
+        9,
+        12,
+        13,
+    ]
+    assert not first & LineSet()
+
+
+def test_line_set__whole_file():
+    # Arrange
+    lines = LineSet.whole_file()
+    # Act
+    intersection = lines & LineSet.from_lines([3, 7])
+    # Assert
+    assert lines.is_whole_file
+    assert 1 in lines and 10**9 in lines and 0 not in lines
+    assert lines.last_line is None
+    assert list(intersection) == [3, 7]
+    with pytest.raises(ValueError):
+        list(lines)
+
+
+def test_changed_line_index__context_window():
+    # Arrange
+    files = {"a.py": LineSet.from_lines([10, 11]), "b.py": LineSet.whole_file()}
+    # Act
+    exact = ChangedLineIndex(files)
+    widened = ChangedLineIndex(files, context=2)
+    # Assert
+    assert exact.contains("a.py", 10) and not exact.contains("a.py", 12)
+    assert widened.contains("a.py", 8) and widened.contains("a.py", 13)
+    assert not widened.contains("a.py", 7) and not widened.contains("a.py", 14)
+    assert widened.contains("a.py", None) and widened.contains("b.py", 10**6)
+    assert not widened.contains("c.py", None) and not widened.contains(None, 1)
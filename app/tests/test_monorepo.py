@@ -0,0 +1,44 @@
+from app.lines import LineSet
+from app.monorepo import get_package_files, partition_files, run_monorepo_review
+
+
+def test_partition_files__assigns_files_to_the_innermost_package():
+    # Arrange
+    files = {
+        "services/api/main.py": LineSet.from_range(1, 3),
+        "services/api/plugins/auth.py": LineSet.from_range(1, 2),
+        "services/apis.py": LineSet.from_range(1, 2),
+        "tools/setup.py": LineSet.from_range(1, 2),
+    }
+    # Act
+    partitions = partition_files(files, ["services/api", "services/api/plugins"])
+    # Assert
+    assert list(partitions["services/api"]) == ["services/api/main.py"]
+    assert list(partitions["services/api/plugins"]) == ["services/api/plugins/auth.py"]
+
+
+def test_run_monorepo_review__reports_per_package(mock_code_directory, mocker):
+    # Arrange
+    mocker.patch("app.review.settings.TARGET_BRANCH", "master")
+    package_files = get_package_files(["src/", "src/tests"])
+    # Act
+    results = run_monorepo_review(package_files, ["rules"])
+    # Assert
+    assert {
+        package: (sorted(code_files), sorted(test_files))
+        for package, (code_files, test_files) in package_files.items()
+    } == {
+        "src": (["src/items.py", "src/schema.py"], []),
+        "src/tests": ([], ["src/tests/test_items.py"]),
+    }
+    assert results == {
+        "src:header": True,
+        "src:rules": True,
+        "src/tests:header": True,
+        "src/tests:rules": True,
+    }
+    with open("src/pyreview_report.txt", "r", encoding="utf-8") as f:
+        report = f.read()
+    assert "REVIEWING PACKAGE src..." in report
+    assert "src/items.py" in report
+    assert "src/tests" not in report
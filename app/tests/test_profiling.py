@@ -0,0 +1,62 @@
+import json
+import os
+import threading
+import time
+
+from app.process import run_process
+from app.profiling import count_files, write_profile
+from app.scheduler import Task, run_tasks
+
+
+def test_profiling__records_stages_and_subprocesses(tmp_path, mocker, caplog):
+    # Arrange
+    mocker.patch("app.profiling._profiler", None)
+    mocker.patch("app.profiling.settings.PROFILE", True)
+    mocker.patch("app.profiling.settings.PROFILE_DIR", str(tmp_path))
+    mocker.patch("app.profiling.settings.PROFILE_CPROFILE", True)
+
+    def check():
+        count_files(3)
+        run_process(["git", "--version"], capture_output=True, check=True)
+
+    # Act
+    run_tasks([Task("check", check), Task("other", lambda: None)])
+    write_profile()
+    # Assert
+    with open(tmp_path / "trace.json", "r", encoding="utf-8") as f:
+        events = json.load(f)["traceEvents"]
+    stages = {event["name"]: event for event in events if event["cat"] == "stage"}
+    subprocesses = [event for event in events if event["cat"] == "subprocess"]
+    assert set(stages) == {"check", "other"}
+    assert stages["check"]["args"] == {"files": 3}
+    assert [event["name"] for event in subprocesses] == ["git"]
+    assert os.path.exists(tmp_path / "check.prof")
+    summary = next(m for m in caplog.messages if "Subprocesses" in m)
+    check_row = next(line for line in summary.splitlines() if line.startswith("check"))
+    assert check_row.split()[4:6] == ["3", "1"]
+
+
+def test_profiling__runs_checks_one_at_a_time_under_cprofile(tmp_path, mocker):
+    # Arrange
+    mocker.patch("app.profiling._profiler", None)
+    mocker.patch("app.profiling.settings.PROFILE", True)
+    mocker.patch("app.profiling.settings.PROFILE_DIR", str(tmp_path))
+    mocker.patch("app.profiling.settings.PROFILE_CPROFILE", True)
+    lock = threading.Lock()
+    running = []
+    overlaps = []
+
+    def check():
+        with lock:
+            running.append(None)
+            overlaps.append(len(running) > 1)
+        time.sleep(0.05)
+        with lock:
+            running.pop()
+
+    # Act
+    results = run_tasks([Task(name, check) for name in "abc"], max_workers=3)
+    # Assert
+    assert results == {"a": True, "b": True, "c": True}
+    assert not any(overlaps)
+    assert all(os.path.exists(tmp_path / f"{name}.prof") for name in "abc")
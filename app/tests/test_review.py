@@ -1,80 +1,24 @@
+import json
 import os
 import re
 import subprocess
 from unittest.mock import MagicMock
 
-import pytest
-
+from app.findings import ERROR, Finding, close_reporters
+from app.lines import LineSet
 from app.review import (
     check_code_coverage,
+    check_code_with_mypy,
     check_code_with_pylint,
     check_commented_code,
+    check_duplicate_code,
     check_print_debug,
+    check_rules,
+    check_vulnerability,
     get_files_to_check,
+    review_staged,
 )
-from app.tests.const import (
-    CODE_CONTENT,
-    CONFIG_CONTENT,
-    CURRENT_BRANCH,
-    SCHEMA_CONTENT,
-    TEST_CONTENT,
-    UPDATED_CODE_CONTENT,
-    UPDATED_TEST_CONTENT,
-)
-
-
-@pytest.fixture
-def mock_code_directory(tmp_path):
-    directories = ["src", "src/tests"]
-    for directory in directories:
-        (tmp_path / directory).mkdir()
-
-    files = {
-        "src/items.py": CODE_CONTENT,
-        "src/tests/test_items.py": TEST_CONTENT,
-        "src/__init__.py": "",
-        "src/tests/__init__.py": "",
-        "src/config.py": CONFIG_CONTENT,
-        "README.md": "dummy content",
-        ".gitignore": "dummy",
-    }
-    for file_path, content in files.items():
-        (tmp_path / file_path).write_text(content)
-
-    current_dir = os.getcwd()
-    os.chdir(tmp_path)
-    subprocess.run("git init", shell=True, check=True)
-    subprocess.run("git add .", shell=True, check=True)
-    subprocess.run('git commit -m "initial commit"', shell=True, check=True)
-    subprocess.run(f"git branch {CURRENT_BRANCH}", shell=True, check=True)
-    subprocess.run(f"git checkout {CURRENT_BRANCH}", shell=True, check=True)
-    updated_files = {
-        "src/items.py": UPDATED_CODE_CONTENT,
-        "src/tests/test_items.py": UPDATED_TEST_CONTENT,
-        "src/__init__.py": "",
-        "src/tests/__init__.py": "",
-        "src/schema.py": SCHEMA_CONTENT,
-        "README.md": "updated content",
-    }
-    for file_path in files:
-        if file_path not in updated_files:
-            os.remove(tmp_path / file_path)
-    for file_path, content in updated_files.items():
-        (tmp_path / file_path).write_text(content)
-    subprocess.run("git add .", check=True, shell=True)
-    subprocess.run('git commit -m "make some changes"', shell=True, check=True)
-    yield {
-        "code_files": {
-            "src/items.py": list(range(1, len(UPDATED_CODE_CONTENT.splitlines()))),
-            "src/schema.py": list(range(1, 6)),
-        },
-        "test_files": {
-            "src/tests/test_items.py": list(
-                range(1, len(UPDATED_TEST_CONTENT.splitlines()))
-            ),
-        },
-    }
-    os.chdir(current_dir)
+from app.tests.const import CURRENT_BRANCH
 
 
 def test_get_files_to_check__check_all(mock_code_directory, mocker):
@@ -89,6 +33,29 @@ def test_get_files_to_check__check_all(mock_code_directory, mocker):
     )
 
 
+def test_get_files_to_check__check_all_skips_ignored_and_pruned_files(
+    mock_code_directory, mocker
+):
+    # Arrange
+    mocker.patch("app.review.settings.TARGET_BRANCH", CURRENT_BRANCH)
+    for directory in ["ignored", "node_modules", "build"]:
+        os.mkdir(directory)
+        with open(f"{directory}/module.py", "w", encoding="utf-8") as f:
+            f.write("import os\nimport sys\n")
+    with open(".gitignore", "w", encoding="utf-8") as f:
+        f.write("ignored/\n")
+    with open("src/untracked.py", "w", encoding="utf-8") as f:
+        f.write("import os\nimport sys\nimport json")
+    # Act
+    code_files, test_files = get_files_to_check()
+    # Assert
+    assert code_files == {
+        **mock_code_directory["code_files"],
+        "src/untracked.py": LineSet.from_range(1, 3),
+    }
+    assert test_files == mock_code_directory["test_files"]
+
+
 def test_get_files_to_check__only_diff_files(mock_code_directory, mocker):
     # Arrange
     mocker.patch("app.review.settings.TARGET_BRANCH", "master")
@@ -98,10 +65,12 @@ def test_get_files_to_check__only_diff_files(mock_code_directory, mocker):
     # Assert
     assert result == (
         {
-            "src/items.py": [2, *range(7, 12), *range(16, 26), 27, *range(32, 37)],
-            "src/schema.py": list(range(1, 7)),
+            "src/items.py": LineSet.from_lines(
+                [2, *range(7, 12), *range(16, 26), 27, *range(32, 37)]
+            ),
+            "src/schema.py": LineSet.from_range(1, 7),
         },
-        {"src/tests/test_items.py": [2, 4, 11, *range(14, 29), 39]},
+        {"src/tests/test_items.py": LineSet.from_lines([2, 4, 11, *range(14, 29), 39])},
     )
 
 
@@ -138,28 +107,104 @@ src/items.py  [27]
     assert expected_log == "\n".join(caplog.messages)
 
 
+def test_check_rules(mock_code_directory, mocker, caplog):
+    # Arrange
+    mocker.patch("app.review.settings.ACCEPTED_COMMENTS", ["# Accepted comment"])
+    mocker.patch("app.review.settings.TARGET_BRANCH", "master")
+    mocker.patch("app.review.settings.CODE_DIR", "src")
+    expected_log = """CHECK FOR PRINT DEBUG...
+------------  -----------
+File          Line number
+src/items.py  [27]
+------------  -----------
+CHECK FOR COMMENTED CODE...
+------------  -----------
+File          Line number
+src/items.py  [7, 8]
+------------  -----------"""
+    code_files, _ = get_files_to_check()
+    # Act
+    check_rules(code_files)
+    # Assert
+    assert expected_log == "\n".join(caplog.messages)
+
+
 def test_check_code_with_pylint(mock_code_directory, mocker, caplog):
     # Arrange
     mocker.patch("app.review.settings.TARGET_BRANCH", "master")
     mocker.patch("app.review.settings.CODE_DIR", "src")
 
+    def pylint_message(path, module, line, message_id, symbol, message):
+        return {
+            "type": "convention",
+            "module": module,
+            "obj": "",
+            "line": line,
+            "column": 0,
+            "path": path,
+            "symbol": symbol,
+            "message": message,
+            "message-id": message_id,
+        }
+
+    def missing_docstring(path, module, line):
+        return pylint_message(
+            path,
+            module,
+            line,
+            "C0116",
+            "missing-function-docstring",
+            "Missing function or method docstring",
+        )
+
+    def missing_module_docstring(path, module):
+        return pylint_message(
+            path,
+            module,
+            1,
+            "C0114",
+            "missing-module-docstring",
+            "Missing module docstring",
+        )
+
     def mock_run(*args, **kwargs):
         res = MagicMock()
-        if "test" in args[0]:
-            res.stdout = """************* Module src.tests.test_items
-src/tests/test_items.py:1:0: C0114: Missing module docstring (missing-module-docstring)
-src/tests/test_items.py:7:0: C0116: Missing function or method docstring (missing-function-docstring)
-src/tests/test_items.py:18:0: C0116: Missing function or method docstring (missing-function-docstring)
-src/tests/test_items.py:31:0: C0116: Missing function or method docstring (missing-function-docstring)"""
-        else:
-            res.stdout = """************* Module src.items
-src/items.py:1:0: C0114: Missing module docstring (missing-module-docstring)
-src/items.py:5:0: C0116: Missing function or method docstring (missing-function-docstring)
-src/items.py:16:0: C0116: Missing function or method docstring (missing-function-docstring)
-src/items.py:26:0: C0116: Missing function or method docstring (missing-function-docstring)
-************* Module src.schema
-src/schema.py:1:0: C0114: Missing module docstring (missing-module-docstring)
-src/schema.py:4:0: C0115: Missing class docstring (missing-class-docstring)"""
+        res.returncode = 0
+        messages = []
+        if "src/tests/test_items.py" in args[0]:
+            module = "src.tests.test_items"
+            path = "src/tests/test_items.py"
+            messages.extend(
+                [
+                    missing_module_docstring(path, module),
+                    *(missing_docstring(path, module, line) for line in (7, 18, 31)),
+                ]
+            )
+        if "src/items.py" in args[0]:
+            messages.extend(
+                [
+                    missing_module_docstring("src/items.py", "src.items"),
+                    *(
+                        missing_docstring("src/items.py", "src.items", line)
+                        for line in (5, 16, 26)
+                    ),
+                ]
+            )
+        if "src/schema.py" in args[0]:
+            messages.extend(
+                [
+                    missing_module_docstring("src/schema.py", "src.schema"),
+                    pylint_message(
+                        "src/schema.py",
+                        "src.schema",
+                        4,
+                        "C0115",
+                        "missing-class-docstring",
+                        "Missing class docstring",
+                    ),
+                ]
+            )
+        res.stdout = json.dumps(messages)
         return res
 
     expected_log = """CHECKING CODE USING Pylint...
@@ -179,6 +224,162 @@ src/tests/test_items.py:18:0: C0116: Missing function or method docstring (missi
     assert expected_log == "\n".join(caplog.messages)
 
 
+def test_check_code_with_pylint__keeps_messages_of_a_fatal_shard(
+    mock_code_directory, mocker, caplog
+):
+    # Arrange
+    mocker.patch("app.review.settings.TARGET_BRANCH", "master")
+    mocker.patch("app.review.settings.CODE_DIR", "src")
+    messages = [
+        {
+            "type": "fatal",
+            "module": "src.items",
+            "line": 1,
+            "column": 0,
+            "path": "src/items.py",
+            "symbol": "astroid-error",
+            "message": "Exception on node",
+            "message-id": "F0002",
+        },
+        {
+            "type": "convention",
+            "module": "src.schema",
+            "line": 4,
+            "column": 0,
+            "path": "src/schema.py",
+            "symbol": "missing-class-docstring",
+            "message": "Missing class docstring",
+            "message-id": "C0115",
+        },
+    ]
+    mocker.patch(
+        "app.review.subprocess.run",
+        return_value=MagicMock(
+            returncode=1 | 16, stdout=json.dumps(messages), stderr=""
+        ),
+    )
+    code_files, _ = get_files_to_check()
+    # Act
+    check_code_with_pylint(code_files=code_files, test_files={})
+    # Assert
+    assert caplog.messages[1].splitlines() == [
+        "************* Module src.items",
+        "src/items.py:1:0: F0002: Exception on node (astroid-error)",
+        "************* Module src.schema",
+        "src/schema.py:4:0: C0115: Missing class docstring (missing-class-docstring)",
+    ]
+
+
+def test_check_code_with_mypy__only_changed_lines(mock_code_directory, mocker, caplog):
+    # Arrange
+    mocker.patch("app.review.settings.TARGET_BRANCH", "master")
+    mocker.patch("app.review.settings.CODE_DIR", "src")
+    commands = []
+
+    def mock_run(*args, **kwargs):
+        commands.append(args[0])
+        res = MagicMock()
+        res.returncode = 0 if "--install-types" in args[0] else 1
+        res.stdout = """src/items.py:5: error: Old error  [misc]
+src/items.py:36: error: Unsupported operand types  [operator]
+src/schema.py:4: note: See the docs
+Found 2 errors in 1 file (checked 2 source files)"""
+        return res
+
+    mocker.patch("app.review.subprocess.run", side_effect=mock_run)
+    code_files, _ = get_files_to_check()
+    # Act
+    check_code_with_mypy(code_files)
+    check_code_with_mypy(code_files)
+    # Assert
+    assert caplog.messages[:2] == [
+        "CHECKING CODE USING mypy...",
+        "src/items.py:36: error: Unsupported operand types  [operator]\n"
+        "src/schema.py:4: note: See the docs",
+    ]
+    stub_installs = [
+        cmd for cmd in commands if cmd == "mypy --install-types --non-interactive"
+    ]
+    assert len(stub_installs) == 1
+
+
+def test_check_code_with_mypy__column_numbers_and_file_errors(
+    mock_code_directory, mocker, caplog
+):
+    # Arrange
+    mocker.patch("app.review.settings.TARGET_BRANCH", "master")
+    mocker.patch("app.review.settings.CODE_DIR", "src")
+    mocker.patch("app.review.install_type_stubs")
+    mocker.patch(
+        "app.review.run_mypy",
+        return_value={
+            "src/items.py": [
+                "src/items.py:5:1: error: Old error  [misc]",
+                "src/items.py:36:12:36:20: error: Unsupported operand types  "
+                "[operator]",
+            ],
+            "src/schema.py": [
+                "src/schema.py: error: Duplicate module named 'schema'",
+            ],
+        },
+    )
+    report_findings = mocker.patch("app.review.report_findings")
+    code_files, _ = get_files_to_check()
+    # Act
+    check_code_with_mypy(code_files)
+    # Assert
+    assert report_findings.call_args.args[0] == [
+        Finding(
+            "mypy", "operator", "src/items.py", 36, ERROR, "Unsupported operand types"
+        ),
+        Finding(
+            "mypy",
+            "mypy",
+            "src/schema.py",
+            None,
+            ERROR,
+            "src/schema.py: error: Duplicate module named 'schema'",
+        ),
+    ]
+
+
+def test_check_code_with_mypy__reruns_when_the_config_changes(
+    mock_code_directory, mocker, tmp_path
+):
+    # Arrange
+    mocker.patch("app.review.settings.TARGET_BRANCH", "master")
+    mocker.patch("app.review.settings.CODE_DIR", "src")
+    mocker.patch("app.cache.settings.CACHE_DIR", str(tmp_path / "cache"))
+    mocker.patch("app.review.install_type_stubs")
+    mocker.patch("app.cache.tool_version", return_value="mypy 1.0")
+    run_mypy = mocker.patch(
+        "app.review.run_mypy", side_effect=lambda files: {file: [] for file in files}
+    )
+    code_files, _ = get_files_to_check()
+    # Act
+    check_code_with_mypy(code_files)
+    check_code_with_mypy(code_files)
+    with open("mypy.ini", "w", encoding="utf-8") as f:
+        f.write("[mypy]\nstrict = True\n")
+    check_code_with_mypy(code_files)
+    # Assert
+    assert run_mypy.call_count == 2
+
+
+def test_check_duplicate_code__skipped_without_cache(mocker, caplog):
+    # Arrange
+    mocker.patch("app.cache.settings.CACHE_DIR", None)
+    find_duplicates = mocker.patch("app.review.find_duplicates")
+    # Act
+    check_duplicate_code({"module.py": LineSet.from_range(1, 3)})
+    # Assert
+    assert caplog.messages == [
+        "CHECKING DUPLICATE CODE...",
+        "CACHE_DIR is not set, skipping the duplicate code check.",
+    ]
+    find_duplicates.assert_not_called()
+
+
 def test_check_code_coverage(mock_code_directory, mocker, caplog):
     # Arrange
     mocker.patch("app.review.settings.TARGET_BRANCH", "master")
@@ -191,3 +392,97 @@ def test_check_code_coverage(mock_code_directory, mocker, caplog):
     assert re.search(
         r"file:///[0-9a-zA-Z/_-]*schema_py.html\s*\{1, 4, 5, 6\}", caplog.text
     )
+    html_pages = [file for file in os.listdir("cov_html") if file.endswith("py.html")]
+    assert len(html_pages) == 2
+
+
+def test_check_vulnerability__scoped(mock_code_directory, mocker, caplog):
+    # Arrange
+    mocker.patch("app.review.settings.TARGET_BRANCH", "master")
+    mocker.patch("app.review.settings.TRIVY_SCOPED", True)
+    mocker.patch("app.review.tool_is_available", return_value=True)
+    run_trivy = mocker.patch("app.review.run_trivy", return_value=[])
+    # Act
+    check_vulnerability()
+    with open("requirements.txt", "w", encoding="utf-8") as f:
+        f.write("requests==2.0.0\n")
+    check_vulnerability()
+    # Assert
+    scanners = [call.args[0] for call in run_trivy.call_args_list]
+    assert scanners == ["secret", "vuln,license", "secret"]
+    assert "No relevant file changed, skipping Trivy vuln,license scan." in (
+        caplog.messages
+    )
+    assert run_trivy.call_args_list[1].kwargs["cache_key"]
+
+
+def test_check_vulnerability__reports_changed_lines_only(
+    mock_code_directory, mocker, caplog
+):
+    # Arrange
+    mocker.patch("app.review.settings.TARGET_BRANCH", "master")
+    mocker.patch("app.review.tool_is_available", return_value=True)
+    mocker.patch(
+        "app.review.run_trivy",
+        return_value=[
+            Finding("trivy", "changed", "src/items.py", 36, ERROR, "secret"),
+            Finding("trivy", "unchanged", "src/items.py", 1, ERROR, "secret"),
+            Finding("trivy", "deleted", "src/config.py", 1, ERROR, "secret"),
+        ],
+    )
+    # Act
+    check_vulnerability()
+    # Assert
+    assert "changed" in caplog.text
+    assert "unchanged" not in caplog.text and "deleted" not in caplog.text
+
+
+def test_review_staged__checks_index_content(mock_code_directory, mocker, caplog):
+    # Arrange
+    mocker.patch("app.review.settings.CODE_DIR", "src")
+    mocker.patch("app.review.settings.PRECOMMIT_CHECKS", ["rules"])
+    project_dir = os.getcwd()
+    with open("src/schema.py", "a", encoding="utf-8") as f:
+        f.write("print('staged')\n")
+    subprocess.run(["git", "add", "src/schema.py"], check=True)
+    with open("src/schema.py", "a", encoding="utf-8") as f:
+        f.write("print('not staged')\n")
+    with open("src/items.py", "a", encoding="utf-8") as f:
+        f.write("print('not staged')\n")
+    # Act
+    passed = review_staged()
+    # Assert
+    assert not passed
+    assert "src/schema.py  [7]" in caplog.text
+    assert "src/items.py" not in caplog.text
+    assert os.getcwd() == project_dir
+
+
+def test_review_staged__writes_relative_paths_into_the_project(
+    mock_code_directory, mocker
+):
+    # Arrange
+    mocker.patch("app.review.settings.CODE_DIR", "src")
+    mocker.patch("app.review.settings.PRECOMMIT_CHECKS", ["rules"])
+    mocker.patch("app.review.settings.CACHE_DIR", ".pyreview_cache")
+    mocker.patch("app.review.settings.REPORT_JSONL_PATH", "findings.jsonl")
+    mocker.patch("app.review.settings.PROFILE", True)
+    mocker.patch("app.review.settings.PROFILE_CPROFILE", True)
+    mocker.patch("app.findings._reporters", None)
+    mocker.patch("app.profiling._profiler", None)
+    with open("src/schema.py", "a", encoding="utf-8") as f:
+        f.write("print('staged')\n")
+    subprocess.run(["git", "add", "src/schema.py"], check=True)
+    # Act
+    passed = review_staged()
+    close_reporters()
+    # Assert
+    assert not passed
+    with open("findings.jsonl", "r", encoding="utf-8") as f:
+        findings = [json.loads(line) for line in f]
+    assert [(finding["file"], finding["line"]) for finding in findings] == [
+        ("src/schema.py", 7)
+    ]
+    # the rule results were cached in the project, not in the temporary index
+    assert os.listdir(".pyreview_cache")
+    assert os.listdir("pyreview_profile") == ["rules.prof"]
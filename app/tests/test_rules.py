@@ -0,0 +1,109 @@
+import ast
+
+from app.lines import LineSet
+from app.rules import (
+    COMMENTED_CODE,
+    PRINT_DEBUG,
+    CommentedCodeRule,
+    LiteralMatcher,
+    NodeRule,
+    PrintDebugRule,
+    get_banned_pattern_rules,
+    parse_file,
+    run_rules,
+)
+
+SOURCE = """URL = "https://example.com/#anchor"
+MESSAGE = "print(this) is not a call"
+
+
+def run():
+    print(URL)  # print debugging
+    # Accepted comment
+    logger.print_stats()
+    return MESSAGE
+"""
+
+
+def test_run_rules__uses_tokens_and_ast(tmp_path):
+    # Arrange
+    file_path = tmp_path / "module.py"
+    file_path.write_text(SOURCE)
+    rules = [PrintDebugRule(), CommentedCodeRule(["# Accepted comment"])]
+    # Act
+    found = run_rules({str(file_path): LineSet.from_range(1, 10)}, rules)
+    # Assert
+    assert found == {
+        PRINT_DEBUG: {str(file_path): [6]},
+        COMMENTED_CODE: {str(file_path): [6]},
+    }
+
+
+def test_run_rules__only_changed_lines(tmp_path):
+    # Arrange
+    file_path = tmp_path / "module.py"
+    file_path.write_text(SOURCE)
+    rules = [PrintDebugRule(), CommentedCodeRule([])]
+    # Act
+    found = run_rules({str(file_path): LineSet.from_lines([7, 8])}, rules)
+    # Assert
+    assert found == {PRINT_DEBUG: {}, COMMENTED_CODE: {str(file_path): [7]}}
+
+
+def test_parse_file__shared_between_rules(tmp_path, mocker):
+    # Arrange
+    file_path = tmp_path / "module.py"
+    file_path.write_text(SOURCE)
+    parse = mocker.spy(ast, "parse")
+
+    class ReturnRule(NodeRule):
+        name = "return"
+        node_types = (ast.Return,)
+
+        def check_node(self, node):
+            return True
+
+    # Act
+    found = run_rules(
+        {str(file_path): LineSet.whole_file()}, [PrintDebugRule(), ReturnRule()]
+    )
+    run_rules({str(file_path): LineSet.whole_file()}, [ReturnRule()])
+    # Assert
+    assert found["return"] == {str(file_path): [9]}
+    assert parse.call_count == 1
+    assert parse_file(str(file_path)) is parse_file(str(file_path))
+
+
+def test_run_rules__banned_patterns_matched_in_one_pass(tmp_path, mocker):
+    # Arrange
+    file_path = tmp_path / "module.py"
+    file_path.write_text(SOURCE)
+    mocker.patch("app.rules.settings.BANNED_PATTERNS", {"hosts": ["example.com"]})
+    mocker.patch(
+        "app.rules.settings.BANNED_REGEXES",
+        {"debugger": [r"\bbreakpoint\(\)"], "stats": [r"\.print_\w+\("]},
+    )
+    matcher = get_banned_pattern_rules()[0].scanner.matcher
+    match = mocker.spy(matcher, "match")
+    # Act
+    found = run_rules(
+        {str(file_path): LineSet.from_lines([1, 6, 8])}, get_banned_pattern_rules()
+    )
+    # Assert
+    assert found == {
+        "debugger": {},
+        "hosts": {str(file_path): [1]},
+        "stats": {str(file_path): [8]},
+    }
+    assert match.call_count == 3
+
+
+def test_literal_matcher__finds_overlapping_literals():
+    # Arrange
+    matcher = LiteralMatcher(
+        [("he", "he"), ("she", "she"), ("hers", "hers"), ("his", "his")]
+    )
+    # Act
+    found = matcher.match("ushers")
+    # Assert
+    assert found == {"he", "she", "hers"}
@@ -0,0 +1,165 @@
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from app.findings import ERROR, Finding, report_findings
+from app.logger import logger
+from app.process import run_process
+from app.profiling import bind_context
+from app.scheduler import Task, run_tasks
+
+
+def test_run_tasks__report_blocks_in_declaration_order(caplog):
+    # Arrange
+    def make_check(name: str, delay: float):
+        def check():
+            logger.info("%s start", name)
+            time.sleep(delay)
+            logger.info("%s end", name)
+
+        return check
+
+    tasks = [
+        Task("slow", make_check("slow", 0.2)),
+        Task("fast", make_check("fast", 0.0)),
+        Task("medium", make_check("medium", 0.1)),
+    ]
+    # Act
+    results = run_tasks(tasks, max_workers=3)
+    # Assert
+    assert results == {"slow": True, "fast": True, "medium": True}
+    assert caplog.messages == [
+        "slow start",
+        "slow end",
+        "fast start",
+        "fast end",
+        "medium start",
+        "medium end",
+    ]
+
+
+def test_run_tasks__buffers_records_of_nested_thread_pools(caplog):
+    # Arrange
+    def sharded():
+        logger.info("sharded start")
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            list(
+                executor.map(
+                    bind_context(lambda shard: logger.info("shard %d", shard)), [1, 2]
+                )
+            )
+        time.sleep(0.2)
+        logger.info("sharded end")
+
+    def single():
+        logger.info("single")
+
+    tasks = [Task("sharded", sharded), Task("single", single)]
+    # Act
+    results = run_tasks(tasks, max_workers=2)
+    # Assert
+    assert results == {"sharded": True, "single": True}
+    assert caplog.messages == [
+        "sharded start",
+        "shard 1",
+        "shard 2",
+        "sharded end",
+        "single",
+    ]
+
+
+def test_run_tasks__dependencies(caplog):
+    # Arrange
+    events = []
+    lock = threading.Lock()
+
+    def record(event: str):
+        def func():
+            with lock:
+                events.append(event)
+
+        return func
+
+    def fail():
+        raise RuntimeError("boom")
+
+    tasks = [
+        Task("setup", record("setup")),
+        Task("coverage", fail, deps=("setup",)),
+        Task("report", record("report"), deps=("coverage",)),
+        Task("teardown", record("teardown"), deps=("coverage",), always_run=True),
+    ]
+    # Act
+    results = run_tasks(tasks)
+    # Assert
+    assert events == ["setup", "teardown"]
+    assert results == {
+        "setup": True,
+        "coverage": False,
+        "report": False,
+        "teardown": True,
+    }
+    assert "Skipping report because coverage did not succeed" in caplog.messages
+
+
+def test_run_tasks__cyclic_dependencies():
+    # Arrange
+    tasks = [
+        Task("a", lambda: None, deps=("b",)),
+        Task("b", lambda: None, deps=("a",)),
+    ]
+    # Act
+    with pytest.raises(ValueError) as exc_info:
+        run_tasks(tasks)
+    # Assert
+    assert str(exc_info.value) == "Cyclic task dependencies: ['a', 'b']"
+
+
+@pytest.mark.skipif(not hasattr(os, "killpg"), reason="needs process groups")
+def test_run_tasks__kills_checks_past_their_deadline(mocker, caplog, tmp_path):
+    # Arrange
+    mocker.patch("app.scheduler.settings.CHECK_TIMEOUTS", {"slow": 0.5})
+    pid_file = tmp_path / "pid"
+
+    def slow():
+        run_process(["sh", "-c", f"sleep 30 & echo $! > {pid_file}; wait"])
+
+    start = time.monotonic()
+    # Act
+    results = run_tasks([Task("slow", slow), Task("fast", lambda: None)])
+    # Assert
+    assert time.monotonic() - start < 10
+    assert results == {"slow": False, "fast": True}
+    assert "Check slow did not complete: ran out of time" in caplog.messages
+    assert caplog.messages[-1] == "Incomplete checks: slow"
+    stat_path = f"/proc/{pid_file.read_text().strip()}/stat"
+    if os.path.exists(stat_path):  # a reaped grandchild may linger as a zombie
+        with open(stat_path, "r", encoding="utf-8") as f:
+            assert f.read().split(")")[-1].split()[0] in ("Z", "X")
+
+
+def test_run_tasks__fail_fast_cancels_remaining_checks(mocker, caplog):
+    # Arrange
+    mocker.patch("app.scheduler.settings.FAIL_FAST", True)
+    mocker.patch("app.findings.settings.FAIL_FAST", True)
+    teardown = []
+
+    def failing():
+        report_findings([Finding("tool", "rule", "a.py", 1, ERROR, "broken")])
+
+    tasks = [
+        Task("failing", failing),
+        Task("next", lambda: None, deps=("failing",)),
+        Task(
+            "teardown", lambda: teardown.append(True), deps=("next",), always_run=True
+        ),
+    ]
+    # Act
+    results = run_tasks(tasks, max_workers=1)
+    # Assert
+    assert results == {"failing": True, "next": False, "teardown": True}
+    assert "Check next did not complete: the review was cancelled" in caplog.messages
+    assert teardown == [True]
@@ -0,0 +1,74 @@
+import os
+import re
+from concurrent.futures import ThreadPoolExecutor
+
+from app.review import check_code_coverage, get_files_to_check
+from app.shards import parse_durations, run_sharded_tests, split_tests
+from app.tests.const import WORKER_AWARE_TEST_CONTENT
+
+
+def test_split_tests__balances_by_duration():
+    # Arrange
+    tests = ["t::a", "t::b", "t::c", "t::d", "t::e"]
+    durations = {"t::a": 5.0, "t::b": 3.0, "t::c": 2.0, "t::d": 1.0}
+    # Act
+    shards = split_tests(tests, durations, workers=2)
+    # Assert
+    assert shards == [["t::a", "t::c"], ["t::b", "t::e", "t::d"]]
+
+
+def test_parse_durations():
+    # Arrange
+    output = """============ slowest durations ============
+0.20s call     src/tests/test_items.py::test_update_item
+0.05s setup    src/tests/test_items.py::test_update_item
+0.01s call     src/tests/test_items.py::test_get_items[case 1]
+"""
+    # Act
+    durations = parse_durations(output)
+    # Assert
+    assert durations == {
+        "src/tests/test_items.py::test_update_item": 0.25,
+        "src/tests/test_items.py::test_get_items[case 1]": 0.01,
+    }
+
+
+def test_check_code_coverage__sharded(mock_code_directory, mocker, caplog):
+    # Arrange
+    mocker.patch("app.review.settings.TARGET_BRANCH", "master")
+    mocker.patch("app.review.settings.CODE_DIR", "src")
+    mocker.patch("app.review.settings.TEST_WORKERS", 2)
+    mocker.patch("app.review.settings.TEST_SETUP_COMMAND", "touch setup_{worker}.txt")
+    # the sample tests are not worker-aware: they all share items.json
+    mocker.patch(
+        "app.shards.ThreadPoolExecutor",
+        lambda max_workers: ThreadPoolExecutor(max_workers=1),
+    )
+    code_files, _ = get_files_to_check()
+    # Act
+    check_code_coverage(code_files)
+    # Assert
+    assert "Running 3 tests in 2 shards: 2, 1" in caplog.messages
+    assert os.path.exists("setup_0.txt") and os.path.exists("setup_1.txt")
+    assert re.search(r"file:///[0-9a-zA-Z/_-]*items_py.html\s*\{36\}", caplog.text)
+    assert re.search(
+        r"file:///[0-9a-zA-Z/_-]*schema_py.html\s*\{1, 4, 5, 6\}", caplog.text
+    )
+
+
+def test_run_sharded_tests__isolates_concurrent_workers(tmp_path, monkeypatch, mocker):
+    # Arrange
+    (tmp_path / "src").mkdir()
+    (tmp_path / "src/__init__.py").write_text("")
+    (tmp_path / "src/test_db.py").write_text(WORKER_AWARE_TEST_CONTENT)
+    monkeypatch.chdir(tmp_path)
+    mocker.patch("app.shards.settings.CODE_DIR", "src")
+    mocker.patch("app.shards.settings.TEST_WORKERS", 2)
+    mocker.patch("app.shards.settings.TEST_SETUP_COMMAND", "mkdir db_{worker}")
+    mocker.patch("app.shards.settings.TEST_TEARDOWN_COMMAND", "rm -r db_{worker}")
+    # Act
+    passed = run_sharded_tests(["src"], record_contexts=False)
+    # Assert
+    assert passed
+    assert os.path.exists("started_0") and os.path.exists("started_1")
+    assert not os.path.exists("db_0") and not os.path.exists("db_1")
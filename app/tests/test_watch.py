@@ -0,0 +1,65 @@
+import os
+import sys
+
+import pytest
+
+from app.watch import InotifyWatcher, PollingWatcher, Watcher, watch
+
+
+class FakeWatcher(Watcher):
+    def __init__(self, changes):
+        self.changes = list(changes)
+
+    def poll(self, timeout):
+        return self.changes.pop(0) if self.changes else set()
+
+
+def test_polling_watcher__detects_changes(mock_code_directory):
+    # Arrange
+    watcher = PollingWatcher()
+    # Act
+    with open("src/items.py", "a", encoding="utf-8") as f:
+        f.write("\n# changed\n")
+    os.remove("src/schema.py")
+    changed = watcher.poll(0)
+    # Assert
+    assert changed == {"src/items.py", "src/schema.py"}
+    assert watcher.poll(0) == set()
+
+
+@pytest.mark.skipif(sys.platform != "linux", reason="inotify is Linux only")
+def test_inotify_watcher__detects_changes(mock_code_directory):
+    # Arrange
+    watcher = InotifyWatcher()
+    try:
+        # Act
+        with open("src/items.py", "a", encoding="utf-8") as f:
+            f.write("\n# changed\n")
+        changed = watcher.poll(1)
+        os.mkdir("src/new")
+        lost = watcher.poll(1)
+        with open("src/new/module.py", "w", encoding="utf-8") as f:
+            f.write("x = 1\n")
+        changed_in_new_dir = watcher.poll(1)
+    finally:
+        watcher.close()
+    # Assert
+    assert changed == {"src/items.py"}
+    assert lost is None
+    assert "src/new/module.py" in changed_in_new_dir
+
+
+def test_watch__reviews_changed_files_only(mock_code_directory, mocker):
+    # Arrange
+    mocker.patch("app.watch.settings.TARGET_BRANCH", "master")
+    mocker.patch("app.watch.settings.WATCH_CHECKS", ["rules"])
+    run_review = mocker.patch("app.watch.run_review")
+    watcher = FakeWatcher([{"src/items.py", "README.md", ".git/index"}])
+    # Act
+    watch(watcher, rounds=1)
+    # Assert
+    initial, rereview = run_review.call_args_list
+    assert set(initial.args[0]) == {"src/items.py", "src/schema.py"}
+    assert rereview.args[0].keys() == {"src/items.py"}
+    assert rereview.args[1] == {}
+    assert rereview.args[2] == ["rules"]
@@ -0,0 +1,222 @@
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+import time
+from abc import ABC, abstractmethod
+
+from app.config import settings
+from app.lines import LineSet
+from app.logger import logger
+from app.review import (
+    TargetFiles,
+    count_lines,
+    get_changed_lines,
+    get_current_branch,
+    get_files_to_check,
+    is_pruned,
+    run_review,
+    split_test_files,
+)
+
+Filename = str
+
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_Q_OVERFLOW = 0x00004000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+WATCH_MASK = (
+    IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+)
+EVENT_HEADER = struct.Struct("iIII")
+
+
+def is_watched_dir(directory: str) -> bool:
+    name = os.path.basename(directory)
+    return not name.startswith(".") and name not in settings.PRUNED_DIRS
+
+
+def walk_watched_dirs(root: str) -> list[str]:
+    directories = []
+    for current, dirs, _ in os.walk(root, topdown=True):
+        dirs[:] = [d for d in dirs if is_watched_dir(d)]
+        directories.append(current)
+    return directories
+
+
+class Watcher(ABC):
+    # the paths changed within timeout, or None when changes were lost
+    @abstractmethod
+    def poll(self, timeout: float) -> set[Filename] | None: ...
+
+    def close(self) -> None:
+        pass
+
+    def wait(self) -> set[Filename] | None:
+        changed: set[Filename] | None = set()
+        while not changed and changed is not None:
+            changed = self.poll(settings.WATCH_POLL_INTERVAL)
+        # a save often arrives as several events, collect them into one review
+        while changed is not None:
+            more = self.poll(settings.WATCH_DEBOUNCE)
+            if more is None:
+                return None
+            if not more:
+                break
+            changed |= more
+        return changed
+
+
+class InotifyWatcher(Watcher):
+    def __init__(self, root: str = ".") -> None:
+        self._libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        self._fd = self._libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self._fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self._dirs: dict[int, str] = {}
+        for directory in walk_watched_dirs(root):
+            self._add_watch(directory)
+
+    def _add_watch(self, directory: str) -> None:
+        wd = self._libc.inotify_add_watch(self._fd, os.fsencode(directory), WATCH_MASK)
+        if wd < 0:
+            logger.warning("Cannot watch %s", directory)
+            return
+        self._dirs[wd] = directory
+
+    def poll(self, timeout: float) -> set[Filename] | None:
+        readable, _, _ = select.select([self._fd], [], [], timeout)
+        if not readable:
+            return set()
+        try:
+            buffer = os.read(self._fd, 1 << 16)
+        except BlockingIOError:
+            return set()
+        changed: set[Filename] = set()
+        offset = 0
+        while offset < len(buffer):
+            wd, mask, _, length = EVENT_HEADER.unpack_from(buffer, offset)
+            offset += EVENT_HEADER.size
+            name = os.fsdecode(buffer[offset : offset + length].rstrip(b"\0"))
+            offset += length
+            if mask & IN_Q_OVERFLOW:
+                return None
+            directory = self._dirs.get(wd)
+            if directory is None or not name:
+                continue
+            path = os.path.normpath(os.path.join(directory, name))
+            if mask & IN_ISDIR:
+                if mask & (IN_CREATE | IN_MOVED_TO) and is_watched_dir(path):
+                    for new_directory in walk_watched_dirs(path):
+                        self._add_watch(new_directory)
+                    # files may have been written before the watch existed
+                    return None
+                continue
+            changed.add(path)
+        return changed
+
+    def close(self) -> None:
+        os.close(self._fd)
+
+
+class PollingWatcher(Watcher):
+    def __init__(self, root: str = ".") -> None:
+        self._root = root
+        self._snapshot = self._scan()
+
+    def _scan(self) -> dict[Filename, tuple[int, int]]:
+        snapshot = {}
+        for directory in walk_watched_dirs(self._root):
+            try:
+                entries = list(os.scandir(directory))
+            except OSError:
+                continue
+            for entry in entries:
+                if entry.name.endswith(".py") and entry.is_file():
+                    stat = entry.stat()
+                    path = os.path.normpath(entry.path)
+                    snapshot[path] = (stat.st_mtime_ns, stat.st_size)
+        return snapshot
+
+    def poll(self, timeout: float) -> set[Filename] | None:
+        time.sleep(timeout)
+        snapshot = self._scan()
+        changed = {
+            path
+            for path in snapshot.keys() | self._snapshot.keys()
+            if snapshot.get(path) != self._snapshot.get(path)
+        }
+        self._snapshot = snapshot
+        return changed
+
+
+def get_watcher() -> Watcher:
+    try:
+        return InotifyWatcher()
+    except (AttributeError, OSError, TypeError) as e:
+        # no inotify outside Linux, or no watches left
+        logger.info("Falling back to polling for file changes: %s", e)
+        return PollingWatcher()
+
+
+def is_reviewed_file(path: Filename) -> bool:
+    return (
+        path.endswith(".py")
+        and not is_pruned(path)
+        and path.startswith(settings.CODE_DIR or "")
+    )
+
+
+def get_target_files_of(paths: list[Filename]) -> tuple[TargetFiles, TargetFiles]:
+    if get_current_branch() == settings.TARGET_BRANCH:
+        files = {
+            path: LineSet.from_range(1, count_lines(path))
+            for path in paths
+            if os.path.isfile(path)
+        }
+    else:
+        files = get_changed_lines(*(f":(literal){path}" for path in paths))
+    return split_test_files(
+        {path: line_nos for path, line_nos in files.items() if line_nos}
+    )
+
+
+def watch(watcher: Watcher | None = None, rounds: int | None = None) -> None:
+    logger.info("Watching %s for changes, press Ctrl+C to stop.", os.getcwd())
+    # start watching first so that saves during the initial review are not lost
+    watcher = watcher or get_watcher()
+    code_files, test_files = get_files_to_check()
+    if code_files or test_files:
+        run_review(code_files, test_files, settings.WATCH_CHECKS)
+    try:
+        while rounds is None or rounds > 0:
+            if rounds is not None:
+                rounds -= 1
+            changed = watcher.wait()
+            start = time.perf_counter()
+            if changed is None:
+                logger.info("Lost track of the changes, reviewing everything again.")
+                code_files, test_files = get_files_to_check()
+                run_review(code_files, test_files, settings.WATCH_CHECKS)
+                continue
+            paths = sorted(path for path in changed if is_reviewed_file(path))
+            if not paths:
+                continue
+            code_files, test_files = get_target_files_of(paths)
+            if not code_files and not test_files:
+                logger.info("No changed lines left in %s", ", ".join(paths))
+                continue
+            logger.info("Reviewing %s...", ", ".join(paths))
+            run_review(code_files, test_files, settings.WATCH_CHECKS)
+            logger.info("Review finished in %.2fs", time.perf_counter() - start)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        watcher.close()
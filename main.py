@@ -1,33 +1,99 @@
+import argparse
 import os
 import sys
 
+from app.baseline import use_baseline
+from app.batch import review_refs
+from app.cache import get_cache
 from app.config import settings
+from app.findings import close_reporters
 from app.logger import logger
-from app.review import (
-    check_code_coverage,
-    check_code_with_mypy,
-    check_code_with_pylint,
-    check_commented_code,
-    check_print_debug,
-    check_vulnerability,
-    get_files_to_check,
+from app.monorepo import (
+    get_package_files,
+    merge_package_files,
+    run_monorepo_review,
 )
+from app.profiling import stage, write_profile
+from app.review import get_files_to_check, review_staged, run_review
 
-if __name__ == "__main__":
+
+def review_tree() -> dict[str, bool] | None:
+    package_files = None
+    with stage("discovery"):
+        if settings.CODE_DIRS:
+            package_files = get_package_files(settings.CODE_DIRS)
+            code_files, test_files = merge_package_files(package_files)
+        else:
+            code_files, test_files = get_files_to_check()
+    if not code_files and not test_files:
+        return None
+    if settings.BASELINE:
+        with stage("baseline"):
+            use_baseline({**code_files, **test_files})
+    if package_files is not None:
+        return run_monorepo_review(package_files)
+    return run_review(code_files, test_files)
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(
+        description="Review the python code changes of TARGET_PROJECT.",
+        fromfile_prefix_chars="@",
+    )
+    parser.add_argument(
+        "--watch",
+        action="store_true",
+        help="keep running and re-review files whenever they change",
+    )
+    parser.add_argument(
+        "--staged",
+        action="store_true",
+        help="review the staged changes only and fail on findings, for pre-commit",
+    )
+    parser.add_argument(
+        "--package",
+        action="append",
+        metavar="PATH",
+        help="review this package root of a monorepo, can be given several times "
+        "(overrides CODE_DIRS)",
+    )
+    parser.add_argument(
+        "--refs",
+        nargs="+",
+        metavar="REF",
+        help="review these branches or commits one after another in a git "
+        "worktree, @FILE reads them from a file",
+    )
+    args = parser.parse_args(argv)
+    if args.package:
+        settings.CODE_DIRS = args.package
     current_dir = os.getcwd()
     if settings.TARGET_PROJECT:
         os.chdir(settings.TARGET_PROJECT)
-    code_files, test_files = get_files_to_check()
-    all_files = {**code_files, **test_files}
-    if not all_files:
-        logger.info("There is no python file to check!!!")
-        sys.exit(0)
     try:
-        check_print_debug(all_files)
-        check_commented_code(all_files)
-        check_code_with_pylint(code_files, test_files)
-        check_code_with_mypy(all_files)
-        check_code_coverage(all_files)
-        check_vulnerability()
+        if args.staged:
+            return 0 if review_staged() else 1
+        if args.watch:
+            # pylint: disable-next=import-outside-toplevel
+            from app.watch import watch
+
+            watch()
+            return 0
+        if args.refs:
+            review_refs(args.refs, review_tree)
+        elif review_tree() is None:
+            logger.info("There is no python file to check!!!")
+            return 0
+        cache = get_cache()
+        if cache is not None:
+            logger.info(cache.stats_line())
+            cache.evict()
+        write_profile()
     finally:
+        close_reporters()
         os.chdir(current_dir)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())